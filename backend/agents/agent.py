@@ -1,21 +1,79 @@
 # backend/agents/agent.py
 import logging
 from decouple import config
-from groq import AsyncGroq, GroqError
 import asyncio
+import contextvars
+import threading
+import time
+from collections import OrderedDict
 from string import Template
 
-# Initialize AsyncGroq client
-client = AsyncGroq(
-    api_key=config("GROQ_API_KEY"),
-)
+from agents.replay import ReplayLLM, record_response
+from agents.scheduler import BACKGROUND, INTERACTIVE, RateLimited, get_scheduler, parse_duration
+from utils.metrics import counter, histogram, stage, record_tokens, profile_thread
+
+# "groq" calls the Groq API; "replay" serves recorded responses from
+# LLM_REPLAY_FILE (benchmarks, offline development) and needs no API key.
+LLM_BACKEND = config("LLM_BACKEND", default="groq").lower()
+LLM_REPLAY_FILE = config("LLM_REPLAY_FILE", default="")
+LLM_REPLAY_LATENCY_MS = config("LLM_REPLAY_LATENCY_MS", default=0.0, cast=float)
+# When set, every live question/response pair is appended here for later replay
+LLM_RECORD_FILE = config("LLM_RECORD_FILE", default="")
+
+_client = None
+_replay = None
+
+def get_client():
+    """
+    AsyncGroq client, created on first use so importing needs no API key and
+    workers that never call the LLM never import the groq SDK.
+    """
+    global _client
+    if _client is None:
+        from groq import AsyncGroq
+        _client = AsyncGroq(
+            api_key=config("GROQ_API_KEY"),
+            max_retries=0,  # retries (with backoff) belong to the scheduler
+        )
+    return _client
+
+def get_replay() -> ReplayLLM:
+    global _replay
+    if _replay is None:
+        if not LLM_REPLAY_FILE:
+            raise ValueError("LLM_BACKEND=replay requires LLM_REPLAY_FILE")
+        _replay = ReplayLLM(LLM_REPLAY_FILE, latency_ms=LLM_REPLAY_LATENCY_MS)
+    return _replay
 
 # Use a model that works well for code generation
 MODEL_NAME = "openai/gpt-oss-20b"  # Good for code generation
+MAX_TOKENS = 1200
+TEMPERATURE = 0.1  # lower for determinism
 # Alternative models you can try:
 # MODEL_NAME = "mixtral-8x7b-32768"
 # MODEL_NAME = "gemma2-9b-it"
 
+# Speculative generation: ask for several completions of the same prompt and
+# keep the first whose code runs. 1 turns it off; a chat request may ask for
+# more, up to LLM_SPECULATIVE_MAX_CANDIDATES.
+LLM_SPECULATIVE_CANDIDATES = config("LLM_SPECULATIVE_CANDIDATES", default=1, cast=int)
+LLM_SPECULATIVE_MAX_CANDIDATES = config("LLM_SPECULATIVE_MAX_CANDIDATES", default=3, cast=int)
+# Candidates as "model@temperature", comma-separated; the first is the primary
+LLM_SPECULATIVE_VARIANTS = config("LLM_SPECULATIVE_VARIANTS", default="")
+# Start the extra candidates only if the primary has not answered by then (0: at once)
+LLM_SPECULATIVE_DELAY_MS = config("LLM_SPECULATIVE_DELAY_MS", default=0.0, cast=float)
+# Estimated tokens a session may spend on extra candidates (0: no limit), per
+# window: spending is forgiven at SESSION_TOKENS per WINDOW_SECONDS
+LLM_SPECULATIVE_SESSION_TOKENS = config("LLM_SPECULATIVE_SESSION_TOKENS", default=100_000, cast=int)
+LLM_SPECULATIVE_WINDOW_SECONDS = config("LLM_SPECULATIVE_WINDOW_SECONDS", default=3600.0, cast=float)
+
+SPECULATIVE_SECONDS = histogram("insightai_llm_speculative_seconds",
+                                "Time from the first request to the winning candidate", ("winner",))
+SPECULATIVE_WINS = counter("insightai_llm_speculative_wins",
+                           "Speculative generations by winning candidate (none: no candidate ran)", ("winner",))
+SPECULATIVE_EXTRA_TOKENS = counter("insightai_llm_speculative_extra_tokens",
+                                   "Estimated tokens reserved for extra candidates")
+
 logger = logging.getLogger("llm_client")
 
 # New constant holding the JSON example so braces aren't interpreted by str.format
@@ -68,45 +126,238 @@ IMPORTANT CODE FORMATTING RULES:
 DATA CONTEXT:
 ${data_context}
 
+PREVIOUS RESULTS (variables already defined from earlier questions):
+${results_summary}
+- If the question follows up on an earlier answer ("that", "those", "now by month"), start from prev_result or the variables above instead of recomputing from df
+
 Chart Preference: ${chart_hint}
 
+Detected Intent: ${intent_hint}
+
 User question: "${question}"
 
 Remember: ALWAYS create a visualization for data analysis questions using viz(). ONLY return the JSON object, nothing else.
 """.strip()
 
-def build_system_prompt(question, data_context, chart_hint):
+def build_system_prompt(question, data_context, chart_hint, intent_hint=None, results_summary=None):
     return Template(SYSTEM_PROMPT_TEMPLATE).substitute(
         json_example=JSON_EXAMPLE,
         data_context=data_context or "N/A",
+        results_summary=results_summary or "None",
         chart_hint=chart_hint or "None",
+        intent_hint=intent_hint or "None",
         question=question
     )
 
-async def generate_response(question, data_context, chat_history, chart_hint=None):
-    system_message = build_system_prompt(question, data_context, chart_hint)
+class Variant:
+    """Model and sampling temperature of one speculative candidate."""
+
+    __slots__ = ("model", "temperature")
+
+    def __init__(self, model: str = MODEL_NAME, temperature: float = TEMPERATURE):
+        self.model = model
+        self.temperature = temperature
+
+    @property
+    def label(self) -> str:
+        return f"{self.model}@{self.temperature:g}"
+
+
+def parse_variants(text: str) -> list:
+    """Variants from "model@temperature,..."; either part may be left out."""
+    variants = []
+    for item in text.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        model, _, temperature = item.partition("@")
+        variants.append(Variant(model.strip() or MODEL_NAME,
+                                float(temperature) if temperature.strip() else TEMPERATURE))
+    return variants
+
+
+# Without configured variants, extra candidates sample the same model hotter
+SPECULATIVE_VARIANTS = parse_variants(LLM_SPECULATIVE_VARIANTS) or [
+    Variant(MODEL_NAME, TEMPERATURE), Variant(MODEL_NAME, 0.5), Variant(MODEL_NAME, 0.8),
+]
+
+
+def _build_messages(question, data_context, chart_hint, intent_hint, results_summary):
+    with stage("prompt"):
+        system_message = build_system_prompt(question, data_context, chart_hint, intent_hint, results_summary)
     chat_messages = [{"role": "system", "content": system_message}]
     # You can include trimmed chat_history if needed for context
     chat_messages += [{"role": "user", "content": question}]
+    return chat_messages
 
-    chat_completion = await client.chat.completions.create(
-        messages=chat_messages,
-        model=MODEL_NAME,
-        temperature=0.1,   # lower for determinism
-        max_tokens=1200,
-        top_p=0.9,
-    )
+
+def _estimate_tokens(chat_messages) -> int:
+    # The prompt (about 4 characters a token) plus the longest reply
+    return sum(len(m["content"]) for m in chat_messages) // 4 + MAX_TOKENS
+
+
+async def generate_response(question, data_context, chat_history, chart_hint=None, intent_hint=None,
+                            results_summary=None, priority=INTERACTIVE):
+    chat_messages = _build_messages(question, data_context, chart_hint, intent_hint, results_summary)
+    content = await _complete(question, chat_messages, Variant(), priority)
+    if LLM_RECORD_FILE:
+        record_response(LLM_RECORD_FILE, question, content)
+    return content
+
+
+async def _complete(question, chat_messages, variant: Variant, priority) -> str:
+    if LLM_BACKEND == "replay":
+        return (await get_replay().acomplete(question)).strip()
+
+    async def complete():
+        from groq import RateLimitError
+
+        try:
+            raw = await get_client().chat.completions.with_raw_response.create(
+                messages=chat_messages,
+                model=variant.model,
+                temperature=variant.temperature,
+                max_tokens=MAX_TOKENS,
+                top_p=0.9,
+            )
+        except RateLimitError as e:
+            headers = e.response.headers
+            raise RateLimited(parse_duration(headers.get("retry-after")), headers) from e
+        completion = raw.parse()
+        usage = getattr(completion, "usage", None)
+        return completion, getattr(usage, "total_tokens", None), raw.headers
+
+    chat_completion = await get_scheduler().call(complete, priority=priority, tokens=_estimate_tokens(chat_messages))
+    record_tokens(variant.model, getattr(chat_completion, "usage", None))
     return chat_completion.choices[0].message.content.strip()
 
-def ask_llm(question, data_context, chat_history, chart_hint=None) -> str:
+
+class SpeculationBudget:
+    """
+    Estimated tokens each session has spent on extra candidates, LRU-bounded.
+    Spending decays linearly, max_tokens per `window` seconds, so a session
+    regains its allowance over time instead of losing it for good. Callers
+    without a session ID cannot be told apart and get no extra candidates.
+    """
+
+    def __init__(self, max_tokens: int = LLM_SPECULATIVE_SESSION_TOKENS,
+                 window: float = LLM_SPECULATIVE_WINDOW_SECONDS, max_sessions: int = 1024):
+        self.max_tokens = max_tokens
+        self.window = window
+        self.max_sessions = max_sessions
+        self._spent: OrderedDict = OrderedDict()  # session -> (tokens, monotonic time)
+        self._lock = threading.Lock()
+
+    def grant(self, session_id, extra: int, tokens_each: int, now: float | None = None) -> int:
+        """How many of `extra` candidates the session can afford; charges for them."""
+        if not session_id:
+            return 0
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            spent, updated = self._spent.pop(session_id, (0, now))
+            if self.window > 0:
+                spent = max(0.0, spent - (now - updated) * self.max_tokens / self.window)
+            if self.max_tokens > 0:
+                extra = max(0, min(extra, int(self.max_tokens - spent) // max(tokens_each, 1)))
+            self._spent[session_id] = (spent + extra * tokens_each, now)
+            while len(self._spent) > self.max_sessions:
+                self._spent.popitem(last=False)
+        return extra
+
+
+_budget = SpeculationBudget()
+
+
+def speculative_candidates(requested=None) -> int:
+    """Candidates for one question: the request's ask or the default, within the cap."""
+    wanted = LLM_SPECULATIVE_CANDIDATES if requested is None else requested
+    return max(1, min(int(wanted), LLM_SPECULATIVE_MAX_CANDIDATES, len(SPECULATIVE_VARIANTS)))
+
+
+async def generate_speculative(question, data_context, chat_history, chart_hint=None, intent_hint=None,
+                               results_summary=None, validate=None, candidates=None, session_id=None,
+                               priority=INTERACTIVE):
+    """
+    Request up to `candidates` completions of the same prompt, one per variant,
+    and validate each as it arrives with validate(content) (run in a thread; it
+    returns an outcome, or None if the content is unusable). The first valid
+    candidate wins and the others are cancelled. Returns (content, outcome);
+    outcome is None when no candidate passed, and content is then the primary's
+    (or the first to arrive).
+
+    Extra candidates go through the scheduler at background priority, so they
+    yield to other users' questions, and are charged to the session's budget.
+    """
+    chat_messages = _build_messages(question, data_context, chart_hint, intent_hint, results_summary)
+    estimate = _estimate_tokens(chat_messages)
+    extra = _budget.grant(session_id, speculative_candidates(candidates) - 1, estimate)
+    SPECULATIVE_EXTRA_TOKENS.inc(extra * estimate)
+    variants = SPECULATIVE_VARIANTS[:1 + extra]
+
+    async def candidate(index: int, variant: Variant) -> str:
+        if index and LLM_SPECULATIVE_DELAY_MS:
+            await asyncio.sleep(LLM_SPECULATIVE_DELAY_MS / 1000)
+        return await _complete(question, chat_messages, variant, priority if index == 0 else BACKGROUND)
+
+    start = time.perf_counter()
+    tasks = {asyncio.ensure_future(candidate(i, v)): i for i, v in enumerate(variants)}
+    pending = set(tasks)
+    fallback = None
     try:
-        loop = asyncio.get_running_loop()
-        import concurrent.futures
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            future = executor.submit(
-                asyncio.run,
-                generate_response(question, data_context, chat_history, chart_hint),
-            )
-            return future.result()
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            # Validate the primary first when several arrive together
+            for task in sorted(done, key=tasks.get):
+                index = tasks[task]
+                if task.exception() is not None:
+                    logger.warning("Candidate %s failed: %s", variants[index].label, task.exception())
+                    continue
+                content = task.result()
+                if fallback is None or index == 0:
+                    fallback = content
+                outcome = await asyncio.to_thread(profile_thread(validate), content) if validate else content
+                if outcome is not None:
+                    winner = "primary" if index == 0 else "extra"
+                    SPECULATIVE_WINS.inc(winner=winner)
+                    SPECULATIVE_SECONDS.observe(time.perf_counter() - start, winner=winner)
+                    if index:
+                        logger.info("Speculative candidate %s won", variants[index].label)
+                    if LLM_RECORD_FILE:
+                        record_response(LLM_RECORD_FILE, question, content)
+                    return content, outcome
+    finally:
+        for task in pending:
+            task.cancel()
+    SPECULATIVE_WINS.inc(winner="none")
+    SPECULATIVE_SECONDS.observe(time.perf_counter() - start, winner="none")
+    if fallback is None:
+        # Every candidate failed; surface the primary's error
+        next(iter(tasks)).result()
+    return fallback, None
+
+
+def _run_sync(coro):
+    """Run a coroutine to completion from sync code, inside or outside an event loop."""
+    try:
+        asyncio.get_running_loop()
     except RuntimeError:
-        return asyncio.run(generate_response(question, data_context, chat_history, chart_hint))
\ No newline at end of file
+        return asyncio.run(coro)
+    import concurrent.futures
+    # Run in the caller's context so stage timings land on the request trace
+    ctx = contextvars.copy_context()
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        return executor.submit(ctx.run, asyncio.run, coro).result()
+
+def ask_llm(question, data_context, chat_history, chart_hint=None, intent_hint=None,
+            results_summary=None) -> str:
+    return _run_sync(
+        generate_response(question, data_context, chat_history, chart_hint, intent_hint, results_summary)
+    )
+
+def ask_llm_speculative(question, data_context, chat_history, chart_hint=None, intent_hint=None,
+                        results_summary=None, validate=None, candidates=None, session_id=None):
+    """Sync entry point for generate_speculative(); returns (content, outcome)."""
+    return _run_sync(generate_speculative(
+        question, data_context, chat_history, chart_hint, intent_hint, results_summary,
+        validate=validate, candidates=candidates, session_id=session_id,
+    ))
\ No newline at end of file
@@ -0,0 +1,59 @@
+# backend/agents/replay.py
+"""
+Deterministic local stand-in for the LLM, used by benchmarks and offline runs.
+
+Responses are read from a JSONL file of {"question": ..., "response": ...}
+records (the format written by LLM_RECORD_FILE). A question that was recorded
+gets its recorded response; any other question gets a fixed pick chosen by a
+hash of the text, so the same question always replays the same answer.
+"""
+import asyncio
+import json
+import threading
+import zlib
+from pathlib import Path
+
+
+def _normalize(question: str) -> str:
+    return " ".join(question.lower().split())
+
+
+class ReplayLLM:
+    def __init__(self, path, latency_ms: float = 0.0):
+        self.path = Path(path)
+        self.latency = latency_ms / 1000
+        self._by_question = {}
+        self._responses = []
+        with open(self.path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                self._responses.append(record["response"])
+                if record.get("question"):
+                    self._by_question[_normalize(record["question"])] = record["response"]
+        if not self._responses:
+            raise ValueError(f"No responses in replay file {self.path}")
+
+    def complete(self, question: str) -> str:
+        key = _normalize(question or "")
+        response = self._by_question.get(key)
+        if response is None:
+            response = self._responses[zlib.crc32(key.encode()) % len(self._responses)]
+        return response
+
+    async def acomplete(self, question: str) -> str:
+        if self.latency:
+            # Stand in for network + generation time without blocking the loop
+            await asyncio.sleep(self.latency)
+        return self.complete(question)
+
+
+_record_lock = threading.Lock()
+
+
+def record_response(path, question: str, response: str) -> None:
+    """Append a question/response pair in the format ReplayLLM reads."""
+    line = json.dumps({"question": question, "response": response})
+    with _record_lock, open(path, "a") as f:
+        f.write(line + "\n")
@@ -0,0 +1,310 @@
+# backend/agents/scheduler.py
+"""
+Admission control for LLM calls.
+
+Every completion goes through LLMScheduler.call(). Callers wait in a bounded
+priority queue: interactive chat ahead of background work such as prewarming.
+The head of the queue is admitted when a concurrency slot is free and two
+token buckets allow it: one for requests per minute, one for tokens per
+minute. After each response the buckets are re-synced from the provider's
+x-ratelimit-* headers, so the scheduler tracks the real quota rather than a
+guess; the token bucket admits everything until those headers (or
+LLM_TOKENS_PER_MINUTE) give it a limit. A 429 pauses admissions until its
+retry-after, and the call is retried with jittered exponential backoff.
+Queue depth, wait time, admissions and retries are exported as metrics.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import re
+import threading
+import time
+
+from decouple import config
+
+from utils.metrics import counter, gauge, histogram
+
+logger = logging.getLogger(__name__)
+
+LLM_REQUESTS_PER_MINUTE = config("LLM_REQUESTS_PER_MINUTE", default=30, cast=int)
+# 0: no token limit until a response's x-ratelimit-limit-tokens header reports the real one
+LLM_TOKENS_PER_MINUTE = config("LLM_TOKENS_PER_MINUTE", default=0, cast=int)
+LLM_MAX_CONCURRENCY = config("LLM_MAX_CONCURRENCY", default=8, cast=int)
+LLM_QUEUE_MAX = config("LLM_QUEUE_MAX", default=64, cast=int)
+# Longest a call may wait for admission before giving up
+LLM_QUEUE_TIMEOUT_SECONDS = config("LLM_QUEUE_TIMEOUT_SECONDS", default=60.0, cast=float)
+LLM_MAX_RETRIES = config("LLM_MAX_RETRIES", default=4, cast=int)
+LLM_BACKOFF_BASE_SECONDS = config("LLM_BACKOFF_BASE_SECONDS", default=0.5, cast=float)
+LLM_BACKOFF_MAX_SECONDS = config("LLM_BACKOFF_MAX_SECONDS", default=20.0, cast=float)
+
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+QUEUE_DEPTH = gauge("insightai_llm_queue_depth", "LLM calls waiting for admission", ("priority",))
+QUEUE_WAIT_SECONDS = histogram("insightai_llm_queue_wait_seconds",
+                               "Time an LLM call waited for admission", ("priority",))
+LLM_CALLS = counter("insightai_llm_calls", "LLM calls by outcome", ("priority", "outcome"))
+LLM_RETRIES = counter("insightai_llm_retries", "LLM calls retried after a rate limit", ("priority",))
+
+
+class LLMBusy(Exception):
+    """The queue is full or the call waited too long for admission."""
+
+
+class RateLimited(Exception):
+    """Raised by a call function on HTTP 429; retry_after in seconds if known."""
+
+    def __init__(self, retry_after: float | None = None, headers=None):
+        super().__init__(f"rate limited (retry after {retry_after}s)")
+        self.retry_after = retry_after
+        self.headers = headers or {}
+
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_UNIT_SECONDS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(value) -> float | None:
+    """Seconds from a header value such as '7.66s', '2m59.56s', '120ms' or '3'."""
+    if value is None:
+        return None
+    text = str(value).strip()
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(text)
+    if not parts:
+        return None
+    return sum(float(amount) * _UNIT_SECONDS[unit] for amount, unit in parts)
+
+
+class TokenBucket:
+    """
+    Refills `capacity` units per minute; may go negative to carry debt. A
+    capacity of 0 means the limit is unknown: only pauses hold callers back
+    until sync() learns the limit from the provider.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float):
+        if self.capacity:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    def delay(self, amount: float, now: float) -> float:
+        """Seconds until `amount` can be taken (0 when it can be now)."""
+        self._refill(now)
+        if now < self.paused_until:
+            return self.paused_until - now
+        if not self.capacity:
+            return 0.0
+        # A request larger than the bucket waits for a full bucket, not forever
+        needed = min(amount, self.capacity) - self.level
+        return 0.0 if needed <= 0 else needed * 60 / self.capacity
+
+    def take(self, amount: float, now: float):
+        """Consume amount (negative refunds an over-estimate, up to capacity)."""
+        self._refill(now)
+        if self.capacity:
+            self.level = min(self.capacity, self.level - amount)
+
+    def sync(self, limit: float | None, remaining: float | None, reset: float | None, now: float):
+        """Adopt the provider's view: its limit, and no more than it says is left."""
+        self._refill(now)
+        if limit:
+            if not self.capacity:
+                self.level = float(limit)  # the first known limit starts from a full bucket
+            self.capacity = float(limit)
+        if remaining is not None:
+            if self.capacity:
+                self.level = min(self.level, float(remaining))
+            if remaining <= 0 and reset:
+                self.paused_until = max(self.paused_until, now + reset)
+
+    def pause(self, seconds: float, now: float):
+        self.paused_until = max(self.paused_until, now + seconds)
+
+
+def _header(headers, name):
+    value = headers.get(name) if headers is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class LLMScheduler:
+    def __init__(self, requests_per_minute: int = LLM_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: int = LLM_TOKENS_PER_MINUTE,
+                 max_concurrency: int = LLM_MAX_CONCURRENCY, max_queue: int = LLM_QUEUE_MAX,
+                 queue_timeout: float = LLM_QUEUE_TIMEOUT_SECONDS, max_retries: int = LLM_MAX_RETRIES,
+                 backoff_base: float = LLM_BACKOFF_BASE_SECONDS, backoff_max: float = LLM_BACKOFF_MAX_SECONDS):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.in_flight = 0
+        self._queue: list = []  # heap of [priority, seq, estimated tokens]
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def _publish_depth(self):
+        for priority, name in PRIORITY_NAMES.items():
+            QUEUE_DEPTH.set(sum(1 for entry in self._queue if entry[0] == priority), priority=name)
+
+    def acquire(self, priority: int = INTERACTIVE, tokens: int = 0, cancelled: threading.Event | None = None) -> float:
+        """
+        Block until admitted; returns seconds waited. Raises LLMBusy when the
+        queue is full, on timeout, or once `cancelled` is set.
+        """
+        start = time.monotonic()
+        deadline = start + self.queue_timeout
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                LLM_CALLS.inc(priority=PRIORITY_NAMES[priority], outcome="rejected")
+                raise LLMBusy("LLM queue is full")
+            entry = [priority, next(self._seq), tokens]
+            heapq.heappush(self._queue, entry)
+            self._publish_depth()
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = None
+                    if self._queue[0] is entry and self.in_flight < self.max_concurrency:
+                        wait = max(self.requests.delay(1, now), self.tokens.delay(tokens, now))
+                        if wait <= 0:
+                            heapq.heappop(self._queue)
+                            self.requests.take(1, now)
+                            self.tokens.take(tokens, now)
+                            self.in_flight += 1
+                            # The next caller is now at the head of the queue
+                            self._cond.notify_all()
+                            break
+                    if cancelled is not None and cancelled.is_set():
+                        raise LLMBusy("cancelled while queued")
+                    if now >= deadline:
+                        LLM_CALLS.inc(priority=PRIORITY_NAMES[priority], outcome="timeout")
+                        raise LLMBusy(f"waited {now - start:.1f}s for an LLM slot")
+                    remaining = deadline - now
+                    self._cond.wait(min(wait, remaining) if wait is not None else remaining)
+            except BaseException:
+                if entry in self._queue:
+                    self._queue.remove(entry)
+                    heapq.heapify(self._queue)
+                self._cond.notify_all()
+                raise
+            finally:
+                self._publish_depth()
+        waited = time.monotonic() - start
+        QUEUE_WAIT_SECONDS.observe(waited, priority=PRIORITY_NAMES[priority])
+        return waited
+
+    def release(self, estimated_tokens: int = 0, used_tokens: int | None = None, headers=None):
+        """Free the slot, settle the token estimate and sync with rate-limit headers."""
+        with self._cond:
+            now = time.monotonic()
+            self.in_flight -= 1
+            if used_tokens is not None:
+                self.tokens.take(used_tokens - estimated_tokens, now)
+            if headers is not None:
+                self.observe_headers(headers, now)
+            self._cond.notify_all()
+
+    def observe_headers(self, headers, now: float | None = None):
+        now = time.monotonic() if now is None else now
+        self.requests.sync(_header(headers, "x-ratelimit-limit-requests"),
+                           _header(headers, "x-ratelimit-remaining-requests"),
+                           parse_duration(headers.get("x-ratelimit-reset-requests")), now)
+        self.tokens.sync(_header(headers, "x-ratelimit-limit-tokens"),
+                         _header(headers, "x-ratelimit-remaining-tokens"),
+                         parse_duration(headers.get("x-ratelimit-reset-tokens")), now)
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter keeps retrying callers from waking up together
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _rate_limited(self, error: RateLimited, attempt: int) -> float:
+        delay = max(error.retry_after or 0.0, self._backoff(attempt))
+        with self._cond:
+            now = time.monotonic()
+            if error.headers:
+                self.observe_headers(error.headers, now)
+            # Hold everyone, not just this caller, until the provider is ready again
+            self.requests.pause(error.retry_after or delay, now)
+            self._cond.notify_all()
+        return delay
+
+    async def _admit(self, priority: int, tokens: int):
+        # Admission waits run in a thread, so any event loop can use the scheduler
+        cancelled = threading.Event()
+        admission = asyncio.ensure_future(asyncio.to_thread(self.acquire, priority, tokens, cancelled))
+        try:
+            await asyncio.shield(admission)
+        except asyncio.CancelledError:
+            cancelled.set()
+            with self._cond:
+                self._cond.notify_all()
+            # The thread may have been admitted just before it saw the flag; give the slot back
+            admission.add_done_callback(
+                lambda f: f.cancelled() or f.exception() is not None or self.release(tokens, 0))
+            raise
+
+    async def call(self, fn, priority: int = INTERACTIVE, tokens: int = 0):
+        """
+        Await fn() -> (result, used_tokens, headers) under admission control,
+        retrying on RateLimited. `tokens` is the call's estimated token cost;
+        the actual usage settles the difference.
+        """
+        name = PRIORITY_NAMES[priority]
+        attempt = 0
+        while True:
+            await self._admit(priority, tokens)
+            try:
+                result, used, headers = await fn()
+            except RateLimited as e:
+                self.release(tokens, 0)
+                if attempt >= self.max_retries:
+                    LLM_CALLS.inc(priority=name, outcome="rate_limited")
+                    raise
+                delay = self._rate_limited(e, attempt)
+                LLM_RETRIES.inc(priority=name)
+                logger.warning("LLM rate limited; retrying in %.1fs (attempt %d)", delay, attempt + 1)
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+            except asyncio.CancelledError:
+                self.release(tokens, tokens)
+                LLM_CALLS.inc(priority=name, outcome="cancelled")
+                raise
+            except BaseException:
+                self.release(tokens, tokens)
+                LLM_CALLS.inc(priority=name, outcome="error")
+                raise
+            self.release(tokens, used, headers)
+            LLM_CALLS.inc(priority=name, outcome="ok")
+            return result
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> LLMScheduler:
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler()
+        return _scheduler
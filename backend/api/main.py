@@ -8,20 +8,44 @@ import logging
 backend_dir = Path(__file__).parent.parent
 sys.path.insert(0, str(backend_dir))
 
-from fastapi import FastAPI, File, UploadFile, HTTPException, Header
+from fastapi import FastAPI, File, Form, UploadFile, HTTPException, Header, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 import pandas as pd
-import io
 from typing import List, Dict, Any
 import numpy as np
 import os
-import redis
+import copy
+import uuid
+import time
+import asyncio
 
 # Import optimized modules
-from agents.agent import ask_llm
-from core.data_context import generate_data_context
+from agents.agent import ask_llm, ask_llm_speculative, generate_response, speculative_candidates
+from agents.scheduler import BACKGROUND, LLMBusy
+from core.data_context import (
+    render_data_context, generate_data_context_from_engine,
+)
 from core.data_processor import DataProcessor
+from core.ingest import file_format, read_upload, reconcile_chunk, append_chunk
+from core.prewarm import PREWARM_ENABLED, Prewarmer
+from core.preview import (
+    PREVIEW_PAGE_SIZE, PreviewError, StaleCursor, clear_preview_cache, parse_filters, preview_page,
+)
+from core.profile import DatasetProfile
+from core.storage import SessionStore, StoredDataset, REDIS_URL
+from core.disk_cache import DiskCache, DISK_CACHE_ENABLED
+from core.query_engine import (
+    LazyFrame, DuckDBDataset, engine_enabled, dataset_path, open_session_dataset, DATA_DIR,
+)
+from utils.intent import classify_intent
+from utils.output import OutputBuffer
+from utils.metrics import (
+    stage, start_trace, current_trace, render_metrics, profile_mode, profile_thread,
+    RequestProfiler, REQUEST_SECONDS,
+)
+from utils.tools import register_dataset, clear_aggregation_cache
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -39,8 +63,59 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Total-Rows", "X-Next-Cursor", "X-Prev-Cursor"],
 )
 
+NDJSON = "application/x-ndjson"
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """
+    Start a per-request trace, optionally profile the request, and report stage
+    timings as a Server-Timing header plus the request latency histogram.
+    Streamed (NDJSON) responses send their headers before any stage has run:
+    they carry the timings in their final event instead, and the profile and
+    latency cover the whole stream.
+    """
+    trace = start_trace()
+    mode = profile_mode(request.headers.get("x-profile"))
+    profiler = None
+    if mode:
+        label = request.url.path.strip("/").replace("/", "_") or "root"
+        profiler = RequestProfiler(mode, label).__enter__()
+    try:
+        response = await call_next(request)
+    except BaseException:
+        if profiler is not None:
+            profiler.__exit__(None, None, None)
+        raise
+    if profiler is not None and profiler.path is not None:
+        response.headers["X-Profile-Output"] = profiler.path.name
+
+    def finish():
+        if profiler is not None:
+            profiler.__exit__(None, None, None)
+        total = time.perf_counter() - trace.start
+        route = request.scope.get("route")
+        REQUEST_SECONDS.observe(total, method=request.method,
+                                route=getattr(route, "path", "unmatched"), status=response.status_code)
+        return total
+
+    if response.headers.get("content-type", "").startswith(NDJSON):
+        body = response.body_iterator
+
+        async def finish_after_stream():
+            try:
+                async for chunk in body:
+                    yield chunk
+            finally:
+                finish()
+
+        response.body_iterator = finish_after_stream()
+        return response
+    response.headers["Server-Timing"] = trace.server_timing(finish())
+    return response
+
 # Pydantic models
 class ChatMessage(BaseModel):
     role: str
@@ -50,46 +125,71 @@ class ChatRequest(BaseModel):
     message: str
     chat_history: List[ChatMessage] = []
     chart_preference: str | None = None  # Add this field
+    stream: bool = False  # reply with NDJSON events (status, output, result)
+    candidates: int | None = None  # speculative LLM candidates; None uses LLM_SPECULATIVE_CANDIDATES
 
 class ChatResponse(BaseModel):
     response: str
     chat_history: List[ChatMessage]
     visualization: Dict[str, Any] | None = None
+    output: str | None = None  # what the generated code printed, capped
+    output_truncated: bool = False
 
 # Initialize data processor
 data_processor = DataProcessor()
 
+# Answers likely first questions in the background after an upload (opt-in)
+prewarmer = Prewarmer(
+    data_processor, ask=lambda question, context: generate_response(question, context, [], priority=BACKGROUND),
+) if PREWARM_ENABLED else None
+
 # Global state (use proper state management in production)
 current_df = None
 current_context = None
+current_version = None  # bumps on every new dataset; keys the chart aggregation cache
+current_profile = None  # mergeable column stats the context is rendered from
+current_session = None  # session the active dataset was uploaded or restored for
 
-# Redis client (optional fallback to None)
-REDIS_URL = os.getenv("REDIS_URL")  # set this in Render env
-redis_client = None
-if REDIS_URL:
-    redis_client = redis.from_url(REDIS_URL)
-
-# TTL in seconds for temporary datasets (e.g., 24 hours)
-DATA_TTL_SECONDS = int(os.getenv("DATA_TTL_SECONDS", 60 * 60 * 24))
-
-# Helper functions
-def save_df_to_redis(session_id: str, df: pd.DataFrame):
-    if not redis_client or not session_id:
-        return False
-    buf = io.BytesIO()
-    df.to_pickle(buf)
-    buf.seek(0)
-    redis_client.set(f"dataset:{session_id}", buf.read(), ex=DATA_TTL_SECONDS)
-    return True
-
-def load_df_from_redis(session_id: str):
-    if not redis_client or not session_id:
-        return None
-    key = f"dataset:{session_id}"
-    data = redis_client.get(key)
-    if not data:
+# Rows of the dataset returned with an upload; browse the rest through /api/preview
+UPLOAD_PREVIEW_ROWS = int(os.getenv("UPLOAD_PREVIEW_ROWS", 20))
+
+# Redis-backed session storage (optional; None keeps datasets in-process only)
+session_store = SessionStore.from_url(REDIS_URL) if REDIS_URL else None
+
+# Node-local Arrow files checked before Redis; shared by the workers on a node
+disk_cache = DiskCache() if DISK_CACHE_ENABLED else None
+
+async def load_session_dataset(session_id: str) -> StoredDataset | None:
+    """
+    A session's dataset from the fastest tier that has it: the local disk
+    cache (memory-mapped), then Redis. A Redis hit is written through to disk,
+    expiring with the Redis keys, so the next reload on this node skips the
+    network.
+    """
+    if disk_cache:
+        with stage("disk_load"):
+            stored = await asyncio.to_thread(disk_cache.load, session_id)
+        if stored is not None:
+            return stored
+    if not session_store:
         return None
-    return pd.read_pickle(io.BytesIO(data))
+    with stage("redis_load"):
+        stored = await session_store.load(session_id)
+    if stored is not None and disk_cache:
+        with stage("disk_save"):
+            await asyncio.to_thread(disk_cache.save, session_id, stored.df, stored.profile, stored.context,
+                                    stored.expires_at)
+    return stored
+
+@app.on_event("shutdown")
+async def release_resources():
+    if session_store is not None:
+        await session_store.close()
+    data_processor.executor.shutdown()
+    if prewarmer is not None:
+        prewarmer.shutdown()
+    if isinstance(current_df, LazyFrame):
+        current_df.dataset.close()
 
 def convert_ndarrays(obj):
     if isinstance(obj, np.ndarray):
@@ -100,39 +200,94 @@ def convert_ndarrays(obj):
         return [convert_ndarrays(i) for i in obj]
     return obj
 
+def encode_response(model: BaseModel) -> Response:
+    """Serialize a response model once, timed as the 'encode' stage."""
+    with stage("encode"):
+        body = model.model_dump_json()
+    return Response(content=body, media_type="application/json")
+
+def preview_records(df, limit: int) -> List[Dict[str, Any]]:
+    """First `limit` rows as JSON-safe records (missing values become null)."""
+    preview = df.head(limit).astype(object)
+    return preview.where(preview.notna(), None).to_dict('records')
+
+def set_current_dataset(df: pd.DataFrame, profile: DatasetProfile | None = None,
+                        context: str | None = None, session_id: str | None = None):
+    """
+    Install df as the active dataset under a fresh version. The context is
+    rendered from the column profile; pass one (merged or restored) to avoid
+    rescanning df, and a stored context alongside it to skip rendering.
+    """
+    global current_df, current_context, current_version, current_profile, current_session
+    if current_version is not None:
+        clear_aggregation_cache(current_version)
+        clear_preview_cache(current_version)
+    if isinstance(current_df, LazyFrame) and not (isinstance(df, LazyFrame) and df.dataset is current_df.dataset):
+        # The replaced dataset's DuckDB connection would otherwise hold its files open
+        current_df.dataset.close()
+    current_df = df
+    current_session = session_id
+    current_version = uuid.uuid4().hex
+    current_profile = profile
+    with stage("context"):
+        if isinstance(df, LazyFrame):
+            current_context = generate_data_context_from_engine(df.dataset)
+        else:
+            register_dataset(current_df, current_version)
+            if profile is None:
+                current_profile = DatasetProfile.from_frame(df)
+                context = None
+            current_context = context or render_data_context(current_profile, df.head(5))
+    data_processor.reset_context()
+
+async def persist_upload_to_engine(files: List[UploadFile], session_id: str | None,
+                                   append: bool = False) -> LazyFrame:
+    """Stream the uploads to local disk and convert them to Parquet without pandas."""
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    parquet_path = dataset_path(session_id)
+    sources = []
+    try:
+        for i, upload in enumerate(files):
+            fmt = file_format(upload.filename)
+            path = parquet_path.with_suffix(f".upload{i}{Path(upload.filename).suffix.lower()}")
+            with open(path, "wb") as out:
+                while chunk := await upload.read(1024 * 1024):
+                    out.write(chunk)
+            sources.append((path, fmt))
+        dataset = DuckDBDataset.from_files(sources, parquet_path, append=append)
+    finally:
+        for path, _ in sources:
+            path.unlink(missing_ok=True)
+    return LazyFrame(dataset)
+
+def combine_chunks(base: pd.DataFrame | None, profile: DatasetProfile | None,
+                   chunks: List[pd.DataFrame]):
+    """
+    Append chunks onto base (None starts a new dataset), reconciling schemas and
+    merging per-chunk column stats into the profile. Rows already in base are
+    never rescanned once its profile exists.
+    """
+    if base is None:
+        base, chunks = chunks[0], chunks[1:]
+        profile = DatasetProfile.from_frame(base)
+    elif profile is None:
+        profile = DatasetProfile.from_frame(base)
+    else:
+        profile = copy.deepcopy(profile)
+    df = base
+    for chunk in chunks:
+        chunk = reconcile_chunk(df, chunk)
+        profile.merge(DatasetProfile.from_frame(chunk))
+        df = append_chunk(df, chunk)
+    return df, profile
+
 def extract_chart_hint(text: str) -> str | None:
     """
-    Very simple keyword-based chart intent detection.
+    Keyword-based chart intent detection.
     Returns a normalized chart type string (e.g., 'pie', 'bar', 'stacked_bar', 'line', 'area',
     'scatter', 'histogram', 'box', 'heatmap') or None if no clear intent.
     """
-    if not text:
-        return None
-    t = text.lower()
-
-    # Specific before generic to avoid false positives
-    if "stacked bar" in t or ("stacked" in t and "bar" in t):
-        return "stacked_bar"
-    if "donut" in t or "doughnut" in t or "ring" in t:
-        return "pie"  # we'll treat donut as pie with hole
-    if "heat map" in t or "heatmap" in t or "correlation matrix" in t or "corr matrix" in t:
-        return "heatmap"
-    if "boxplot" in t or "box plot" in t or "box" in t:
-        return "box"
-    if "histogram" in t or "hist" in t or "distribution" in t or "freq" in t:
-        return "histogram"
-    if "scatter" in t or "bubble" in t or "relationship" in t or "correlation" in t:
-        return "scatter"
-    if "area" in t:
-        return "area"
-    if "line" in t or "trend" in t or "over time" in t or "time series" in t or "timeseries" in t:
-        return "line"
-    if "pie" in t or "share" in t or "composition" in t:
-        return "pie"
-    if "bar" in t or "column" in t or "columns" in t or "compare categories" in t:
-        return "bar"
-
-    return None
+    return classify_intent(text).chart
 
 @app.get("/")
 async def root():
@@ -142,51 +297,100 @@ async def root():
 async def health_check():
     return {"status": "healthy", "version": "1.0.0"}
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics for this worker process."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.post("/api/upload")
-async def upload_csv(file: UploadFile = File(...), x_session_id: str | None = Header(None)):
-    """Handle CSV file upload and processing"""
-    global current_df, current_context
-    
-    if not file.filename.endswith('.csv'):
-        raise HTTPException(status_code=400, detail="Only CSV files are supported")
-    
+async def upload_csv(file: List[UploadFile] = File(...), mode: str = Form("replace"),
+                     x_session_id: str | None = Header(None)):
+    """
+    Handle dataset upload and processing. Accepts one or more CSV, Parquet,
+    JSON/JSONL or Excel files; mode="append" adds them to the current dataset.
+    """
+    files = file
+    if mode not in ("replace", "append"):
+        raise HTTPException(status_code=400, detail="mode must be 'replace' or 'append'")
+    for upload in files:
+        if file_format(upload.filename) is None:
+            raise HTTPException(status_code=400, detail=f"Unsupported file type: {upload.filename}")
+    filename = ", ".join(upload.filename for upload in files)
+    append = mode == "append"
+
     try:
-        # Read CSV file
-        contents = await file.read()
-        
-        # Try different encodings
-        try:
-            df = pd.read_csv(io.StringIO(contents.decode('utf-8')))
-        except UnicodeDecodeError:
-            try:
-                df = pd.read_csv(io.StringIO(contents.decode('latin1')))
-            except Exception:
-                df = pd.read_csv(io.StringIO(contents.decode('cp1252')))
-        
+        if engine_enabled():
+            with stage("ingest"):
+                df = await persist_upload_to_engine(files, x_session_id, append=append)
+            if df.empty:
+                raise HTTPException(status_code=400, detail="The uploaded file is empty")
+            set_current_dataset(df, session_id=x_session_id)
+            preview_limit = UPLOAD_PREVIEW_ROWS
+            return {
+                "message": "File uploaded successfully",
+                "filename": filename,
+                "mode": mode,
+                "shape": df.shape,
+                "columns": df.columns.tolist(),
+                "preview": preview_records(df, preview_limit),
+                "preview_limit": preview_limit,
+                "context": current_context
+            }
+
+        chunks = []
+        for upload in files:
+            contents = await upload.read()
+            with stage("ingest"):
+                chunk = read_upload(upload.filename, contents)
+            if not chunk.empty:
+                chunks.append(chunk)
+
         # Validate dataframe
-        if df.empty:
-            raise HTTPException(status_code=400, detail="The uploaded CSV file is empty")
-        
+        if not chunks:
+            raise HTTPException(status_code=400, detail="The uploaded file is empty")
+
+        base, profile = None, None
+        if append:
+            # Append to this session's dataset, never to whatever this worker last served
+            if x_session_id:
+                stored = await load_session_dataset(x_session_id)
+                if stored is not None:
+                    base, profile = stored.df, stored.profile
+            if base is None and current_session == x_session_id and not isinstance(current_df, LazyFrame):
+                base, profile = current_df, current_profile
+
         # Store dataframe and generate context
-        current_df = df
-        current_context = generate_data_context(df)
-        data_processor.reset_context()
+        with stage("combine"):
+            df, profile = combine_chunks(base, profile, chunks)
+        set_current_dataset(df, profile=profile, session_id=x_session_id)
 
-        # persist to redis so other workers can load
-        if x_session_id and redis_client:
+        # persist to local disk and redis so other workers can load
+        if x_session_id and disk_cache:
             try:
-                save_df_to_redis(x_session_id, current_df)
+                with stage("disk_save"):
+                    await asyncio.to_thread(disk_cache.save, x_session_id, current_df,
+                                            current_profile, current_context)
+            except Exception as e:
+                logger.warning("Failed to save dataframe to disk cache: %s", e)
+        if x_session_id and session_store:
+            try:
+                with stage("redis_save"):
+                    await session_store.save(x_session_id, current_df, current_profile, current_context)
                 logger.info("Saved dataframe to redis for session %s", x_session_id)
             except Exception as e:
                 logger.warning("Failed to save dataframe to redis: %s", e)
 
+        if prewarmer is not None:
+            prewarmer.start(x_session_id, current_df, current_version, current_context, current_profile)
+
         # Prepare response data
-        preview_limit = 100  # keep responses small
-        preview_data = df.head(preview_limit).to_dict('records')
+        preview_limit = UPLOAD_PREVIEW_ROWS  # keep responses small
+        preview_data = preview_records(df, preview_limit)
 
         return {
             "message": "File uploaded successfully",
-            "filename": file.filename,
+            "filename": filename,
+            "mode": mode,
             "shape": df.shape,
             "columns": df.columns.tolist(),
             "preview": preview_data,
@@ -199,40 +403,140 @@ async def upload_csv(file: UploadFile = File(...), x_session_id: str | None = He
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error processing file: {str(e)}")
 
+async def ensure_dataset(session_id: str | None):
+    """
+    Restore the session's dataset if this worker has none, or reopen its engine
+    dataset when another worker replaced the file; 400 when there is none at all.
+    """
+    stale = (isinstance(current_df, LazyFrame) and current_session == session_id
+             and not current_df.dataset.is_current())
+    # try load persisted dataset per-session if in-memory is None
+    if (current_df is None or stale) and session_id and engine_enabled():
+        with stage("engine_open"):
+            reopened = open_session_dataset(session_id)
+        if reopened is not None:
+            set_current_dataset(reopened, session_id=session_id)
+            logger.info("Reopened on-disk dataset for session %s", session_id)
+
+    if current_df is None and session_id:
+        stored = await load_session_dataset(session_id)
+        if stored is not None:
+            set_current_dataset(stored.df, profile=stored.profile, context=stored.context, session_id=session_id)
+            logger.info("Loaded dataframe for session %s", session_id)
+
+    if current_df is None:
+        raise HTTPException(status_code=400, detail="No dataset uploaded yet.")
+
 @app.post("/api/chat", response_model=ChatResponse)
 async def chat_with_data(request: ChatRequest, x_session_id: str | None = Header(None)):
     """Main chat endpoint with improved error handling"""
-    global current_df, current_context
-
-    # try load persisted dataset per-session if in-memory is None
-    if current_df is None and x_session_id:
-        loaded = load_df_from_redis(x_session_id)
-        if loaded is not None:
-            current_df = loaded
-            current_context = generate_data_context(current_df)
-            data_processor.reset_context()
-            logger.info("Loaded dataframe from redis for session %s", x_session_id)
-
+    await ensure_dataset(x_session_id)
+
+    if request.stream:
+        return StreamingResponse(stream_chat(request, x_session_id), media_type=NDJSON)
+    # Off the event loop: the LLM call and code execution block for seconds
+    response = await asyncio.to_thread(profile_thread(answer_question), request, OutputBuffer(),
+                                       session_id=x_session_id)
+    return encode_response(response)
+
+@app.get("/api/preview")
+async def preview_data(columns: List[str] | None = Query(None), sort: str | None = None,
+                       descending: bool = False, filter: str | None = None,
+                       cursor: str | None = None, limit: int = PREVIEW_PAGE_SIZE,
+                       format: str = "columnar", x_session_id: str | None = Header(None)):
+    """
+    One page of the dataset for browsing. `columns` (repeatable) projects,
+    `sort`/`descending` order by a column, `filter` is a JSON list of
+    {"column", "op", "value"}; pass the returned next_cursor/prev_cursor to
+    move between pages. format=arrow returns an Arrow IPC stream with the
+    paging fields in X-Total-Rows / X-Next-Cursor / X-Prev-Cursor headers.
+    """
+    if format not in ("columnar", "arrow"):
+        raise HTTPException(status_code=400, detail="format must be 'columnar' or 'arrow'")
+    await ensure_dataset(x_session_id)
+    if prewarmer is not None:
+        prewarmer.touch(x_session_id)
+    df, version = current_df, current_version
+    try:
+        filters = parse_filters(filter)
+        # Off the event loop: the first sort of a large column takes a moment
+        with stage("preview"):
+            page = await asyncio.to_thread(preview_page, df, version, columns, sort, descending,
+                                           filters, cursor, limit)
+    except StaleCursor as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except PreviewError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    with stage("encode"):
+        if format == "arrow":
+            headers = {"X-Total-Rows": str(page.total_rows)}
+            if page.next_cursor:
+                headers["X-Next-Cursor"] = page.next_cursor
+            if page.prev_cursor:
+                headers["X-Prev-Cursor"] = page.prev_cursor
+            return Response(content=page.arrow(), media_type="application/vnd.apache.arrow.stream",
+                            headers=headers)
+        return page.columnar()
+
+def answer_question(request: ChatRequest, output: OutputBuffer, on_status=None,
+                    session_id: str | None = None) -> ChatResponse:
+    """
+    Run one question through intent detection, the LLM and code execution
+    against the current dataset. Printed output is collected in `output`;
+    on_status(stage) is called as the pipeline advances. Variables from the
+    session's earlier questions are in scope for the generated code.
+    """
+    notify = on_status or (lambda _stage: None)
     try:
-        if current_df is None:
-            raise HTTPException(status_code=400, detail="No dataset uploaded yet.")
-
         # Build chat history
         chat_history = [msg.model_dump() for msg in request.chat_history]
         chat_history.append({'role': 'user', 'content': request.message})
 
-        # Extract chart hint from message or use preference
-        chart_hint = request.chart_preference or extract_chart_hint(request.message)
-
-        # Get response from LLM
-        bot_response = ask_llm(request.message, current_context, chat_history, chart_hint=chart_hint)
+        # Extract chart hint and slots (top-N, time grain, columns) from message
+        with stage("intent"):
+            intent = classify_intent(request.message, current_df.columns)
+        chart_hint = request.chart_preference or intent.chart
+
+        # Get response from LLM, unless the question was answered ahead of time
+        notify("llm")
+        df = current_df
+        trial = None
+        candidates = speculative_candidates(request.candidates)
+        warm = prewarmer.take(session_id, current_version, intent, chart_hint) if prewarmer is not None else None
+        with stage("llm"):
+            if warm is not None:
+                bot_response, trial = warm
+            elif candidates > 1:
+                failed = {}
+
+                def validate(content):
+                    # Candidates race: the first whose code runs is the answer
+                    run = data_processor.trial_run(content, df, session_id)
+                    if run is not None and run[0].ok:
+                        return run
+                    failed[content] = run
+                    return None
+
+                bot_response, trial = ask_llm_speculative(
+                    request.message, current_context, chat_history, chart_hint=chart_hint,
+                    intent_hint=intent.prompt_hint(), results_summary=data_processor.results_summary(session_id),
+                    validate=validate, candidates=candidates, session_id=session_id,
+                )
+                if trial is None:
+                    # No candidate ran cleanly: answer with the fallback's failed trial, not a second run
+                    trial = failed.get(bot_response)
+            else:
+                bot_response = ask_llm(request.message, current_context, chat_history, chart_hint=chart_hint,
+                                       intent_hint=intent.prompt_hint(),
+                                       results_summary=data_processor.results_summary(session_id))
         
         # Debug: Log the raw LLM response
         #logger.info(f"Raw LLM response: {bot_response}")
 
         # Process the LLM response
+        notify("exec")
         result, visualization = data_processor.process_llm_response(
-            bot_response, current_df, request.message
+            bot_response, df, request.message, output=output, session_id=session_id, trial=trial
         )
 
         # Extract answer from result
@@ -247,18 +551,25 @@ async def chat_with_data(request: ChatRequest, x_session_id: str | None = Header
         chat_history.append({'role': 'bot', 'content': answer})
         response_history = [ChatMessage(**msg) for msg in chat_history]
 
+        notify("render")
+        with stage("convert"):
+            visualization = convert_ndarrays(visualization)
+
         return ChatResponse(
             response=answer,
             chat_history=response_history,
-            visualization=convert_ndarrays(visualization)
+            visualization=visualization,
+            output=output.getvalue() or None,
+            output_truncated=output.truncated,
         )
         
-    except HTTPException:
-        raise
     except Exception as e:
         logger.error(f"Error in chat_with_data: {e}")
         # Return a fallback response instead of raising an error
-        error_message = "I encountered an error processing your request. Please try rephrasing your question."
+        if isinstance(e, LLMBusy):
+            error_message = "I'm handling a lot of requests right now. Please try again in a few seconds."
+        else:
+            error_message = "I encountered an error processing your request. Please try rephrasing your question."
         
         chat_history = [msg.model_dump() for msg in request.chat_history]
         chat_history.append({'role': 'user', 'content': request.message})
@@ -271,6 +582,38 @@ async def chat_with_data(request: ChatRequest, x_session_id: str | None = Header
             visualization=None
         )
 
+async def stream_chat(request: ChatRequest, session_id: str | None = None):
+    """
+    NDJSON events for a streamed chat: {"type": "status", "stage": ...} as the
+    pipeline advances, {"type": "output", "text": ...} as the code prints, and
+    a final {"type": "result", "data": ChatResponse, "timings": {stage: ms}}.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    def emit(event):
+        loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    output = OutputBuffer(on_write=lambda text: emit({"type": "output", "text": text}))
+    task = asyncio.ensure_future(asyncio.to_thread(
+        profile_thread(answer_question), request, output,
+        lambda name: emit({"type": "status", "stage": name}), session_id))
+    task.add_done_callback(lambda _: loop.call_soon_threadsafe(queue.put_nowait, None))
+
+    while (event := await queue.get()) is not None:
+        yield json.dumps(event) + "\n"
+    try:
+        response = task.result()
+    except Exception as e:
+        logger.error(f"Error in stream_chat: {e}")
+        yield json.dumps({"type": "error", "detail": "Error processing your request."}) + "\n"
+        return
+    with stage("encode"):
+        body = response.model_dump_json()
+    trace = current_trace()
+    timings = trace.timings(time.perf_counter() - trace.start) if trace is not None else {}
+    yield '{"type": "result", "timings": ' + json.dumps(timings) + ', "data": ' + body + '}\n'
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8080, reload=True)
\ No newline at end of file
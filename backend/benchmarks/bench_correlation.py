@@ -0,0 +1,91 @@
+# backend/benchmarks/bench_correlation.py
+"""
+Correlation matrix cost on wide numeric frames: DataFrame.corr() against
+utils.correlation.pairwise_corr, with a share of missing values so both take
+the pairwise-complete path. Also reports the size of the heatmap figure JSON
+viz() returns, and the time of a second call served from the version cache.
+
+Usage (from backend/):
+    python benchmarks/bench_correlation.py [--rows 100000] [--columns 20,50,200]
+        [--missing 0.05] [--json results.json]
+"""
+import argparse
+import json
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+backend_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from utils.correlation import pairwise_corr  # noqa: E402
+from utils.tools import clear_aggregation_cache, register_dataset, viz  # noqa: E402
+
+
+def make_frame(rows: int, columns: int, missing: float) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    # A few latent factors give the matrix real structure to cluster
+    factors = rng.normal(size=(rows, 5))
+    loadings = rng.normal(size=(5, columns))
+    values = factors @ loadings + rng.normal(size=(rows, columns))
+    values[rng.random((rows, columns)) < missing] = np.nan
+    return pd.DataFrame(values, columns=[f"m{i}" for i in range(columns)])
+
+
+def timed(fn):
+    start = time.perf_counter()
+    value = fn()
+    return value, round((time.perf_counter() - start) * 1000, 2)
+
+
+def run_case(rows: int, columns: int, missing: float) -> dict:
+    df = make_frame(rows, columns, missing)
+    expected, pandas_ms = timed(df.corr)
+    actual, numpy_ms = timed(lambda: pairwise_corr(df))
+    error = float(np.nanmax(np.abs(expected.to_numpy() - actual.to_numpy())))
+
+    version = uuid.uuid4().hex
+    register_dataset(df, version)
+    figure, first_ms = timed(lambda: viz("heatmap", df))
+    _, cached_ms = timed(lambda: viz("heatmap", df))
+    clear_aggregation_cache(version)
+    return {
+        "rows": rows,
+        "columns": columns,
+        "pandas_corr_ms": pandas_ms,
+        "pairwise_corr_ms": numpy_ms,
+        "speedup": round(pandas_ms / numpy_ms, 2) if numpy_ms else None,
+        "max_abs_error": error,
+        "heatmap_first_ms": first_ms,
+        "heatmap_cached_ms": cached_ms,
+        "heatmap_columns": len(figure["data"][0]["x"]),
+        "figure_bytes": len(json.dumps(figure, default=str)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--columns", default="20,50,200")
+    parser.add_argument("--missing", type=float, default=0.05)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    cases = []
+    for columns in (int(c) for c in args.columns.split(",")):
+        cases.append(run_case(args.rows, columns, args.missing))
+        print(f"{columns} columns: done", file=sys.stderr)
+
+    results = {"rows": args.rows, "missing": args.missing, "cases": cases}
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
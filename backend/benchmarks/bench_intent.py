@@ -0,0 +1,113 @@
+# backend/benchmarks/bench_intent.py
+"""
+Accuracy and latency of the chart intent classifier.
+
+Scores utils.intent.classify_intent against the labeled questions in
+intent_corpus.jsonl (chart, top_n, time_grain) next to the legacy substring
+chain it replaced, then times both on the same corpus.
+
+Usage (from backend/):
+    python benchmarks/bench_intent.py [--repeat 200] [--json results.json]
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+backend_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from utils.intent import classify_intent  # noqa: E402
+
+CORPUS = Path(__file__).with_name("intent_corpus.jsonl")
+
+
+def legacy_chart_hint(text):
+    """The original api/main.py extract_chart_hint, kept for comparison."""
+    if not text:
+        return None
+    t = text.lower()
+    if "stacked bar" in t or ("stacked" in t and "bar" in t):
+        return "stacked_bar"
+    if "donut" in t or "doughnut" in t or "ring" in t:
+        return "pie"
+    if "heat map" in t or "heatmap" in t or "correlation matrix" in t or "corr matrix" in t:
+        return "heatmap"
+    if "boxplot" in t or "box plot" in t or "box" in t:
+        return "box"
+    if "histogram" in t or "hist" in t or "distribution" in t or "freq" in t:
+        return "histogram"
+    if "scatter" in t or "bubble" in t or "relationship" in t or "correlation" in t:
+        return "scatter"
+    if "area" in t:
+        return "area"
+    if "line" in t or "trend" in t or "over time" in t or "time series" in t or "timeseries" in t:
+        return "line"
+    if "pie" in t or "share" in t or "composition" in t:
+        return "pie"
+    if "bar" in t or "column" in t or "columns" in t or "compare categories" in t:
+        return "bar"
+    return None
+
+
+def load_corpus(path=CORPUS):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def score(corpus):
+    misses = []
+    chart_ok = legacy_ok = top_ok = grain_ok = 0
+    for row in corpus:
+        intent = classify_intent(row["question"])
+        chart_ok += intent.chart == row["chart"]
+        legacy_ok += legacy_chart_hint(row["question"]) == row["chart"]
+        top_ok += intent.top_n == row["top_n"]
+        grain_ok += intent.time_grain == row["time_grain"]
+        if (intent.chart, intent.top_n, intent.time_grain) != (row["chart"], row["top_n"], row["time_grain"]):
+            misses.append({"question": row["question"],
+                           "expected": [row["chart"], row["top_n"], row["time_grain"]],
+                           "got": [intent.chart, intent.top_n, intent.time_grain]})
+    n = len(corpus)
+    return {
+        "questions": n,
+        "chart_accuracy": round(chart_ok / n, 4),
+        "legacy_chart_accuracy": round(legacy_ok / n, 4),
+        "top_n_accuracy": round(top_ok / n, 4),
+        "time_grain_accuracy": round(grain_ok / n, 4),
+        "misses": misses,
+    }
+
+
+def time_per_call(fn, questions, repeat):
+    fn(questions[0])  # warm caches / compile
+    start = time.perf_counter_ns()
+    for _ in range(repeat):
+        for q in questions:
+            fn(q)
+    return (time.perf_counter_ns() - start) / (repeat * len(questions))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    questions = [row["question"] for row in corpus]
+    results = score(corpus)
+    results["ns_per_call"] = round(time_per_call(classify_intent, questions, args.repeat))
+    results["legacy_ns_per_call"] = round(time_per_call(legacy_chart_hint, questions, args.repeat))
+
+    print(json.dumps({k: v for k, v in results.items() if k != "misses"}, indent=2))
+    for miss in results["misses"]:
+        print(f"MISS {miss['question']!r}: expected {miss['expected']} got {miss['got']}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+# backend/benchmarks/bench_pipeline.py
+"""
+End-to-end benchmark of /api/upload and /api/chat with a replayed LLM.
+
+Each (rows, shape) case runs in a fresh subprocess so peak RSS is per case.
+The child generates a seeded synthetic sales dataset, uploads it through the
+ASGI app in-process (httpx ASGITransport), then drives /api/chat with a
+concurrent load generator. The LLM is replaced by agents.replay using
+replay_responses.jsonl, so runs are deterministic and need no API key.
+
+Reported per case: upload latency, stage timings from the Server-Timing
+header (context, exec, fig_to_dict, encode, ...), chat latency percentiles,
+throughput, response payload bytes and peak RSS. Results print as JSON and
+can be written with --json to compare commits.
+
+Usage (from backend/):
+    python benchmarks/bench_pipeline.py [--rows 10000,100000,1000000]
+        [--shapes narrow,wide] [--format csv|parquet] [--requests 40]
+        [--concurrency 4] [--llm-latency-ms 0] [--json results.json]
+
+10M-row cases work (--rows 10000000) but the CSV alone is ~1 GB narrow.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+backend_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(backend_dir))
+
+REPLAY_FILE = Path(__file__).with_name("replay_responses.jsonl")
+WIDE_EXTRA_COLUMNS = 92  # wide shape has 100 columns in total
+
+REGIONS = ["North", "South", "East", "West", "Central"]
+CATEGORIES = ["Furniture", "Office Supplies", "Technology", "Apparel", "Grocery", "Toys"]
+SEGMENTS = ["Consumer", "Corporate", "Home Office", "Small Business"]
+
+
+def make_dataset(rows: int, shape: str, seed: int = 0) -> pd.DataFrame:
+    """Synthetic sales data matching the columns the replayed responses use."""
+    rng = np.random.default_rng(seed)
+    days = rng.integers(0, 3 * 365, rows)
+    quantity = rng.integers(1, 20, rows)
+    price = np.round(rng.lognormal(3.5, 0.8, rows), 2)
+    discount = np.round(rng.choice([0, 0.05, 0.1, 0.2, 0.3], rows, p=[0.5, 0.2, 0.15, 0.1, 0.05]), 2)
+    sales = np.round(quantity * price * (1 - discount), 2)
+    data = {
+        "order_date": (np.datetime64("2022-01-01") + days).astype(str),
+        "region": rng.choice(REGIONS, rows),
+        "category": rng.choice(CATEGORIES, rows),
+        "segment": rng.choice(SEGMENTS, rows),
+        "product": np.char.add("Product ", rng.integers(0, 2000, rows).astype(str)),
+        "quantity": quantity,
+        "discount": discount,
+        "sales": sales,
+        "profit": np.round(sales * rng.normal(0.12, 0.1, rows), 2),
+    }
+    if shape == "wide":
+        for i in range(WIDE_EXTRA_COLUMNS):
+            data[f"metric_{i:02d}"] = rng.normal(i, 1 + i % 7, rows)
+    return pd.DataFrame(data)
+
+
+def encode_dataset(df: pd.DataFrame, fmt: str) -> tuple[str, bytes]:
+    if fmt == "parquet":
+        buf = io.BytesIO()
+        df.to_parquet(buf, index=False)
+        return "bench.parquet", buf.getvalue()
+    return "bench.csv", df.to_csv(index=False).encode()
+
+
+def parse_server_timing(header: str | None) -> dict:
+    """{stage: milliseconds} from a Server-Timing header."""
+    stages = {}
+    for entry in (header or "").split(","):
+        parts = [p.strip() for p in entry.split(";")]
+        for p in parts[1:]:
+            if p.startswith("dur="):
+                stages[parts[0]] = float(p[4:])
+    return stages
+
+
+def summarize(values) -> dict | None:
+    if not values:
+        return None
+    arr = np.asarray(values, dtype=float)
+    return {
+        "mean": round(float(arr.mean()), 3),
+        "p50": round(float(np.percentile(arr, 50)), 3),
+        "p90": round(float(np.percentile(arr, 90)), 3),
+        "p99": round(float(np.percentile(arr, 99)), 3),
+        "max": round(float(arr.max()), 3),
+    }
+
+
+def current_rss() -> int | None:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def peak_rss() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+async def run_case(args) -> dict:
+    import httpx
+
+    df = make_dataset(args.rows, args.shape, seed=args.seed)
+    filename, payload = encode_dataset(df, args.format)
+    columns = len(df.columns)
+    del df
+    questions = [json.loads(line)["question"] for line in open(REPLAY_FILE) if line.strip()]
+
+    from api.main import app
+
+    rss_baseline = current_rss()
+    headers = {"X-Session-ID": "bench"}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        start = time.perf_counter()
+        r = await client.post("/api/upload", headers=headers,
+                              files={"file": (filename, payload, "application/octet-stream")})
+        upload_seconds = time.perf_counter() - start
+        r.raise_for_status()
+        upload = {
+            "seconds": round(upload_seconds, 4),
+            "request_bytes": len(payload),
+            "response_bytes": len(r.content),
+            "stages_ms": parse_server_timing(r.headers.get("server-timing")),
+        }
+        del payload
+
+        # One pass over every question warms imports and caches
+        for q in questions:
+            (await client.post("/api/chat", headers=headers, json={"message": q})).raise_for_status()
+
+        latencies, sizes, stages, errors = [], [], {}, 0
+        sem = asyncio.Semaphore(args.concurrency)
+
+        async def one(i):
+            nonlocal errors
+            async with sem:
+                t0 = time.perf_counter()
+                resp = await client.post("/api/chat", headers=headers,
+                                         json={"message": questions[i % len(questions)]})
+                latencies.append((time.perf_counter() - t0) * 1000)
+            sizes.append(len(resp.content))
+            if resp.status_code != 200 or resp.json().get("visualization") is None:
+                errors += 1
+            for name, ms in parse_server_timing(resp.headers.get("server-timing")).items():
+                stages.setdefault(name, []).append(ms)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(args.requests)))
+        wall = time.perf_counter() - start
+
+    return {
+        "rows": args.rows,
+        "shape": args.shape,
+        "columns": columns,
+        "format": args.format,
+        "upload": upload,
+        "chat": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "errors": errors,
+            "throughput_rps": round(args.requests / wall, 3),
+            "latency_ms": summarize(latencies),
+            "payload_bytes": summarize(sizes),
+            "stages_ms": {name: summarize(v) for name, v in stages.items()},
+        },
+        "rss_baseline_bytes": rss_baseline,
+        "peak_rss_bytes": peak_rss(),
+    }
+
+
+def git_revision() -> dict:
+    def _git(*cmd):
+        try:
+            return subprocess.run(["git", *cmd], cwd=backend_dir, capture_output=True,
+                                  text=True, timeout=30).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return None
+    return {"commit": _git("rev-parse", "--short", "HEAD"),
+            "dirty": bool(_git("status", "--porcelain", "--untracked-files=no"))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="10000,100000,1000000",
+                        help="comma-separated row counts")
+    parser.add_argument("--shapes", default="narrow,wide", help="narrow (9 cols) and/or wide (100 cols)")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--requests", type=int, default=40, help="chat requests per case")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0,
+                        help="simulated LLM latency per call")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--shape", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        args.rows = int(args.rows)
+        print(json.dumps(asyncio.run(run_case(args))))
+        return
+
+    env = dict(os.environ, LLM_BACKEND="replay", LLM_REPLAY_FILE=str(REPLAY_FILE),
+               LLM_REPLAY_LATENCY_MS=str(args.llm_latency_ms), REDIS_URL="")
+    cases = []
+    for rows in (int(r) for r in args.rows.split(",")):
+        for shape in args.shapes.split(","):
+            cmd = [sys.executable, __file__, "--child", "--rows", str(rows), "--shape", shape,
+                   "--format", args.format, "--requests", str(args.requests),
+                   "--concurrency", str(args.concurrency), "--seed", str(args.seed)]
+            print(f"running rows={rows} shape={shape} ...", file=sys.stderr)
+            proc = subprocess.run(cmd, cwd=backend_dir, env=env, capture_output=True, text=True)
+            if proc.returncode != 0:
+                print(proc.stderr[-4000:], file=sys.stderr)
+                cases.append({"rows": rows, "shape": shape, "error": proc.stderr.strip().splitlines()[-1:]})
+                continue
+            cases.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    results = {
+        "meta": {
+            **git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("child", "shape")},
+        },
+        "cases": cases,
+    }
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# backend/benchmarks/bench_preview.py
+"""
+Latency of /api/preview pages (core.preview) on a large synthetic dataset.
+
+For each view (stored order, sort ascending/descending, sort plus filter) the
+first page is timed separately, since it builds the cached sort order, and
+then --pages consecutive pages are followed by cursor and summarized as
+p50/p95/max milliseconds, including the columnar JSON body.
+
+Usage (from backend/):
+    python benchmarks/bench_preview.py [--rows 5000000] [--pages 50]
+        [--limit 100] [--json results.json]
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+backend_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from core.preview import Filter, clear_preview_cache, preview_page  # noqa: E402
+
+
+def make_frame(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "order_id": np.arange(rows),
+        "amount": rng.gamma(2.0, 50.0, rows).round(2),
+        "quantity": rng.integers(1, 20, rows),
+        "region": pd.Categorical(rng.choice(["North", "South", "East", "West"], rows)),
+        "created": pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 365 * 24 * 3600, rows), unit="s"),
+    })
+
+
+VIEWS = {
+    "stored_order": {},
+    "sort_amount": {"sort": "amount"},
+    "sort_amount_desc": {"sort": "amount", "descending": True},
+    "sort_created_filtered": {"sort": "created",
+                              "filters": [Filter("region", "eq", "West"), Filter("quantity", "gt", 10)]},
+}
+
+
+def time_view(df, version, view: dict, pages: int, limit: int) -> dict:
+    start = time.perf_counter()
+    page = preview_page(df, version, limit=limit, **view)
+    page.columnar()
+    first = (time.perf_counter() - start) * 1000
+    times = []
+    for _ in range(pages):
+        if page.next_cursor is None:
+            break
+        start = time.perf_counter()
+        page = preview_page(df, version, limit=limit, cursor=page.next_cursor, **view)
+        page.columnar()
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return {
+        "first_page_ms": round(first, 2),
+        "total_rows": page.total_rows,
+        "p50_ms": round(statistics.median(times), 2),
+        "p95_ms": round(times[int(len(times) * 0.95) - 1], 2),
+        "max_ms": round(times[-1], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    df = make_frame(args.rows)
+    version = uuid.uuid4().hex
+    cases = {}
+    for name, view in VIEWS.items():
+        cases[name] = time_view(df, version, view, args.pages, args.limit)
+        print(f"{name}: done", file=sys.stderr)
+    clear_preview_cache(version)
+
+    results = {"rows": args.rows, "limit": args.limit, "pages": args.pages, "views": cases}
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
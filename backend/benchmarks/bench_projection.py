@@ -0,0 +1,107 @@
+# backend/benchmarks/bench_projection.py
+"""
+Execution time of the replayed analysis snippets with and without column
+projection (core.projection) on a wide synthetic dataset.
+
+Each snippet from replay_responses.jsonl runs through core.executor's thread
+backend twice per repeat, once with the full-frame copy and once with the
+projected copy, and the median times are reported with the columns kept.
+same_result says whether both runs produced the same result and figure.
+
+Usage (from backend/):
+    python benchmarks/bench_projection.py [--rows 200000] [--shape wide]
+        [--repeat 5] [--json results.json]
+"""
+import argparse
+import json
+import logging
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+backend_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(backend_dir))
+
+import core.executor as executor_module  # noqa: E402
+from benchmarks.bench_pipeline import make_dataset  # noqa: E402
+from core.data_processor import DataProcessor  # noqa: E402
+from core.executor import create_executor  # noqa: E402
+from core.projection import plan_projection  # noqa: E402
+from utils.output import OutputBuffer  # noqa: E402
+
+RESPONSES = Path(__file__).with_name("replay_responses.jsonl")
+
+
+def load_snippets() -> list[tuple[str, str]]:
+    parser = DataProcessor.__new__(DataProcessor)
+    snippets = []
+    with open(RESPONSES) as f:
+        for line in f:
+            entry = json.loads(line)
+            code, _ = parser._parse_response(entry["response"])
+            snippets.append((entry["question"], code))
+    return snippets
+
+
+def same_value(a, b) -> bool:
+    if isinstance(a, (pd.DataFrame, pd.Series)):
+        return type(a) is type(b) and a.equals(b)
+    return repr(a) == repr(b)
+
+
+def time_run(executor, code, df, projection: bool) -> tuple[float, object]:
+    executor_module.EXEC_COLUMN_PROJECTION = projection
+    executor.reset()
+    start = time.perf_counter()
+    result = executor.run(code, df, output=OutputBuffer())
+    elapsed = time.perf_counter() - start
+    if not result.ok:
+        raise RuntimeError(f"snippet failed: {result.error}")
+    return elapsed * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--shape", default="wide")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    df = make_dataset(args.rows, args.shape)
+    executor = create_executor("thread")
+    cases = []
+    for question, code in load_snippets():
+        plan = plan_projection(code, df)
+        full, projected = [], []
+        for _ in range(args.repeat):
+            ms, full_result = time_run(executor, code, df, projection=False)
+            full.append(ms)
+            ms, projected_result = time_run(executor, code, df, projection=True)
+            projected.append(ms)
+        same = same_value(full_result.result, projected_result.result) \
+            and same_value(full_result.figure, projected_result.figure)
+        cases.append({
+            "question": question,
+            "columns_kept": None if plan is None else len(plan.columns),
+            "full_ms": round(statistics.median(full), 2),
+            "projected_ms": round(statistics.median(projected), 2),
+            "same_result": same,
+        })
+        print(f"{question}: done", file=sys.stderr)
+
+    results = {"rows": args.rows, "shape": args.shape, "columns": len(df.columns),
+               "frame_bytes": int(df.memory_usage(index=True, deep=True).sum()),
+               "repeat": args.repeat, "cases": cases}
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
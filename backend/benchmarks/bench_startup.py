@@ -0,0 +1,101 @@
+# backend/benchmarks/bench_startup.py
+"""
+Worker startup cost: `python -X importtime -c "import api.main"`.
+
+Runs the import in fresh interpreters, reports the median cumulative import
+time of api.main, wall time, and the heaviest top-level imports. Fails (exit
+status 1) when the median exceeds the budget or when a module that should be
+lazy (plotly, groq, duckdb, redis) was imported at startup.
+
+Usage (from backend/):
+    python benchmarks/bench_startup.py [--runs 5] [--budget-ms 1200] [--json results.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+backend_dir = Path(__file__).resolve().parent.parent
+
+# Budget for the median `import api.main` time, in milliseconds. pandas and
+# fastapi alone account for ~900 ms on a small cloud instance.
+STARTUP_BUDGET_MS = 1200
+
+# Must not be imported until a request needs them
+LAZY_MODULES = ("plotly", "groq", "duckdb", "redis")
+
+
+def parse_importtime(stderr: str):
+    """[(depth, cumulative_us, module)] from -X importtime output, in import order."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((depth, int(cumulative), name.strip()))
+    return rows
+
+
+def run_once(module: str):
+    env = {k: v for k, v in os.environ.items()
+           if k not in ("GROQ_API_KEY", "REDIS_URL", "QUERY_ENGINE")}
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=backend_dir, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    return wall, parse_importtime(proc.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="api.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    runs = []
+    for _ in range(args.runs):
+        wall, rows = run_once(args.module)
+        total = next(c for d, c, name in rows if d == 0 and name == args.module)
+        runs.append((total / 1000, wall * 1000, rows))
+
+    median_ms = statistics.median(r[0] for r in runs)
+    # Break down the run closest to the median
+    _, _, rows = min(runs, key=lambda r: abs(r[0] - median_ms))
+    top = sorted(((c, name) for d, c, name in rows if d == 1), reverse=True)[:args.top]
+    leaked = sorted({name for _, _, name in rows if name.split(".")[0] in LAZY_MODULES})
+
+    results = {
+        "module": args.module,
+        "runs": args.runs,
+        "import_ms_median": round(median_ms, 1),
+        "import_ms_all": [round(r[0], 1) for r in runs],
+        "wall_ms_median": round(statistics.median(r[1] for r in runs), 1),
+        "budget_ms": args.budget_ms,
+        "heaviest_imports_ms": {name: round(c / 1000, 1) for c, name in top},
+        "lazy_modules_imported": leaked,
+    }
+    results["ok"] = median_ms <= args.budget_ms and not leaked
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if not results["ok"]:
+        if leaked:
+            print(f"FAIL: imported at startup: {', '.join(leaked)}", file=sys.stderr)
+        if median_ms > args.budget_ms:
+            print(f"FAIL: {median_ms:.0f} ms exceeds budget {args.budget_ms:.0f} ms", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+# backend/benchmarks/bench_storage.py
+"""
+Session storage round trips: core.storage.SessionStore (async client,
+pickle-5 out-of-band buffers, pipelined writes) against the previous
+approach (sync client, BytesIO pickle, one key per value), plus the
+node-local core.disk_cache tier (memory-mapped Arrow files).
+
+For each dataset size it reports save/load latency, the longest event-loop
+stall while the operation runs (a 1 ms ticker measures it), and peak memory
+allocated during a load. Runs against an in-process fakeredis server by
+default, or a real server with --url.
+
+Usage (from backend/):
+    python benchmarks/bench_storage.py [--rows 100000,1000000] [--shapes narrow,wide]
+        [--repeat 3] [--url redis://localhost:6379/0] [--json results.json]
+"""
+import argparse
+import asyncio
+import io
+import json
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import pandas as pd
+
+backend_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from benchmarks.bench_pipeline import make_dataset  # noqa: E402
+from core.disk_cache import DiskCache  # noqa: E402
+from core.profile import DatasetProfile  # noqa: E402
+from core.storage import SessionStore  # noqa: E402
+
+SESSION = "bench"
+TTL = 600
+
+
+class LegacyStore:
+    """The pre-SessionStore helpers from api/main.py, kept for comparison."""
+
+    def __init__(self, client):
+        self.client = client
+
+    async def save(self, session_id, df, profile=None, context=None):
+        buf = io.BytesIO()
+        df.to_pickle(buf)
+        buf.seek(0)
+        self.client.set(f"dataset:{session_id}", buf.read(), ex=TTL)
+        if profile is not None:
+            self.client.set(f"profile:{session_id}", profile.to_json(), ex=TTL)
+
+    async def load(self, session_id):
+        data = self.client.get(f"dataset:{session_id}")
+        df = pd.read_pickle(io.BytesIO(data))
+        profile = self.client.get(f"profile:{session_id}")
+        return df, DatasetProfile.from_json(profile) if profile else None
+
+
+class DiskStore:
+    """DiskCache behind the same async interface, as api/main.py calls it."""
+
+    def __init__(self, cache: DiskCache):
+        self.cache = cache
+
+    async def save(self, session_id, df, profile=None, context=None):
+        await asyncio.to_thread(self.cache.save, session_id, df, profile, context)
+
+    async def load(self, session_id):
+        return await asyncio.to_thread(self.cache.load, session_id)
+
+
+async def measure(op) -> tuple[float, float]:
+    """(seconds, longest event-loop stall in ms) for one awaited operation."""
+    stall = 0.0
+    running = True
+
+    async def ticker():
+        nonlocal stall
+        last = time.perf_counter()
+        while running:
+            await asyncio.sleep(0.001)
+            now = time.perf_counter()
+            stall = max(stall, (now - last) * 1000 - 1)
+            last = now
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    await op()
+    elapsed = time.perf_counter() - start
+    running = False
+    await task
+    return elapsed, max(stall, 0.0)
+
+
+async def peak_load_bytes(store) -> int:
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before, _ = tracemalloc.get_traced_memory()
+    await store.load(SESSION)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak - before
+
+
+async def bench_store(name, store, df, profile, context, repeat) -> dict:
+    saves, loads, save_stalls, load_stalls = [], [], [], []
+    for _ in range(repeat):
+        t, s = await measure(lambda: store.save(SESSION, df, profile, context))
+        saves.append(t * 1000)
+        save_stalls.append(s)
+        t, s = await measure(lambda: store.load(SESSION))
+        loads.append(t * 1000)
+        load_stalls.append(s)
+    return {
+        "store": name,
+        "save_ms": round(statistics.median(saves), 2),
+        "load_ms": round(statistics.median(loads), 2),
+        "save_max_loop_stall_ms": round(max(save_stalls), 2),
+        "load_max_loop_stall_ms": round(max(load_stalls), 2),
+        "load_peak_alloc_bytes": await peak_load_bytes(store),
+    }
+
+
+async def run(args) -> dict:
+    if args.url:
+        import redis
+        sync_client = redis.from_url(args.url)
+        store = SessionStore.from_url(args.url, ttl=TTL)
+        backend = args.url
+    else:
+        import fakeredis
+        server = fakeredis.FakeServer()
+        sync_client = fakeredis.FakeRedis(server=server)
+        store = SessionStore(fakeredis.aioredis.FakeRedis(server=server), ttl=TTL)
+        backend = "fakeredis"
+    legacy = LegacyStore(sync_client)
+    disk_dir = tempfile.TemporaryDirectory(prefix="bench_disk_cache_")
+    disk = DiskStore(DiskCache(disk_dir.name))
+
+    cases = []
+    for rows in (int(r) for r in args.rows.split(",")):
+        for shape in args.shapes.split(","):
+            df = make_dataset(rows, shape)
+            profile = DatasetProfile.from_frame(df)
+            context = "x" * 4096
+            results = [
+                await bench_store("legacy", legacy, df, profile, context, args.repeat),
+                await bench_store("session_store", store, df, profile, context, args.repeat),
+                await bench_store("disk_cache", disk, df, profile, context, args.repeat),
+            ]
+            cases.append({"rows": rows, "shape": shape,
+                          "frame_bytes": int(df.memory_usage(index=True, deep=True).sum()),
+                          "results": results})
+            print(f"rows={rows} shape={shape} done", file=sys.stderr)
+    await store.delete(SESSION)
+    sync_client.delete(f"dataset:{SESSION}", f"profile:{SESSION}")
+    await store.close()
+    disk_dir.cleanup()
+    return {"backend": backend, "repeat": args.repeat, "cases": cases}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="100000,1000000")
+    parser.add_argument("--shapes", default="narrow,wide")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--url", help="real Redis URL instead of fakeredis")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,10 @@
 import pandas as pd
 import numpy as np
 
+from core.profile import TOP_VALUES_TRACKED, ColumnStats, DatasetProfile
+from core.sketches import HyperLogLog, TDigest, TopK
+from utils.tools import correlation_matrix
+
 def generate_data_context(df):
     """
     Generate a comprehensive data context for the LLM to understand the dataset.
@@ -15,113 +19,182 @@ def generate_data_context(df):
     """
     if df is None or df.empty:
         return "No data available."
-    
+    return render_data_context(DatasetProfile.from_frame(df), df.head(5))
+
+def render_data_context(profile, sample_df, note=None):
+    """
+    Render the data context from a DatasetProfile. Every statistic comes from
+    the mergeable column stats, so an appended or Redis-restored dataset never
+    needs to be rescanned.
+
+    Args:
+        profile (core.profile.DatasetProfile): Column statistics for the dataset
+        sample_df (pd.DataFrame): A few rows for the sample preview
+        note (str): Extra line shown after the shape, e.g. the query engine in use
+
+    Returns:
+        str: Formatted context string describing the dataset
+    """
+    n_rows = profile.rows
+    columns = list(profile.columns)
+    if n_rows == 0 or not columns:
+        return "No data available."
+
     context_parts = []
     
     # Basic dataset information
-    context_parts.append(f"Dataset Shape: {df.shape[0]} rows, {df.shape[1]} columns")
+    context_parts.append(f"Dataset Shape: {n_rows} rows, {len(columns)} columns")
+    if note:
+        context_parts.append(note)
     
     # Column information with data types and sample values
     context_parts.append("\nColumns and Data Types:")
-    for col in df.columns[:20]:  # Show more columns since we removed hardcoding
-        dtype = str(df[col].dtype)
-        null_count = df[col].isnull().sum()
-        null_pct = (null_count / len(df) * 100) if len(df) > 0 else 0
+    for col in columns[:20]:  # Show more columns since we removed hardcoding
+        st = profile.columns[col]
+        null_pct = st.nulls / n_rows * 100
         
-        if df[col].dtype in ['object', 'category', 'string']:
-            unique_count = df[col].nunique()
+        if st.kind == "text":
+            unique_count = st.unique_count
             if unique_count <= 10 and unique_count > 0:
                 # Show actual unique values for small categorical sets
-                unique_values = df[col].dropna().unique()[:5]
+                unique_values = list(st.topk.counts)[:5]  # first-seen order, as unique() gives
                 sample_values = f" (values: {', '.join(map(str, unique_values))})"
                 if unique_count > 5:
                     sample_values += f" ...+{unique_count-5} more"
             else:
                 sample_values = f" ({unique_count} unique values)"
-            context_parts.append(f"- {col}: {dtype}{sample_values} | {null_pct:.1f}% null")
+            context_parts.append(f"- {col}: {st.dtype}{sample_values} | {null_pct:.1f}% null")
             
-        elif df[col].dtype in ['datetime64[ns]', 'datetime64', 'datetime']:
+        elif st.kind == "datetime" and st.count:
             # Handle datetime columns
-            try:
-                min_date = df[col].min()
-                max_date = df[col].max()
-                context_parts.append(f"- {col}: {dtype} | Range: {min_date} to {max_date} | {null_pct:.1f}% null")
-            except:
-                context_parts.append(f"- {col}: {dtype} | {null_pct:.1f}% null")
+            context_parts.append(f"- {col}: {st.dtype} | Range: {st.min} to {st.max} | {null_pct:.1f}% null")
                 
-        else:
+        elif st.kind == "numeric":
             # Numeric columns
-            try:
-                if not df[col].isnull().all():
-                    min_val = df[col].min()
-                    max_val = df[col].max()
-                    mean_val = df[col].mean()
-                    context_parts.append(f"- {col}: {dtype} | Range: {min_val:.2f} to {max_val:.2f} (avg: {mean_val:.2f}) | {null_pct:.1f}% null")
-                else:
-                    context_parts.append(f"- {col}: {dtype} | All null values")
-            except:
-                context_parts.append(f"- {col}: {dtype} | {null_pct:.1f}% null")
-    
-    if len(df.columns) > 20:
-        context_parts.append(f"... and {len(df.columns) - 20} more columns")
+            if st.count:
+                context_parts.append(f"- {col}: {st.dtype} | Range: {st.min:.2f} to {st.max:.2f} (avg: {st.mean:.2f}) | {null_pct:.1f}% null")
+            else:
+                context_parts.append(f"- {col}: {st.dtype} | All null values")
+        else:
+            context_parts.append(f"- {col}: {st.dtype} | {null_pct:.1f}% null")
+    
+    if len(columns) > 20:
+        context_parts.append(f"... and {len(columns) - 20} more columns")
     
     # Sample data preview (more rows for better context)
     context_parts.append("\nSample Data (first 5 rows):")
     try:
-        sample_data = df.head(5).to_string(max_cols=10, max_colwidth=50)
+        sample_data = sample_df.head(5).to_string(max_cols=10, max_colwidth=50)
         context_parts.append(sample_data)
     except Exception:
         context_parts.append("Sample data preview unavailable")
     
     # Summary statistics for numeric columns
-    numeric_cols = df.select_dtypes(include=[np.number]).columns
-    if len(numeric_cols) > 0:
-        context_parts.append(f"\nNumeric Summary (showing {min(8, len(numeric_cols))} columns):")
-        try:
-            summary = df[numeric_cols[:8]].describe().round(2)
-            context_parts.append(summary.to_string())
-        except Exception:
-            context_parts.append("Summary statistics unavailable")
+    numeric_cols = [c for c in columns if profile.columns[c].kind == "numeric"]
+    # Like describe(), the summary leaves out boolean columns
+    summary_cols = [c for c in numeric_cols if not profile.columns[c].dtype.lower().startswith("bool")]
+    if len(summary_cols) > 0:
+        context_parts.append(f"\nNumeric Summary (showing {min(8, len(summary_cols))} columns):")
+        summary = pd.DataFrame(
+            {c: _describe(profile.columns[c]) for c in summary_cols[:8]},
+            index=["count", "mean", "std", "min", "25%", "50%", "75%", "max"],
+        ).astype(float).round(2)
+        context_parts.append(summary.to_string())
     
     # Identify column types dynamically (no hardcoded assumptions)
     context_parts.append("\nColumn Analysis:")
     
     # Categorical columns
-    categorical_cols = df.select_dtypes(include=['object', 'category', 'string']).columns.tolist()
+    categorical_cols = [c for c in columns if profile.columns[c].kind == "text"]
     if categorical_cols:
-        context_parts.append(f"- Text/Categorical columns ({len(categorical_cols)}): {', '.join(categorical_cols[:8])}")
+        context_parts.append(f"- Text/Categorical columns ({len(categorical_cols)}): {', '.join(map(str, categorical_cols[:8]))}")
         if len(categorical_cols) > 8:
             context_parts.append(f"  ...and {len(categorical_cols) - 8} more")
     
     # Numeric columns
     if len(numeric_cols) > 0:
-        integer_cols = df.select_dtypes(include=['int64', 'int32', 'int16', 'int8']).columns.tolist()
-        float_cols = df.select_dtypes(include=['float64', 'float32', 'float16']).columns.tolist()
+        integer_cols = [c for c in numeric_cols if _number_family(profile.columns[c].dtype) == "int"]
+        float_cols = [c for c in numeric_cols if _number_family(profile.columns[c].dtype) == "float"]
         
         if integer_cols:
-            context_parts.append(f"- Integer columns ({len(integer_cols)}): {', '.join(integer_cols[:6])}")
+            context_parts.append(f"- Integer columns ({len(integer_cols)}): {', '.join(map(str, integer_cols[:6]))}")
         if float_cols:
-            context_parts.append(f"- Float columns ({len(float_cols)}): {', '.join(float_cols[:6])}")
+            context_parts.append(f"- Float columns ({len(float_cols)}): {', '.join(map(str, float_cols[:6]))}")
     
     # Date columns
-    date_cols = df.select_dtypes(include=['datetime64']).columns.tolist()
+    date_cols = [c for c in columns if profile.columns[c].kind == "datetime"]
     if date_cols:
-        context_parts.append(f"- Date/Time columns ({len(date_cols)}): {', '.join(date_cols[:5])}")
+        context_parts.append(f"- Date/Time columns ({len(date_cols)}): {', '.join(map(str, date_cols[:5]))}")
     
     # Data quality insights
     context_parts.append("\nData Quality:")
-    total_nulls = df.isnull().sum().sum()
-    total_cells = df.shape[0] * df.shape[1]
+    total_nulls = sum(st.nulls for st in profile.columns.values())
+    total_cells = n_rows * len(columns)
     null_percentage = (total_nulls / total_cells * 100) if total_cells > 0 else 0
     context_parts.append(f"- Overall missing data: {null_percentage:.1f}% ({total_nulls:,} out of {total_cells:,} cells)")
     
     # Columns with high null percentage
-    high_null_cols = df.columns[df.isnull().sum() / len(df) > 0.5].tolist()
+    high_null_cols = [c for c in columns if profile.columns[c].nulls / n_rows > 0.5]
     if high_null_cols:
-        context_parts.append(f"- Columns with >50% missing: {', '.join(high_null_cols[:5])}")
+        context_parts.append(f"- Columns with >50% missing: {', '.join(map(str, high_null_cols[:5]))}")
     
     return "\n".join(context_parts)
 
+def _describe(st):
+    """describe()-style values for one numeric ColumnStats."""
+    return [st.count, st.mean, st.std, st.min,
+            st.quantile(0.25), st.quantile(0.5), st.quantile(0.75), st.max]
+
+class ColumnRoles:
+    """
+    What each column is for: time axes, grouping dimensions, numeric
+    measures and identifiers, as pre-warming plans its overview questions.
+    """
+
+    __slots__ = ("time", "dimensions", "measures", "identifiers", "unique_counts")
+
+    def __init__(self):
+        self.time = []
+        self.dimensions = []
+        self.measures = []
+        self.identifiers = []
+        self.unique_counts = {}
+
+def _looks_like_dates(s, sample_size=100):
+    """True for a text column whose values (sampled) parse as dates, e.g. an unparsed CSV date."""
+    if not (pd.api.types.is_object_dtype(s) or pd.api.types.is_string_dtype(s)):
+        return False
+    sample = s.dropna().head(sample_size).astype(str)
+    if sample.empty or not sample.str.contains(r"[-/:]").all():
+        return False
+    parsed = pd.to_datetime(sample, errors="coerce", format="mixed")
+    return parsed.notna().mean() >= 0.9
+
+def column_roles(df):
+    """
+    Classify df's columns by role. Low-cardinality columns (under 5% unique and
+    fewer than 20 values) are dimensions, near-unique non-float ones (over 95%)
+    identifiers, and the remaining numeric columns measures.
+    """
+    roles = ColumnRoles()
+    total_count = len(df)
+    for col in df.columns:
+        s = df[col]
+        unique_count = s.nunique()
+        roles.unique_counts[col] = unique_count
+        if total_count == 0:
+            continue
+        unique_ratio = unique_count / total_count
+        if pd.api.types.is_datetime64_any_dtype(s) or _looks_like_dates(s):
+            roles.time.append(col)
+        elif unique_ratio < 0.05 and unique_count < 20:  # Low cardinality
+            roles.dimensions.append(col)
+        elif unique_ratio > 0.95 and not pd.api.types.is_float_dtype(s):  # High cardinality (likely IDs)
+            roles.identifiers.append(col)
+        elif pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+            roles.measures.append(col)
+    return roles
+
 def analyze_data_patterns(df):
     """
     Analyze data patterns without making assumptions about content.
@@ -133,15 +206,16 @@ def analyze_data_patterns(df):
     numeric_cols = df.select_dtypes(include=[np.number]).columns
     if len(numeric_cols) > 1:
         try:
-            corr_matrix = df[numeric_cols].corr()
+            # Shared with the heatmap chart, so the matrix is computed once per dataset
+            corr_matrix = correlation_matrix(df, numeric_cols)
             # Find highly correlated pairs
-            high_corr_pairs = []
-            for i in range(len(corr_matrix.columns)):
-                for j in range(i+1, len(corr_matrix.columns)):
-                    corr_val = corr_matrix.iloc[i, j]
-                    if abs(corr_val) > 0.7:  # Strong correlation
-                        col1, col2 = corr_matrix.columns[i], corr_matrix.columns[j]
-                        high_corr_pairs.append(f"{col1} ↔ {col2} ({corr_val:.2f})")
+            rows, cols = np.triu_indices(len(corr_matrix.columns), k=1)
+            values = corr_matrix.to_numpy()[rows, cols]
+            strong = np.flatnonzero(np.abs(values) > 0.7)  # Strong correlation
+            high_corr_pairs = [
+                f"{corr_matrix.columns[rows[p]]} ↔ {corr_matrix.columns[cols[p]]} ({values[p]:.2f})"
+                for p in strong[:3]
+            ]
             
             if high_corr_pairs:
                 insights.append(f"Strong correlations found: {'; '.join(high_corr_pairs[:3])}")
@@ -168,4 +242,132 @@ def analyze_data_patterns(df):
     if high_cardinality_cols:
         insights.append(f"High cardinality columns (likely identifiers): {', '.join(high_cardinality_cols[:5])}")
     
-    return insights
\ No newline at end of file
+    return insights
+
+_SQL_INT_TYPES = ("TINYINT", "SMALLINT", "INTEGER", "BIGINT", "HUGEINT",
+                  "UTINYINT", "USMALLINT", "UINTEGER", "UBIGINT")
+_SQL_FLOAT_TYPES = ("FLOAT", "DOUBLE", "REAL", "DECIMAL")
+
+# Bucket midpoints at which the engine's approximate quantiles seed a column's t-digest
+_ENGINE_QUANTILES = [(i + 0.5) / 100 for i in range(100)]
+
+
+def _number_family(dtype: str) -> str | None:
+    """'int' or 'float' for a pandas or DuckDB numeric type name, else None."""
+    t = dtype.upper()
+    if t.startswith(("INT", "UINT") + _SQL_INT_TYPES):
+        return "int"
+    if t.startswith(_SQL_FLOAT_TYPES):
+        return "float"
+    return None
+
+
+def _sql_kind(sql_type: str) -> str:
+    """The core.profile column kind of a DuckDB type."""
+    t = sql_type.upper()
+    if t.startswith(_SQL_INT_TYPES + _SQL_FLOAT_TYPES + ("BOOLEAN",)):
+        return "numeric"
+    if t.startswith(("DATE", "TIMESTAMP", "TIME")):
+        return "datetime"
+    if t.startswith(("VARCHAR", "ENUM", "UUID")):
+        return "text"
+    return "other"
+
+
+def _timestamp(value):
+    return pd.Timestamp(value) if value is not None else None
+
+
+def profile_from_engine(dataset, text_columns: int = 20):
+    """
+    A core.profile.DatasetProfile computed with aggregate queries inside the
+    query engine, so memory stays bounded regardless of dataset size.
+
+    One scan gives counts, min/max, mean, variance and approximate quantiles
+    (seeding each numeric column's t-digest). The first `text_columns` text
+    columns, the ones the context shows, also get a HyperLogLog from a GROUP
+    BY over hash registers, and exact top values when they are few.
+
+    Args:
+        dataset (core.query_engine.DuckDBDataset): The persisted dataset
+    """
+    from core.query_engine import TABLE_NAME, quote_identifier
+
+    profile = DatasetProfile()
+    profile.rows = n_rows = dataset.num_rows
+    kinds = {c: _sql_kind(dataset.sql_types[c]) for c in dataset.columns}
+    if n_rows == 0 or not kinds:
+        return profile
+
+    exprs, slots = [], []
+    for c, kind in kinds.items():
+        q = quote_identifier(c)
+        exprs.append(f"count({q})")
+        slots.append((c, "count"))
+        if kind == "numeric":
+            x = f"CAST({q} AS DOUBLE)"
+            exprs += [f"min({x})", f"max({x})", f"avg({x})", f"var_samp({x})",
+                      f"approx_quantile({x}, {_ENGINE_QUANTILES})"]
+            slots += [(c, "min"), (c, "max"), (c, "mean"), (c, "var"), (c, "quantiles")]
+        elif kind == "datetime":
+            exprs += [f"min({q})", f"max({q})"]
+            slots += [(c, "min"), (c, "max")]
+    row = dataset.scalar_row(f"SELECT {', '.join(exprs)} FROM {TABLE_NAME}")
+    aggregates = {}
+    for (c, name), value in zip(slots, row):
+        aggregates.setdefault(c, {})[name] = value
+
+    text_shown = [c for c, kind in kinds.items() if kind == "text"][:text_columns]
+    for c, kind in kinds.items():
+        agg = aggregates[c]
+        stats = ColumnStats(c, dataset.sql_types[c], kind)
+        stats.count = int(agg["count"])
+        stats.nulls = n_rows - stats.count
+        if stats.count and kind == "numeric":
+            stats.min, stats.max, stats.mean = agg["min"], agg["max"], agg["mean"]
+            stats.m2 = (agg["var"] or 0.0) * (stats.count - 1)
+            stats.digest = TDigest.from_quantiles(agg["quantiles"] or [], stats.count)
+        elif stats.count and kind == "datetime":
+            stats.min, stats.max = _timestamp(agg["min"]), _timestamp(agg["max"])
+        if stats.topk is not None:
+            # Nothing counted yet: no value is known exactly
+            stats.topk.error = stats.count
+        if stats.count and c in text_shown:
+            q = quote_identifier(c)
+            minima = dataset.sql(
+                f"SELECT (hash({q}) >> 52)::BIGINT AS idx, min(hash({q}) & {(1 << 52) - 1}) AS rest "
+                f"FROM {TABLE_NAME} WHERE {q} IS NOT NULL GROUP BY 1"
+            )
+            stats.hll = HyperLogLog.from_minima(minima["idx"], minima["rest"].astype(np.uint64), p=12)
+            if stats.hll.estimate() <= TOP_VALUES_TRACKED:
+                # The most frequent values, listed in the order they first appear
+                first_seen = dataset.row_number or "0"
+                counts = dataset.sql(
+                    f"SELECT v, n FROM (SELECT {q} AS v, count(*) AS n, min({first_seen}) AS first "
+                    f"FROM {dataset.source} WHERE {q} IS NOT NULL "
+                    f"GROUP BY 1 ORDER BY 2 DESC LIMIT {TOP_VALUES_TRACKED + 1}) ORDER BY first, n DESC"
+                )
+                stats.topk = TopK.from_counts(counts.set_index("v")["n"], TOP_VALUES_TRACKED)
+        profile.columns[c] = stats
+    return profile
+
+
+def generate_data_context_from_engine(dataset):
+    """
+    The data context for an engine-backed dataset: render_data_context over
+    profile_from_engine, with a note steering generated code to sql().
+
+    Args:
+        dataset (core.query_engine.DuckDBDataset): The persisted dataset
+
+    Returns:
+        str: Formatted context string describing the dataset
+    """
+    from core.query_engine import TABLE_NAME
+
+    note = (
+        f"Query engine: DuckDB. The full table is named {TABLE_NAME}; prefer "
+        f"sql(\"SELECT ... FROM {TABLE_NAME} ...\") for filters and aggregations "
+        f"(it returns a pandas DataFrame) instead of operating on the whole df."
+    )
+    return render_data_context(profile_from_engine(dataset), dataset.read_columns(limit=5), note=note)
@@ -2,12 +2,12 @@
 import json
 import re
 import pandas as pd
-import plotly.express as px
 import logging
 from typing import Optional, Tuple, Dict, Any
 import traceback
-import sys
-import io
+from core.executor import DEFAULT_SESSION, ExecutionResult, Executor, create_executor
+from utils.metrics import stage
+from utils.output import OutputBuffer
 
 logger = logging.getLogger(__name__)
 
@@ -17,14 +17,36 @@ class DataProcessor:
     This class is completely AI-driven without hardcoded assumptions.
     """
     
-    def __init__(self):
-        self.context = {}
+    def __init__(self, executor: Optional[Executor] = None):
+        self.executor = executor or create_executor()
     
     def reset_context(self):
-        """Reset any stored context"""
-        self.context = {}
+        """Forget the results kept from earlier runs (e.g. after a new upload)"""
+        self.executor.reset()
     
-    def process_llm_response(self, llm_response: str, df: pd.DataFrame, user_question: str) -> Tuple[Any, Optional[Dict]]:
+    def results_summary(self, session_id: Optional[str] = None) -> Optional[str]:
+        """Prompt summary of the session's stored results, including prev_result"""
+        return self.executor.results.summary(session_id or DEFAULT_SESSION)
+    
+    def trial_run(self, llm_response: str, df: pd.DataFrame,
+                  session_id: Optional[str] = None) -> Optional[Tuple[ExecutionResult, OutputBuffer]]:
+        """
+        Parse and execute a candidate response without touching the session's
+        stored results. Returns (execution, printed output), or None when the
+        response holds no code. Pass the pair back to process_llm_response as
+        `trial` to use it without running the code again.
+        """
+        with stage("parse"):
+            code, _ = self._parse_response(llm_response)
+        if not code:
+            return None
+        output = OutputBuffer()
+        return self.executor.run(code, df, session_id=session_id, output=output, commit=False), output
+    
+    def process_llm_response(self, llm_response: str, df: pd.DataFrame, user_question: str,
+                             output: Optional[OutputBuffer] = None,
+                             session_id: Optional[str] = None,
+                             trial: Optional[Tuple[ExecutionResult, OutputBuffer]] = None) -> Tuple[Any, Optional[Dict]]:
         """
         Process LLM response and execute code with improved error handling
         
@@ -32,6 +54,9 @@ class DataProcessor:
             llm_response: Raw response from the LLM
             df: The dataframe to operate on
             user_question: Original user query
+            output: Receives whatever the code prints (a fresh buffer if omitted)
+            session_id: Whose variables from earlier runs are in scope
+            trial: A trial_run() of this response, committed instead of re-running
             
         Returns:
             Tuple of (result, visualization_dict)
@@ -40,7 +65,8 @@ class DataProcessor:
             # logger.info(f"Processing LLM response: {llm_response[:200]}...")
             
             # Parse the response to extract code
-            code, answer = self._parse_response(llm_response)
+            with stage("parse"):
+                code, answer = self._parse_response(llm_response)
             
             if not code:
                 logger.warning("No code found in LLM response")
@@ -52,7 +78,7 @@ class DataProcessor:
             # logger.info(f"Code preview: {code[:200]}...")
             
             # Execute the code
-            result, visualization = self._execute_code(code, df)
+            result, visualization = self._execute_code(code, df, output, session_id, trial)
             # logger.info(f"Code execution completed. Result: {result}")
             
             # Return the result with answer
@@ -130,103 +156,20 @@ class DataProcessor:
             print(f"DEBUG: All parsing methods failed")
             return "", None
     
-    def _execute_code(self, code: str, df: pd.DataFrame) -> Tuple[Any, Optional[Dict]]:
+    def _execute_code(self, code: str, df: pd.DataFrame, output: Optional[OutputBuffer] = None,
+                      session_id: Optional[str] = None,
+                      trial: Optional[Tuple[ExecutionResult, OutputBuffer]] = None) -> Tuple[Any, Optional[Dict]]:
         """
-        Execute the extracted code safely with comprehensive logging
+        Execute the extracted code with the configured executor backend
         """
-        try:
-            # logger.info(f"Starting code execution...")
-            # logger.info(f"DataFrame shape: {df.shape}")
-            # logger.info(f"DataFrame columns: {df.columns.tolist()}")
-            
-            # Capture print statements
-            old_stdout = sys.stdout
-            sys.stdout = captured_output = io.StringIO()
-            
-            # Create a safe execution environment
-            namespace = {
-                'df': df.copy(),
-                'pd': pd,
-                'px': px,
-                'viz': self._create_visualization,
-                'result': None,
-                'fig': None,
-                'print': print  # Ensure print works
-            }
-            
-            # logger.info(f"Executing code: {code}")
-            
-            # Execute the code
-            exec(code, namespace)
-            
-            # Restore stdout and get captured output
-            sys.stdout = old_stdout
-            output = captured_output.getvalue()
-            
-            # logger.info(f"Code execution output: {output}")
-            
-            # Get the result
-            result = namespace.get('result', 'Analysis completed')
-            fig = namespace.get('fig', None)
-            
-            # logger.info(f"Result from namespace: {result}")
-            # logger.info(f"Figure object: {fig is not None}")
-            
-            # Convert Plotly figure to dict if present
-            visualization = None
-            if fig is not None:
-                try:
-                    visualization = fig.to_dict()
-                    # logger.info("Visualization created successfully")
-                except Exception as e:
-                    logger.error(f"Error converting visualization: {e}")
-            
-            return result, visualization
-            
-        except Exception as e:
-            # Restore stdout
-            sys.stdout = old_stdout
-            logger.error(f"Code execution failed: {e}")
-            logger.error(f"Code was: {code}")
-            logger.error(f"Traceback: {traceback.format_exc()}")
-            return f"Error executing code: {str(e)}", None
-    
-    def _create_visualization(self, chart_type: str, data: pd.DataFrame, **kwargs) -> Any:
-        """
-        Create visualizations using Plotly Express
-        """
-        try:
-            logger.info(f"Creating {chart_type} chart with data shape: {data.shape}")
-            logger.info(f"Chart kwargs: {kwargs}")
-            
-            chart_type = chart_type.lower()
-            
-            if chart_type == 'bar':
-                fig = px.bar(data, **kwargs)
-            elif chart_type == 'line':
-                fig = px.line(data, **kwargs)
-            elif chart_type == 'scatter':
-                fig = px.scatter(data, **kwargs)
-            elif chart_type == 'pie':
-                fig = px.pie(data, **kwargs)
-            elif chart_type == 'histogram':
-                fig = px.histogram(data, **kwargs)
-            elif chart_type == 'box':
-                fig = px.box(data, **kwargs)
-            elif chart_type == 'area':
-                fig = px.area(data, **kwargs)
-            elif chart_type == 'heatmap':
-                fig = px.imshow(data, **kwargs)
-            elif chart_type == 'stacked_bar':
-                fig = px.bar(data, **kwargs)
-            else:
-                logger.warning(f"Unknown chart type: {chart_type}, defaulting to bar")
-                fig = px.bar(data, **kwargs)
-            
-            logger.info(f"Chart created successfully")
-            return fig
-                
-        except Exception as e:
-            logger.error(f"Error creating visualization: {e}")
-            logger.error(f"Traceback: {traceback.format_exc()}")
-            raise
\ No newline at end of file
+        if trial is not None:
+            execution, printed = trial
+            self.executor.commit(session_id, execution)
+            if output is not None:
+                output.write(printed.getvalue(marker=False))
+                output.dropped += printed.dropped
+        else:
+            execution = self.executor.run(code, df, session_id=session_id, output=output)
+        if not execution.ok:
+            return f"Error executing code: {execution.error}", None
+        return execution.result, execution.figure
@@ -0,0 +1,195 @@
+# backend/core/disk_cache.py
+"""
+Node-local disk tier for session datasets, between worker RAM and Redis.
+
+Each session's frame is written as an uncompressed Arrow IPC (Feather v2)
+file, with its profile and context in a JSON sidecar. Reloads memory-map the
+file: numeric and timestamp columns without nulls become zero-copy views, so
+rehydration only touches pages the request reads. Every column comes back
+with the dtype it was saved with (recorded in the file's schema metadata, next
+to the write token), so a reloaded
+frame behaves like the upload: object string columns are rebuilt as Python
+strings. The data file is replaced before its sidecar and both carry the
+same write token; a sidecar from another write is ignored, so a reader
+never pairs a frame with a stale profile. The schema metadata also records
+when the entry expires: with the session's Redis keys, or DATA_TTL_SECONDS
+after the write. An expired entry is a miss, so a session Redis has dropped
+is not served from disk. Files are shared by all workers on the node;
+recency is the file mtime (touched on every hit) and the least recently
+used sessions are evicted when the directory exceeds its byte budget.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import pandas as pd
+
+from core.profile import DatasetProfile
+from core.storage import DATA_TTL_SECONDS, StoredDataset
+
+logger = logging.getLogger(__name__)
+
+DISK_CACHE_ENABLED = os.getenv("DISK_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+DISK_CACHE_DIR = Path(os.getenv("DISK_CACHE_DIR",
+                                os.path.join(tempfile.gettempdir(), "insightai", "sessions")))
+DISK_CACHE_MAX_BYTES = int(os.getenv("DISK_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+
+_ARROW_SUFFIX = ".arrow"
+_META_SUFFIX = ".json"
+# Arrow schema metadata keys: the write token pairing a data file with its
+# sidecar, the frame's pandas dtypes and the entry's expiry (epoch seconds)
+_TOKEN_KEY = b"insightai_write"
+_DTYPES_KEY = b"insightai_dtypes"
+_EXPIRES_KEY = b"insightai_expires"
+
+
+def _safe_name(session_id: str) -> str:
+    # A digest, not the filtered ID: "a.b" and "ab" must not share a file
+    return hashlib.sha256(session_id.encode()).hexdigest()[:32]
+
+
+class DiskCache:
+    """
+    Arrow files under `directory`, evicted LRU-first beyond `max_bytes`;
+    entries lapse `ttl` seconds after they are written unless told otherwise.
+    """
+
+    def __init__(self, directory: Path = DISK_CACHE_DIR, max_bytes: int = DISK_CACHE_MAX_BYTES,
+                 ttl: int = DATA_TTL_SECONDS):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+    def _paths(self, session_id: str) -> tuple[Path, Path]:
+        name = _safe_name(session_id)
+        return self.directory / f"{name}{_ARROW_SUFFIX}", self.directory / f"{name}{_META_SUFFIX}"
+
+    def save(self, session_id: str, df: pd.DataFrame, profile: DatasetProfile | None = None,
+             context: str | None = None, expires_at: float | None = None) -> bool:
+        """
+        Write the session's dataset; False when df cannot be stored as Arrow.
+        Pass expires_at (epoch seconds) to lapse with a copy loaded from Redis.
+        """
+        import pyarrow as pa
+
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+            # e.g. object columns mixing strings and numbers
+            logger.info("Not caching session %s on disk: %s", session_id, e)
+            return False
+
+        write = uuid.uuid4().hex
+        dtypes = json.dumps([str(dtype) for dtype in df.dtypes])
+        expires = repr(expires_at if expires_at is not None else time.time() + self.ttl)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), _TOKEN_KEY: write,
+                                               _DTYPES_KEY: dtypes, _EXPIRES_KEY: expires})
+        self.directory.mkdir(parents=True, exist_ok=True)
+        data_path, meta_path = self._paths(session_id)
+        token = f".{os.getpid()}.{threading.get_ident()}"
+        tmp = data_path.with_suffix(f"{token}.tmp")
+        meta_tmp = meta_path.with_suffix(f"{token}.meta.tmp")
+        try:
+            # Uncompressed so the file can be mapped without decoding
+            with pa.OSFile(str(tmp), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+            meta = {"write": write, "context": context,
+                    "profile": profile.to_json() if profile is not None else None}
+            meta_tmp.write_text(json.dumps(meta))
+            # Data first: until the sidecar lands, its token does not match and it is ignored
+            os.replace(tmp, data_path)
+            os.replace(meta_tmp, meta_path)
+        finally:
+            tmp.unlink(missing_ok=True)
+            meta_tmp.unlink(missing_ok=True)
+        self.evict(keep=data_path)
+        return True
+
+    def load(self, session_id: str) -> StoredDataset | None:
+        """The session's dataset memory-mapped from disk, or None on a miss."""
+        import pyarrow as pa
+
+        data_path, meta_path = self._paths(session_id)
+        try:
+            source = pa.memory_map(str(data_path), "r")
+        except FileNotFoundError:
+            return None
+        try:
+            reader = pa.ipc.open_file(source)
+            schema_meta = reader.schema.metadata or {}
+            # A miss, left for the next write or evict(); entries written before
+            # expiries were recorded count as expired
+            expires_at = float(schema_meta.get(_EXPIRES_KEY, b"0"))
+            if expires_at <= time.time():
+                source.close()
+                return None
+            df = reader.read_all().to_pandas(split_blocks=True)
+            _restore_dtypes(df, json.loads(schema_meta.get(_DTYPES_KEY, b"null")))
+            meta = json.loads(meta_path.read_text()) if meta_path.exists() else {}
+            if meta.get("write") != schema_meta.get(_TOKEN_KEY, b"").decode():
+                # Sidecar of an older or unfinished write: keep the frame, recompute the rest
+                meta = {}
+        except (OSError, ValueError, pa.ArrowException) as e:
+            logger.warning("Dropping unreadable disk cache entry for %s: %s", session_id, e)
+            self.delete(session_id)
+            return None
+        # mtime is the LRU clock shared by every worker on this node
+        now = time.time()
+        try:
+            os.utime(data_path, (now, now))
+        except OSError:
+            pass
+        profile = DatasetProfile.from_json(meta["profile"]) if meta.get("profile") else None
+        return StoredDataset(df, profile, meta.get("context"), expires_at)
+
+    def delete(self, session_id: str) -> None:
+        for path in self._paths(session_id):
+            path.unlink(missing_ok=True)
+
+    def evict(self, keep: Path | None = None) -> int:
+        """
+        Remove least recently used entries until under budget, and entries
+        untouched for a whole TTL (expired whatever their stamp); returns
+        bytes freed.
+        """
+        with self._lock:
+            try:
+                entries = [(e.stat().st_mtime, e.stat().st_size, Path(e.path))
+                           for e in os.scandir(self.directory) if e.name.endswith(_ARROW_SUFFIX)]
+            except FileNotFoundError:
+                return 0
+            total = sum(size for _, size, _ in entries)
+            freed = 0
+            stale_before = time.time() - self.ttl
+            for mtime, size, path in sorted(entries):
+                if total <= self.max_bytes and mtime >= stale_before:
+                    break
+                if path == keep:
+                    continue
+                path.unlink(missing_ok=True)
+                path.with_suffix(_META_SUFFIX).unlink(missing_ok=True)
+                total -= size
+                freed += size
+            if freed:
+                logger.info("Disk cache evicted %d bytes", freed)
+            return freed
+
+
+def _restore_dtypes(df: pd.DataFrame, dtypes: list | None) -> None:
+    """Cast columns Arrow brought back as a different dtype (e.g. object strings) to the saved one."""
+    if not dtypes or len(dtypes) != len(df.columns):
+        return
+    for i, (current, saved) in enumerate(zip(df.dtypes, dtypes)):
+        if str(current) == saved:
+            continue
+        try:
+            df.isetitem(i, df.iloc[:, i].astype(saved))
+        except (TypeError, ValueError) as e:
+            logger.debug("Keeping %s for column %r instead of %s: %s", current, df.columns[i], saved, e)
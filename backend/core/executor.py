@@ -0,0 +1,352 @@
+# backend/core/executor.py
+"""
+One entry point for running generated analysis code.
+
+Executor.run() executes a snippet against a copy of the session's dataset with
+pd, px, go and the shared viz() helper (utils.tools) in scope, plus sql() for
+engine-backed datasets, and returns an ExecutionResult: the snippet's `result`
+(or the value of a bare expression), its `fig` as a dict, and any error.
+Printed output goes to the caller's OutputBuffer.
+
+Backends (EXEC_BACKEND):
+- thread: exec in the calling thread with full builtins.
+- restricted: import lines stripped and only whitelisted builtins. This guards
+  against accidents, not hostile code; use the process backend for isolation.
+- process: a pool of worker processes with a timeout. A crash or runaway
+  snippet cannot take the API worker down. The dataset and session variables
+  are pickled to the worker, and output arrives when the snippet finishes.
+
+Data a snippet binds is kept per session in a core.results.ResultStore and is
+in scope for that session's next snippet, together with `prev_result`, so a
+follow-up can reuse `monthly` or `region_sales` instead of recomputing it.
+`result` and `fig` start fresh on every run. Stored values the snippet names
+are handed over as copies: in-place edits are kept only when the run
+succeeds (and is committed).
+
+Before running, core.projection works out which columns the snippet reads;
+when it can, the snippet gets a copy of just those columns instead of the
+whole frame.
+"""
+import logging
+import os
+import pickle
+import re
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+
+from core.projection import EXEC_COLUMN_PROJECTION, is_read_only, plan_projection
+from core.query_engine import LazyFrame
+from core.results import PREV_RESULT, ResultStore, is_mutable, is_storable, pick_prev_result, snapshot
+from utils.metrics import stage
+from utils.output import OutputBuffer, capture_output
+from utils.tools import dataset_version, register_dataset
+
+logger = logging.getLogger(__name__)
+
+EXEC_BACKEND = os.getenv("EXEC_BACKEND", "thread").lower()
+EXEC_PROCESS_WORKERS = int(os.getenv("EXEC_PROCESS_WORKERS", 2))
+# Wall-clock limit for one snippet in the process backend
+EXEC_TIMEOUT_SECONDS = float(os.getenv("EXEC_TIMEOUT_SECONDS", 60))
+
+DEFAULT_SESSION = "default"
+
+# Names the executor provides; never carried over between runs
+_PROVIDED = {"__builtins__", "df", "pd", "px", "go", "viz", "sql", "result", "fig", "print"}
+
+_SAFE_BUILTINS = {
+    name: getattr(__import__("builtins"), name)
+    for name in ("len", "str", "int", "float", "bool", "list", "dict", "tuple", "set",
+                 "min", "max", "sum", "abs", "round", "sorted", "enumerate", "zip", "range",
+                 "isinstance", "any", "all", "reversed")
+}
+
+_IDENTIFIER = re.compile(r"[A-Za-z_]\w*")
+_IMPORT_LINE = re.compile(r'^\s*(?:import\s+[^\n]+|from\s+[^\n]+import\s+[^\n]+)', re.MULTILINE)
+
+
+class ExecutionResult:
+    """
+    Outcome of one snippet: its result value, figure dict and error message.
+    `carried` holds the values to store for the session when the run was not
+    committed (see Executor.run).
+    """
+
+    __slots__ = ("result", "figure", "error", "carried")
+
+    def __init__(self, result=None, figure: dict | None = None, error: str | None = None):
+        self.result = result
+        self.figure = figure
+        self.error = error
+        self.carried = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _build_namespace(df, variables: dict, restricted: bool, output: OutputBuffer,
+                     copy_df: bool = True, version: str | None = None) -> dict:
+    import plotly.express as px  # deferred: keeps plotly out of worker startup
+    import plotly.graph_objects as go
+    from utils.tools import viz
+
+    if copy_df:
+        df = df.copy()
+    if version is not None:
+        # The snippet's copy shares the dataset's cached chart aggregations and correlations
+        register_dataset(df, version)
+    namespace = dict(variables)
+    namespace.update({
+        "df": df,
+        "pd": pd,
+        "px": px,
+        "go": go,
+        "viz": viz,
+        "result": None,
+        "fig": None,
+        "print": output.print,
+    })
+    if restricted:
+        namespace["__builtins__"] = dict(_SAFE_BUILTINS, print=output.print)
+    if isinstance(df, LazyFrame):
+        namespace["sql"] = df.sql
+    return namespace
+
+
+def _named_mutables(code: str, variables: dict) -> set:
+    """Stored names the code mentions whose values it could edit in place."""
+    return {name for name in set(_IDENTIFIER.findall(code))
+            if name in variables and is_mutable(variables[name])}
+
+
+def _carried_variables(namespace: dict, variables: dict, edited=()) -> dict:
+    """
+    Data the snippet bound or rebound, plus the `edited` copies it was given,
+    to keep for the session's next run.
+    """
+    carried = {name: value for name, value in namespace.items()
+               if name not in _PROVIDED and not name.startswith("_")
+               and value is not variables.get(name) and is_storable(value)}
+    for name in edited:
+        if namespace.get(name) is variables[name]:
+            carried[name] = variables[name]
+    return carried
+
+
+def _execute(code: str, df, variables: dict, restricted: bool,
+             output: OutputBuffer, copy_df: bool = True,
+             version: str | None = None, copy_variables: bool = True) -> tuple[ExecutionResult, dict]:
+    """
+    Run code in a fresh namespace; (result, variables to carry over). Pass
+    copy_df=False when df is already a private copy, copy_variables=False
+    when the stored values are too (unpickled in a worker), and the dataset
+    version when the code is read-only so chart helpers may use the
+    version's caches. Stored values the code names run on copies, which are
+    carried back, edits included, only when it succeeds.
+    """
+    if restricted:
+        code = _IMPORT_LINE.sub("", code)
+    edited = _named_mutables(code, variables)
+    if copy_variables and edited:
+        variables = dict(variables)
+        variables.update((name, snapshot(variables[name])) for name in edited)
+    namespace = _build_namespace(df, variables, restricted, output, copy_df, version)
+    try:
+        # A bare expression (df.describe()) is its own result
+        compiled, is_expression = compile(code, "<analysis>", "eval"), True
+    except SyntaxError:
+        compiled, is_expression = None, False
+    try:
+        if compiled is None:
+            compiled = compile(code, "<analysis>", "exec")
+        with capture_output(output):
+            if is_expression:
+                value = eval(compiled, namespace)
+                if value is not None:
+                    namespace["result"] = value
+            else:
+                exec(compiled, namespace)
+    except Exception as e:
+        logger.error(f"Code execution failed: {e}")
+        logger.error(f"Code was: {code}")
+        logger.error(f"Traceback: {traceback.format_exc()}")
+        # New bindings are kept; the stored values' copies, edited or not, are dropped
+        return ExecutionResult(error=str(e)), _carried_variables(namespace, variables)
+
+    result = namespace.get("result")
+    if result is None:
+        result = "Analysis completed"
+    figure = None
+    fig = namespace.get("fig")
+    if fig is not None:
+        try:
+            with stage("fig_to_dict"):
+                figure = fig.to_dict() if hasattr(fig, "to_dict") else dict(fig)
+        except Exception as e:
+            logger.error(f"Error converting visualization: {e}")
+    return ExecutionResult(result, figure), _carried_variables(namespace, variables, edited)
+
+
+class Executor:
+    """Runs snippets and keeps each session's results between runs."""
+
+    name = "thread"
+    restricted = False
+
+    def __init__(self, results: ResultStore | None = None):
+        self.results = results if results is not None else ResultStore()
+
+    def run(self, code: str, df, session_id: str | None = None,
+            output: OutputBuffer | None = None, commit: bool = True) -> ExecutionResult:
+        """
+        Run code with the session's stored results in scope. With commit=False
+        the values it bound are left on result.carried for commit() instead of
+        being stored, so a trial run does not change the session.
+        """
+        session_id = session_id or DEFAULT_SESSION
+        if output is None:
+            output = OutputBuffer()
+        variables = self.results.get(session_id)
+        copy_df = True
+        version = None
+        if isinstance(df, pd.DataFrame):
+            version = dataset_version(df)
+            if version is not None and not is_read_only(code):
+                version = None
+        if EXEC_COLUMN_PROJECTION and isinstance(df, pd.DataFrame):
+            with stage("project"):
+                plan = plan_projection(code, df)
+            if plan is not None:
+                code = plan.code
+                variables.update(plan.bindings(df))
+                # reindex builds new column arrays, so no second copy is needed
+                df = df.reindex(columns=plan.columns)
+                copy_df = False
+        with stage("exec"):
+            result, carried = self._run(code, df, variables, output, copy_df, version)
+        if result.ok:
+            carried[PREV_RESULT] = pick_prev_result(result.result, carried)
+        if commit:
+            self.results.update(session_id, carried)
+        else:
+            result.carried = carried
+        return result
+
+    def commit(self, session_id: str | None, result: ExecutionResult) -> None:
+        """Store the values of a run made with commit=False."""
+        if result.carried:
+            self.results.update(session_id or DEFAULT_SESSION, result.carried)
+        result.carried = None
+
+    def _run(self, code, df, variables, output, copy_df=True, version=None):
+        return _execute(code, df, variables, self.restricted, output, copy_df, version)
+
+    def reset(self, session_id: str | None = None) -> None:
+        """Forget stored results for one session, or all of them."""
+        self.results.clear(session_id)
+
+    def shutdown(self) -> None:
+        pass
+
+
+class RestrictedExecutor(Executor):
+    name = "restricted"
+    restricted = True
+
+
+def _run_in_child(code: str, df, variables: dict, max_output_bytes: int, version: str | None = None):
+    """Process-pool entry point: returns (result, figure, error, output, dropped, variables)."""
+    output = OutputBuffer(max_output_bytes)
+    # df was unpickled in this process, so it is already a private copy
+    result, carried = _execute(code, df, variables, False, output, copy_df=False, version=version,
+                               copy_variables=False)
+    value = result.result
+    if not _picklable(value):
+        value = str(value)
+    carried = {name: v for name, v in carried.items() if _picklable(v)}
+    return value, result.figure, result.error, output.getvalue(marker=False), output.dropped, carried
+
+
+def _picklable(value) -> bool:
+    try:
+        pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        return False
+    return True
+
+
+class ProcessExecutor(Executor):
+    """
+    Runs snippets in a spawn-started process pool. Engine-backed datasets hold
+    a DuckDB connection that cannot cross processes, so they run in-thread.
+    """
+
+    name = "process"
+
+    def __init__(self, results: ResultStore | None = None,
+                 workers: int = EXEC_PROCESS_WORKERS, timeout: float = EXEC_TIMEOUT_SECONDS):
+        super().__init__(results)
+        self.workers = workers
+        self.timeout = timeout
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                import multiprocessing
+
+                # spawn: forking a threaded server process is not safe
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def _discard_pool(self, pool: ProcessPoolExecutor) -> None:
+        with self._pool_lock:
+            if self._pool is pool:
+                self._pool = None
+        # A timed-out snippet keeps running until its process is killed
+        for process in list(getattr(pool, "_processes", {}).values()):
+            process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, code, df, variables, output, copy_df=True, version=None):
+        if isinstance(df, LazyFrame):
+            return _execute(code, df, variables, False, output, copy_df)
+        pool = self._get_pool()
+        # A worker keeps its own chart caches, keyed by the same dataset versions
+        future = pool.submit(_run_in_child, code, df, variables, max(output.max_bytes - output.size, 0), version)
+        try:
+            value, figure, error, text, dropped, carried = future.result(timeout=self.timeout)
+        except FutureTimeout:
+            self._discard_pool(pool)
+            logger.error("Code execution timed out after %.0fs", self.timeout)
+            return ExecutionResult(error=f"Execution timed out after {self.timeout:.0f} seconds"), {}
+        except BrokenProcessPool as e:
+            self._discard_pool(pool)
+            logger.error(f"Execution process died: {e}")
+            return ExecutionResult(error="Execution process exited unexpectedly"), {}
+        output.write(text)
+        output.dropped += dropped
+        return ExecutionResult(value, figure, error), carried
+
+    def shutdown(self) -> None:
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+_BACKENDS = {cls.name: cls for cls in (Executor, RestrictedExecutor, ProcessExecutor)}
+
+
+def create_executor(backend: str = EXEC_BACKEND, results: ResultStore | None = None) -> Executor:
+    """An executor for the named backend: thread, restricted or process."""
+    try:
+        cls = _BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown EXEC_BACKEND {backend!r}; expected one of {sorted(_BACKENDS)}") from None
+    return cls(results)
@@ -0,0 +1,136 @@
+# backend/core/ingest.py
+import io
+import logging
+from pathlib import Path
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Extension -> reader name. Columnar formats skip text parsing entirely.
+SUPPORTED_EXTENSIONS = {
+    ".csv": "csv",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+    ".json": "json",
+    ".xlsx": "excel",
+    ".xls": "excel",
+}
+
+
+def file_format(filename: str | None) -> str | None:
+    """Return the reader name for a filename, or None if unsupported."""
+    if not filename:
+        return None
+    return SUPPORTED_EXTENSIONS.get(Path(filename).suffix.lower())
+
+
+def read_excel(source) -> pd.DataFrame:
+    """
+    First sheet of an Excel workbook (a path or file object). .xlsx needs
+    openpyxl and legacy .xls needs xlrd; a missing one is a ValueError so the
+    upload is rejected with a message instead of failing opaquely.
+    """
+    try:
+        return pd.read_excel(source)
+    except ImportError as e:
+        raise ValueError(f"Excel support is not installed on the server: {e}") from e
+
+
+def _read_csv(contents: bytes) -> pd.DataFrame:
+    # Try different encodings
+    for encoding in ("utf-8", "latin1"):
+        try:
+            return pd.read_csv(io.BytesIO(contents), encoding=encoding)
+        except UnicodeDecodeError:
+            continue
+    return pd.read_csv(io.BytesIO(contents), encoding="cp1252")
+
+
+def read_upload(filename: str, contents: bytes) -> pd.DataFrame:
+    """
+    Parse an uploaded file into a DataFrame based on its extension.
+
+    Parquet is read with the pyarrow dtype backend so columns stay Arrow-backed
+    instead of being converted to NumPy/object arrays.
+
+    Raises:
+        ValueError: if the extension is not supported
+    """
+    fmt = file_format(filename)
+    if fmt == "csv":
+        return _read_csv(contents)
+    if fmt == "parquet":
+        return pd.read_parquet(io.BytesIO(contents), dtype_backend="pyarrow")
+    if fmt == "jsonl":
+        return pd.read_json(io.BytesIO(contents), lines=True)
+    if fmt == "json":
+        return pd.read_json(io.BytesIO(contents))
+    if fmt == "excel":
+        return read_excel(io.BytesIO(contents))
+    supported = ", ".join(sorted(SUPPORTED_EXTENSIONS))
+    raise ValueError(f"Unsupported file type. Supported: {supported}")
+
+
+def _kind(s: pd.Series) -> str:
+    if pd.api.types.is_bool_dtype(s.dtype):
+        return "bool"
+    if pd.api.types.is_numeric_dtype(s.dtype):
+        return "numeric"
+    if pd.api.types.is_datetime64_any_dtype(s.dtype):
+        return "datetime"
+    return "other"
+
+
+def _coerce_like(s: pd.Series, target: pd.Series) -> pd.Series | None:
+    """Cast s to target's kind if that loses no non-null values, else None."""
+    kind = _kind(target)
+    try:
+        if kind == "numeric":
+            converted = pd.to_numeric(s, errors="coerce")
+        elif kind == "datetime":
+            converted = pd.to_datetime(s, errors="coerce")
+        elif kind == "other" and pd.api.types.is_string_dtype(target.dtype):
+            converted = s.astype(target.dtype).where(s.notna())
+        else:
+            return None
+    except (TypeError, ValueError):
+        return None
+    if converted.isna().sum() > s.isna().sum():
+        return None
+    return converted
+
+
+def reconcile_chunk(base: pd.DataFrame, chunk: pd.DataFrame) -> pd.DataFrame:
+    """
+    Align a new chunk's schema to base: columns whose kind differs (e.g. dates
+    that arrived as text in a CSV but as timestamps in Parquet) are cast to the
+    base kind when that is lossless. Columns only one side has are kept; concat
+    fills the other side with nulls.
+    """
+    chunk = chunk.copy(deep=False)
+    for col in chunk.columns:
+        if col not in base.columns:
+            continue
+        if chunk[col].dtype == base[col].dtype:
+            continue
+        if _kind(chunk[col]) == _kind(base[col]):
+            # Same kind, different storage (e.g. Arrow vs Python strings)
+            if pd.api.types.is_string_dtype(base[col].dtype) and pd.api.types.is_string_dtype(chunk[col].dtype):
+                chunk[col] = chunk[col].astype(base[col].dtype)
+            continue
+        converted = _coerce_like(chunk[col], base[col])
+        if converted is not None:
+            chunk[col] = converted
+        else:
+            logger.info("Column %s has incompatible types across chunks; widening", col)
+    return chunk
+
+
+def append_chunk(base: pd.DataFrame, chunk: pd.DataFrame) -> pd.DataFrame:
+    """Concatenate an already-reconciled chunk onto base, keeping base column order first."""
+    columns = list(base.columns) + [c for c in chunk.columns if c not in base.columns]
+    combined = pd.concat([base, chunk], ignore_index=True, sort=False)
+    return combined[columns]
@@ -0,0 +1,363 @@
+# backend/core/preview.py
+"""
+Server-side paging over the session dataset for the data browser.
+
+preview_page() returns one page of rows for an optional sort column, filters
+and column projection. Row order is resolved to an array of row positions:
+a sort uses the column's ascending order (argsort, NaN last), computed once
+per dataset version and column and reversed for descending; filters become a
+boolean mask applied to that order. Position arrays are kept in an LRU under
+PREVIEW_INDEX_MAX_BYTES, so scrolling costs one positional take of `limit`
+rows however large the dataset is.
+
+Pages are addressed by an opaque cursor that encodes the offset, the dataset
+version and the query it belongs to; a cursor from a replaced dataset raises
+StaleCursor. Engine-backed datasets (core.query_engine) are paged with SQL
+instead, and DuckDB does the sorting and filtering, breaking ties by the
+Parquet row number so pages match the pandas order.
+"""
+import base64
+import hashlib
+import json
+import math
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from core.query_engine import LazyFrame, TABLE_NAME, quote_identifier
+
+PREVIEW_PAGE_SIZE = int(os.getenv("PREVIEW_PAGE_SIZE", 100))
+PREVIEW_MAX_PAGE_SIZE = int(os.getenv("PREVIEW_MAX_PAGE_SIZE", 1000))
+# Memory budget (bytes) for cached sort orders and filtered row positions
+PREVIEW_INDEX_MAX_BYTES = int(os.getenv("PREVIEW_INDEX_MAX_BYTES", 256 * 1024 * 1024))
+
+FILTER_OPS = {"eq", "ne", "lt", "le", "gt", "ge", "in", "contains", "isnull", "notnull"}
+_SQL_OPS = {"eq": "=", "ne": "<>", "lt": "<", "le": "<=", "gt": ">", "ge": ">="}
+
+
+class PreviewError(ValueError):
+    """A preview parameter is invalid (unknown column, bad filter or cursor)."""
+
+
+class StaleCursor(PreviewError):
+    """The cursor was issued for a dataset that has since been replaced."""
+
+
+class Filter:
+    """One `column op value` condition."""
+
+    __slots__ = ("column", "op", "value")
+
+    def __init__(self, column, op: str, value=None):
+        self.column = column
+        self.op = op
+        self.value = value
+
+    def key(self) -> tuple:
+        value = tuple(self.value) if isinstance(self.value, list) else self.value
+        return (self.column, self.op, value)
+
+
+class Page:
+    """One page of rows and where it sits in the matching rows."""
+
+    __slots__ = ("frame", "offset", "total_rows", "next_cursor", "prev_cursor")
+
+    def __init__(self, frame: pd.DataFrame, offset: int, total_rows: int,
+                 next_cursor: str | None, prev_cursor: str | None):
+        self.frame = frame
+        self.offset = offset
+        self.total_rows = total_rows
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def columnar(self) -> dict:
+        """Column-oriented JSON body: one array per column, missing values as null."""
+        frame = self.frame.astype(object)
+        frame = frame.where(self.frame.notna(), None)
+        return {
+            "columns": [str(c) for c in self.frame.columns],
+            "dtypes": {str(c): str(t) for c, t in self.frame.dtypes.items()},
+            "data": {str(c): frame[c].tolist() for c in frame.columns},
+            "offset": self.offset,
+            "rows": len(self.frame),
+            "total_rows": self.total_rows,
+            "next_cursor": self.next_cursor,
+            "prev_cursor": self.prev_cursor,
+        }
+
+    def arrow(self) -> bytes:
+        """The page as an Arrow IPC stream."""
+        import pyarrow as pa
+
+        table = pa.Table.from_pandas(self.frame, preserve_index=False)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+
+def parse_filters(text: str | None) -> list[Filter]:
+    """Filters from a JSON list of {"column", "op", "value"} objects."""
+    if not text:
+        return []
+    try:
+        items = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise PreviewError(f"filter is not valid JSON: {e}") from None
+    if isinstance(items, dict):
+        items = [items]
+    if not isinstance(items, list):
+        raise PreviewError("filter must be a JSON object or list of objects")
+    filters = []
+    for item in items:
+        if not isinstance(item, dict) or "column" not in item:
+            raise PreviewError("each filter needs a column")
+        op = str(item.get("op", "eq")).lower()
+        if op not in FILTER_OPS:
+            raise PreviewError(f"unknown filter op {op!r}; expected one of {sorted(FILTER_OPS)}")
+        value = item.get("value")
+        if op == "in" and not isinstance(value, list):
+            raise PreviewError("the 'in' filter takes a list value")
+        if any(isinstance(v, float) and not math.isfinite(v) for v in (value if op == "in" else [value])):
+            raise PreviewError("filter values must be finite numbers; use the isnull op for missing values")
+        filters.append(Filter(item["column"], op, value))
+    return filters
+
+
+class _IndexCache:
+    """Thread-safe LRU of position arrays keyed by (dataset version, ...)."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, value: np.ndarray) -> np.ndarray:
+        if value.nbytes > self.max_bytes:
+            return value
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total -= old.nbytes
+            self._entries[key] = value
+            self._total += value.nbytes
+            while self._total > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._total -= evicted.nbytes
+        return value
+
+    def drop_version(self, version: str):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == version]:
+                self._total -= self._entries.pop(key).nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total = 0
+
+
+_index_cache = _IndexCache(PREVIEW_INDEX_MAX_BYTES)
+
+
+def clear_preview_cache(version: str | None = None):
+    """Drop cached sort orders and row positions for one dataset version, or all."""
+    if version is None:
+        _index_cache.clear()
+    else:
+        _index_cache.drop_version(version)
+
+
+def _query_key(sort, descending: bool, filters: list[Filter]) -> tuple:
+    return (sort, bool(descending) if sort is not None else False, tuple(f.key() for f in filters))
+
+
+def _fingerprint(version: str, query: tuple) -> str:
+    return hashlib.sha1(repr((version, query)).encode()).hexdigest()[:12]
+
+
+def encode_cursor(version: str, query: tuple, offset: int, total: int) -> str:
+    payload = json.dumps({"q": _fingerprint(version, query), "v": version[:12], "o": offset, "t": total})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, version: str, query: tuple) -> tuple[int, int]:
+    """(offset, total rows) from a cursor issued for this dataset version and query."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        offset, total = int(payload["o"]), int(payload["t"])
+        cursor_version, fingerprint = payload["v"], payload["q"]
+    except (ValueError, KeyError, TypeError):
+        raise PreviewError("malformed cursor") from None
+    if cursor_version != version[:12]:
+        raise StaleCursor("the dataset changed since this cursor was issued; start from the first page")
+    if fingerprint != _fingerprint(version, query):
+        raise PreviewError("cursor belongs to a different sort or filter")
+    return max(offset, 0), total
+
+
+def _sort_order(df: pd.DataFrame, column, version: str) -> np.ndarray:
+    """Ascending row positions for column, missing values last."""
+    key = (version, "order", column)
+    order = _index_cache.get(key)
+    if order is None:
+        s = df[column].reset_index(drop=True)
+        try:
+            ranked = s.sort_values(kind="stable", na_position="last")
+        except TypeError:
+            # Mixed object columns compare as text rather than raising
+            ranked = s.where(s.isna(), s.astype(str)).sort_values(kind="stable", na_position="last")
+        order = _index_cache.put(key, ranked.index.to_numpy(np.int64))
+    return order
+
+
+def _mask(df: pd.DataFrame, f: Filter) -> np.ndarray:
+    s = df[f.column]
+    if f.op == "isnull":
+        return s.isna().to_numpy()
+    if f.op == "notnull":
+        return s.notna().to_numpy()
+    if f.op == "contains":
+        return s.astype(str).str.contains(str(f.value), case=False, regex=False).fillna(False).to_numpy(bool)
+    if f.op == "in":
+        return s.isin(f.value).to_numpy()
+    value = f.value
+    if pd.api.types.is_numeric_dtype(s) and isinstance(value, str):
+        try:
+            value = float(value)
+        except ValueError:
+            raise PreviewError(f"column {f.column!r} is numeric; got {f.value!r}") from None
+    elif pd.api.types.is_datetime64_any_dtype(s):
+        value = pd.Timestamp(value)
+        if s.dt.tz is not None and value.tzinfo is None:
+            value = value.tz_localize(s.dt.tz)
+    try:
+        result = getattr(s, f.op)(value)
+    except TypeError:
+        raise PreviewError(f"cannot compare column {f.column!r} with {f.value!r}") from None
+    return result.fillna(False).to_numpy(bool)
+
+
+def _positions(df: pd.DataFrame, version: str, sort, descending: bool,
+               filters: list[Filter]) -> np.ndarray | None:
+    """Row positions in display order, or None for all rows in stored order."""
+    query = _query_key(sort, descending, filters)
+    if not filters and sort is None:
+        return None
+    cached = _index_cache.get((version, "rows", query))
+    if cached is not None:
+        return cached
+    order = None
+    if sort is not None:
+        order = _sort_order(df, sort, version)
+        if descending:
+            # Reverse the non-null run only, so missing values stay last
+            valid = int(df[sort].notna().sum())
+            order = np.concatenate([order[:valid][::-1], order[valid:]])
+    if filters:
+        mask = np.ones(len(df), dtype=bool)
+        for f in filters:
+            mask &= _mask(df, f)
+        order = order[mask[order]] if order is not None else np.flatnonzero(mask)
+    return _index_cache.put((version, "rows", query), order)
+
+
+def _check_columns(available, columns, sort, filters: list[Filter]):
+    known = set(available)
+    for name in [*(columns or []), *([sort] if sort is not None else []), *(f.column for f in filters)]:
+        if name not in known:
+            raise PreviewError(f"unknown column {name!r}")
+
+
+def preview_page(df, version: str, columns: list | None = None, sort=None, descending: bool = False,
+                 filters: list[Filter] | None = None, cursor: str | None = None,
+                 limit: int = PREVIEW_PAGE_SIZE) -> Page:
+    """One page of df (a DataFrame or LazyFrame) for the given view of it."""
+    filters = filters or []
+    limit = max(1, min(int(limit), PREVIEW_MAX_PAGE_SIZE))
+    _check_columns(df.columns, columns, sort, filters)
+    if isinstance(df, LazyFrame):
+        return _engine_page(df, version, columns, sort, descending, filters, cursor, limit)
+
+    query = _query_key(sort, descending, filters)
+    positions = _positions(df, version, sort, descending, filters)
+    total = len(df) if positions is None else len(positions)
+    offset = decode_cursor(cursor, version, query)[0] if cursor else 0
+    offset = min(offset, total)
+    rows = np.arange(offset, min(offset + limit, total)) if positions is None \
+        else positions[offset:offset + limit]
+    col_positions = slice(None) if not columns else df.columns.get_indexer(columns)
+    # Positional take of just this page; nothing proportional to the dataset is copied
+    frame = df.iloc[rows, col_positions].reset_index(drop=True)
+    return _page(frame, version, query, offset, limit, total)
+
+
+def _page(frame, version, query, offset, limit, total) -> Page:
+    next_cursor = encode_cursor(version, query, offset + limit, total) if offset + limit < total else None
+    prev_cursor = encode_cursor(version, query, max(offset - limit, 0), total) if offset > 0 else None
+    return Page(frame, offset, total, next_cursor, prev_cursor)
+
+
+def _sql_literal(value) -> str:
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _sql_condition(f: Filter) -> str:
+    column = quote_identifier(f.column)
+    if f.op == "isnull":
+        return f"{column} IS NULL"
+    if f.op == "notnull":
+        return f"{column} IS NOT NULL"
+    if f.op == "contains":
+        return f"CAST({column} AS VARCHAR) ILIKE {_sql_literal('%' + str(f.value) + '%')}"
+    if f.op == "in":
+        if not f.value:
+            return "FALSE"
+        return f"{column} IN ({', '.join(_sql_literal(v) for v in f.value)})"
+    return f"{column} {_SQL_OPS[f.op]} {_sql_literal(f.value)}"
+
+
+def _engine_page(df: LazyFrame, version, columns, sort, descending, filters, cursor, limit) -> Page:
+    query = _query_key(sort, descending, filters)
+    where = f" WHERE {' AND '.join(_sql_condition(f) for f in filters)}" if filters else ""
+    if cursor:
+        offset, total = decode_cursor(cursor, version, query)
+    else:
+        offset = 0
+        total = df.dataset.scalar_row(f"SELECT count(*) FROM {TABLE_NAME}{where}")[0] if filters \
+            else len(df)
+    selected = ", ".join(quote_identifier(c) for c in columns) if columns else "*"
+    order_by = ""
+    if sort is not None:
+        column = quote_identifier(sort)
+        direction = "DESC" if descending else "ASC"
+        # Ties follow stored order, so consecutive pages neither repeat nor skip rows
+        dataset = df.dataset
+        keys = [dataset.row_number] if dataset.row_number else [quote_identifier(c) for c in dataset.columns]
+        if descending:
+            # As in _positions: reversed among values, stored order among the missing ones
+            keys = [f"CASE WHEN {column} IS NULL THEN {key} END" for key in keys] + [f"{key} DESC" for key in keys]
+        order_by = f" ORDER BY {column} {direction} NULLS LAST, {', '.join(keys)}"
+    frame = df.dataset.sql(
+        f"SELECT {selected} FROM {df.dataset.source}{where}{order_by} LIMIT {int(limit)} OFFSET {int(offset)}"
+    )
+    return _page(frame, version, query, offset, limit, total)
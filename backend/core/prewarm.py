@@ -0,0 +1,313 @@
+# backend/core/prewarm.py
+"""
+Background pre-warming of likely first questions after an upload.
+
+Right after uploading, users nearly always ask for an overview: which
+category leads on the main measure, how it moves over time, how it is
+distributed. When PREWARM_ENABLED is set, the upload starts a background task
+that picks those questions from the dataset's column roles
+(core.data_context.column_roles) and answers them ahead of time as trial runs
+(Executor.run(commit=False)) of either a fixed code template (the "planner"
+source, no LLM cost) or the LLM's answer at background priority ("llm").
+
+A chat question whose intent (utils.intent) names the same measure,
+dimension and chart type, and asks for no aggregation, ordering or time grain
+other than the template's ("lowest", "average", "how many", "weekly" all
+miss), takes the warm answer instead of calling the LLM. Every other word
+must be filler ("which", "has", "the", "show"): a number or year, a filter
+word ("in", "for", "excluding", "after") or one of the dataset's category
+values means the question is narrower than the template, so it misses. The
+trial is committed then, so prev_result and friends are set exactly as if
+the code had just run. Runs are bounded by PREWARM_CONCURRENCY across
+sessions and stop when a session has been idle for PREWARM_IDLE_SECONDS.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from string import Template
+
+from core.data_context import column_roles
+from core.executor import DEFAULT_SESSION
+from core.profile import TOP_VALUES_TRACKED
+from utils.intent import tokenize
+from utils.metrics import counter
+
+logger = logging.getLogger(__name__)
+
+PREWARM_ENABLED = os.getenv("PREWARM_ENABLED", "false").lower() in ("1", "true", "yes")
+# "planner" answers with code templates; "llm" asks the LLM at background priority
+PREWARM_SOURCE = os.getenv("PREWARM_SOURCE", "planner").lower()
+PREWARM_MAX_QUESTIONS = int(os.getenv("PREWARM_MAX_QUESTIONS", 3))
+# Pre-warm runs in flight at once, across all sessions
+PREWARM_CONCURRENCY = int(os.getenv("PREWARM_CONCURRENCY", 2))
+# A session with no requests for this long stops pre-warming and drops its answers
+PREWARM_IDLE_SECONDS = float(os.getenv("PREWARM_IDLE_SECONDS", 300))
+
+PREWARM_RUNS = counter("insightai_prewarm_runs", "Pre-warmed questions by outcome", ("source", "outcome"))
+PREWARM_LOOKUPS = counter("insightai_prewarm_lookups", "Chat questions checked against warm answers",
+                          ("outcome",))
+
+# Words an overview question may contain besides its slots
+_FILLER = frozenset((
+    "a", "an", "the", "which", "what", "who", "how", "is", "are", "was", "were", "has", "have", "had",
+    "do", "does", "did", "of", "by", "as", "me", "show", "give", "display", "plot", "chart", "graph",
+    "please", "can", "you", "see", "tell", "look", "looks", "like", "overall", "change", "changes",
+    "changed", "evolve", "evolved", "evolution", "performance",
+))
+# Words that narrow a question to part of the data
+_FILTER_WORDS = frozenset((
+    "in", "for", "excluding", "exclude", "except", "without", "after", "before", "since", "until",
+    "during", "between", "where", "only", "with", "from", "not", "within", "above", "below", "under",
+    "last", "this", "past", "ytd",
+))
+
+_TOP = Template("""\
+name = $m
+totals = df.groupby($d)[$m].sum().sort_values(ascending=False).reset_index()
+fig = viz('bar', totals, x=$d, y=$m, title=$title)
+top = totals.iloc[0]
+result = f"{top[$d]} has the highest total {name}: {top[$m]:,.2f}"
+""")
+
+_TREND = Template("""\
+name = $m
+dates = pd.to_datetime(df[$t], errors='coerce', format='mixed')
+monthly = df[$m].groupby(dates.dt.to_period('M')).sum()
+monthly.index = monthly.index.to_timestamp()
+monthly = monthly.rename_axis($t).reset_index()
+fig = viz('line', monthly, x=$t, y=$m, title=$title)
+first, last = monthly[$m].iloc[0], monthly[$m].iloc[-1]
+result = f"Monthly {name} went from {first:,.2f} to {last:,.2f} over {len(monthly)} months"
+""")
+
+_DISTRIBUTION = Template("""\
+name = $m
+values = df[$m].dropna()
+fig = viz('histogram', df, x=$m, title=$title)
+result = f"{name} ranges from {values.min():,.2f} to {values.max():,.2f} with a median of {values.median():,.2f}"
+""")
+
+
+class Overview:
+    """
+    One likely question: its text, the code that answers it, and what a chat
+    question must look like to match it. `required` columns must all be named
+    and nothing outside `allowed` may be; `charts`, `aggregates`, `directions`
+    and `grains` are the acceptable detected chart type, aggregation, direction
+    and time grain (None for a question that names none).
+    """
+
+    __slots__ = ("kind", "question", "code", "required", "allowed", "charts", "aggregates", "directions",
+                 "grains", "values")
+
+    def __init__(self, kind: str, question: str, code: str, required: list, allowed: list, charts: tuple,
+                 aggregates: tuple = (None,), directions: tuple = (None,), grains: tuple = (None,),
+                 values: tuple = ()):
+        self.kind = kind
+        self.question = question
+        self.code = code
+        self.required = required
+        self.allowed = allowed
+        self.charts = charts
+        self.aggregates = aggregates
+        self.directions = directions
+        self.grains = grains
+        self.values = values  # token tuples of the dataset's category values
+
+    def matches(self, intent, chart: str | None) -> bool:
+        named = {str(c) for c in intent.columns}
+        if intent.top_n is not None or chart not in self.charts:
+            return False
+        # "lowest", "average", "how many" ask for something the template does not compute
+        if intent.aggregate not in self.aggregates or intent.direction not in self.directions \
+                or intent.time_grain not in self.grains:
+            return False
+        if not named.issuperset(str(c) for c in self.required) or not named <= {str(c) for c in self.allowed}:
+            return False
+        return not _narrows(intent.words, intent.rest, self.values)
+
+
+def _narrows(words: list, rest: list, values: tuple) -> bool:
+    """True when the question filters the data: numbers, filter words, category values, unknown words."""
+    if any(w.isdigit() for w in words) or not _FILTER_WORDS.isdisjoint(words):
+        return True
+    if not _FILLER.issuperset(rest):
+        return True
+    for value in values:
+        n = len(value)
+        if any(tuple(words[i:i + n]) == value for i in range(len(words) - n + 1)):
+            return True
+    return False
+
+
+def category_values(df, profile=None, columns=None) -> tuple:
+    """
+    Token tuples of the most frequent values of the text columns, from the
+    profile's top-k when there is one, so a question naming one is known to
+    filter on it.
+    """
+    values = set()
+    if profile is not None:
+        for stats in profile.columns.values():
+            if stats.topk is not None:
+                values.update(str(v) for v in stats.topk.counts)
+    else:
+        for col in columns or ():
+            values.update(str(v) for v in df[col].value_counts().index[:TOP_VALUES_TRACKED])
+    return tuple(sorted({tuple(tokens) for v in values if (tokens := tokenize(v))}))
+
+
+def _fill(template: Template, title: str, **columns) -> str:
+    return template.substitute(title=repr(title), **{k: repr(v) for k, v in columns.items()})
+
+
+def plan_overviews(df, limit: int = PREWARM_MAX_QUESTIONS, profile=None) -> list[Overview]:
+    """The likely first questions for df, most useful first."""
+    roles = column_roles(df)
+    if not roles.measures:
+        return []
+    m = roles.measures[0]
+    values = category_values(df, profile, roles.dimensions)
+    plans = []
+    if roles.dimensions:
+        d = roles.dimensions[0]
+        plans.append(Overview(
+            "top", f"Which {d} has the highest {m}?",
+            _fill(_TOP, f"{m} by {d}", m=m, d=d), [m, d], [m, d], (None, "bar"),
+            aggregates=(None, "sum"), directions=(None, "desc"), values=values,
+        ))
+    if roles.time:
+        t = roles.time[0]
+        plans.append(Overview(
+            "trend", f"How has {m} changed over time?",
+            _fill(_TREND, f"{m} over time", m=m, t=t), [m], [m, t], ("line", "area"),
+            aggregates=(None, "sum"), grains=(None, "month"), values=values,
+        ))
+    plans.append(Overview(
+        "distribution", f"What is the distribution of {m}?",
+        _fill(_DISTRIBUTION, f"Distribution of {m}", m=m), [m], [m], ("histogram",), values=values,
+    ))
+    return plans[:limit]
+
+
+class _Warm:
+    __slots__ = ("overview", "response", "trial")
+
+    def __init__(self, overview: Overview, response: str, trial):
+        self.overview = overview
+        self.response = response
+        self.trial = trial
+
+
+class Prewarmer:
+    """
+    Per-session background answering of planned overview questions.
+
+    `processor` is the core.data_processor.DataProcessor whose executor runs
+    the trials; `ask` is an async (question, context) -> response callable,
+    used when the source is "llm".
+    """
+
+    def __init__(self, processor, ask=None, source: str = PREWARM_SOURCE,
+                 concurrency: int = PREWARM_CONCURRENCY, idle_seconds: float = PREWARM_IDLE_SECONDS):
+        self.processor = processor
+        self.ask = ask
+        self.source = source
+        self.idle_seconds = idle_seconds
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._tasks: dict = {}
+        self._warm: dict = {}  # session -> (dataset version, [_Warm])
+        self._last_seen: dict = {}
+        self._lock = threading.Lock()
+
+    def start(self, session_id: str | None, df, version: str, context: str | None = None,
+              profile=None) -> None:
+        """
+        Replace the session's pre-warm task with one for this dataset version.
+        The column profile, when given, supplies the category values.
+        """
+        session_id = session_id or DEFAULT_SESSION
+        self.cancel(session_id)
+        self.touch(session_id)
+        with self._lock:
+            self._warm[session_id] = (version, [])
+        self._tasks[session_id] = asyncio.get_running_loop().create_task(
+            self._run(session_id, df, version, context, profile))
+
+    def touch(self, session_id: str | None) -> None:
+        """Record activity; idle sessions stop pre-warming."""
+        self._last_seen[session_id or DEFAULT_SESSION] = time.monotonic()
+
+    def cancel(self, session_id: str | None) -> None:
+        session_id = session_id or DEFAULT_SESSION
+        task = self._tasks.pop(session_id, None)
+        if task is not None:
+            task.cancel()
+        with self._lock:
+            self._warm.pop(session_id, None)
+
+    def _idle(self, session_id: str) -> bool:
+        return time.monotonic() - self._last_seen.get(session_id, 0.0) > self.idle_seconds
+
+    async def _run(self, session_id, df, version, context, profile=None):
+        try:
+            plans = await asyncio.to_thread(plan_overviews, df, PREWARM_MAX_QUESTIONS, profile)
+            await asyncio.gather(*(self._warm_one(session_id, df, version, context, plan) for plan in plans))
+        except asyncio.CancelledError:
+            PREWARM_RUNS.inc(source=self.source, outcome="cancelled")
+            raise
+        except Exception as e:
+            logger.warning("Pre-warming failed for session %s: %s", session_id, e)
+        finally:
+            if self._tasks.get(session_id) is asyncio.current_task():
+                del self._tasks[session_id]
+
+    async def _warm_one(self, session_id, df, version, context, plan: Overview):
+        async with self._semaphore:
+            if self._idle(session_id):
+                logger.info("Session %s went idle; stopping pre-warm", session_id)
+                self.cancel(session_id)
+                return
+            if self.source == "llm" and self.ask is not None:
+                response = await self.ask(plan.question, context)
+            else:
+                response = json.dumps({"tool": "DataQueryTool", "code": plan.code, "answer": ""})
+            trial = await asyncio.to_thread(self.processor.trial_run, response, df, session_id)
+        if trial is None or not trial[0].ok:
+            PREWARM_RUNS.inc(source=self.source, outcome="error")
+            return
+        if self.source != "llm":
+            # The template's result sentence is the answer
+            response = json.dumps({"tool": "DataQueryTool", "code": plan.code, "answer": str(trial[0].result)})
+        PREWARM_RUNS.inc(source=self.source, outcome="ok")
+        with self._lock:
+            entry = self._warm.get(session_id)
+            if entry is not None and entry[0] == version:
+                entry[1].append(_Warm(plan, response, trial))
+
+    def take(self, session_id: str | None, version: str, intent, chart: str | None = None):
+        """
+        (response, trial) of a warm answer matching the question's intent and
+        requested chart type, or None. A warm answer is used once: its trial
+        is committed by the caller.
+        """
+        session_id = session_id or DEFAULT_SESSION
+        self.touch(session_id)
+        with self._lock:
+            entry = self._warm.get(session_id)
+            if entry is None or entry[0] != version:
+                return None
+            for warm in entry[1]:
+                if warm.overview.matches(intent, chart):
+                    entry[1].remove(warm)
+                    PREWARM_LOOKUPS.inc(outcome="hit")
+                    return warm.response, warm.trial
+        PREWARM_LOOKUPS.inc(outcome="miss")
+        return None
+
+    def shutdown(self) -> None:
+        for session_id in list(self._tasks):
+            self.cancel(session_id)
@@ -0,0 +1,238 @@
+# backend/core/profile.py
+import json
+
+import numpy as np
+import pandas as pd
+
+from core.sketches import TDigest, HyperLogLog, TopK
+
+# Values shown in the context for low-cardinality text columns
+TOP_VALUES_TRACKED = 32
+
+
+def column_kind(dtype) -> str:
+    """Classify a dtype as 'text', 'datetime', 'numeric' or 'other'."""
+    # bool is numeric: its range and mean (the share of True) are shown, as they always were
+    if pd.api.types.is_numeric_dtype(dtype):
+        return "numeric"
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "datetime"
+    if (pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype)
+            or isinstance(dtype, pd.CategoricalDtype)):
+        return "text"
+    return "other"
+
+
+class ColumnStats:
+    """
+    Column statistics that can be computed per chunk and merged, so appending
+    data never requires rescanning rows that were already profiled.
+
+    Tracks counts and nulls, a Welford mean/variance and min/max (numeric and
+    datetime), a t-digest for quantiles (numeric), a HyperLogLog for distinct
+    values and a top-k heavy-hitters summary (text and other).
+    """
+
+    def __init__(self, name, dtype: str, kind: str):
+        self.name = name
+        self.dtype = dtype
+        self.kind = kind
+        self.count = 0      # non-null values
+        self.nulls = 0
+        self.mean = None    # Welford running mean, numeric only
+        self.m2 = 0.0       # sum of squared deviations from the mean
+        self.min = None
+        self.max = None
+        self.digest = TDigest() if kind == "numeric" else None
+        self.hll = HyperLogLog()
+        self.topk = TopK(TOP_VALUES_TRACKED) if kind in ("text", "other") else None
+
+    @classmethod
+    def from_series(cls, name, s: pd.Series) -> "ColumnStats":
+        stats = cls(name, str(s.dtype), column_kind(s.dtype))
+        non_null = s.dropna()
+        stats.count = int(len(non_null))
+        stats.nulls = int(len(s) - len(non_null))
+        if not stats.count:
+            return stats
+        if stats.kind == "numeric":
+            values = non_null.to_numpy(dtype=float, na_value=np.nan)
+            stats.mean = float(values.mean())
+            stats.m2 = float(((values - stats.mean) ** 2).sum())
+            stats.min = float(values.min())
+            stats.max = float(values.max())
+            stats.digest = TDigest.from_values(values)
+            stats.hll = HyperLogLog.from_series(non_null)
+        elif stats.kind == "datetime":
+            stats.min = non_null.min()
+            stats.max = non_null.max()
+            stats.hll = HyperLogLog.from_series(non_null)
+        else:
+            counts = non_null.value_counts(sort=False)
+            if isinstance(non_null.dtype, pd.CategoricalDtype):
+                # Counted in category order, unused categories included; keep the seen ones as they appear
+                counts = counts.reindex(non_null.unique())
+            stats.topk = TopK.from_counts(counts, TOP_VALUES_TRACKED)
+            # Hash each distinct value once rather than every row
+            stats.hll = HyperLogLog.from_series(pd.Series(counts.index.array), distinct=True)
+        return stats
+
+    @classmethod
+    def empty_like(cls, other: "ColumnStats", nulls: int) -> "ColumnStats":
+        """Stats for a column that was absent from a chunk of `nulls` rows."""
+        stats = cls(other.name, other.dtype, other.kind)
+        stats.nulls = nulls
+        return stats
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.kind == "numeric" and self.count > 1 else None
+
+    @property
+    def std(self):
+        var = self.variance
+        return float(np.sqrt(var)) if var is not None else None
+
+    @property
+    def unique_count(self) -> int:
+        """Distinct non-null values: exact while top-k holds them all, else HLL estimate."""
+        if self.topk is not None and self.topk.exact:
+            return len(self.topk.counts)
+        return self.hll.estimate() if self.count else 0
+
+    def quantile(self, q: float):
+        if self.digest is None:
+            return None
+        return self.digest.quantile(q, self.min, self.max)
+
+    def _widen(self, other: "ColumnStats"):
+        # Column kind differs across chunks; keep only kind-agnostic stats
+        self.kind = "text" if "text" in (self.kind, other.kind) else "other"
+        self.dtype = "object"
+        self.mean, self.m2, self.min, self.max, self.digest = None, 0.0, None, None, None
+        if self.topk is None:
+            # Values from the non-text side were never tracked
+            self.topk = TopK(TOP_VALUES_TRACKED)
+            self.topk.error = self.count
+
+    def merge(self, other: "ColumnStats") -> "ColumnStats":
+        if other.kind != self.kind and other.count and self.count:
+            self._widen(other)
+        elif not self.count and other.count:
+            self.kind, self.dtype = other.kind, other.dtype
+            self.digest = TDigest() if other.kind == "numeric" else None
+            self.topk = TopK(TOP_VALUES_TRACKED) if other.kind in ("text", "other") else None
+
+        if other.count:
+            if self.kind == "numeric" and other.mean is not None:
+                if self.mean is None:
+                    self.mean, self.m2 = other.mean, other.m2
+                else:
+                    # Chan et al. parallel combination of Welford states
+                    n = self.count + other.count
+                    delta = other.mean - self.mean
+                    self.mean += delta * other.count / n
+                    self.m2 += other.m2 + delta * delta * self.count * other.count / n
+                self.digest.merge(other.digest)
+            if self.kind in ("numeric", "datetime") and other.min is not None:
+                self.min = other.min if self.min is None else min(self.min, other.min)
+                self.max = other.max if self.max is None else max(self.max, other.max)
+            if self.topk is not None:
+                if other.topk is not None:
+                    self.topk.merge(other.topk)
+                else:
+                    self.topk.error += other.count
+            self.hll.merge(other.hll)
+
+        self.count += other.count
+        self.nulls += other.nulls
+        return self
+
+    def to_dict(self) -> dict:
+        def _scalar(v):
+            if isinstance(v, pd.Timestamp):
+                return {"ts": v.isoformat()}
+            return v
+
+        return {
+            "name": self.name, "dtype": self.dtype, "kind": self.kind,
+            "count": self.count, "nulls": self.nulls,
+            "mean": self.mean, "m2": self.m2,
+            "min": _scalar(self.min), "max": _scalar(self.max),
+            "digest": self.digest.to_dict() if self.digest is not None else None,
+            "hll": self.hll.to_dict(),
+            "topk": self.topk.to_dict() if self.topk is not None else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ColumnStats":
+        def _scalar(v):
+            if isinstance(v, dict) and "ts" in v:
+                return pd.Timestamp(v["ts"])
+            return v
+
+        stats = cls(data["name"], data["dtype"], data["kind"])
+        stats.count, stats.nulls = data["count"], data["nulls"]
+        stats.mean, stats.m2 = data["mean"], data["m2"]
+        stats.min, stats.max = _scalar(data["min"]), _scalar(data["max"])
+        stats.digest = TDigest.from_dict(data["digest"]) if data["digest"] else None
+        stats.hll = HyperLogLog.from_dict(data["hll"])
+        stats.topk = TopK.from_dict(data["topk"]) if data["topk"] else None
+        return stats
+
+
+class DatasetProfile:
+    """
+    Per-column ColumnStats for a dataset. Built chunk by chunk with update(),
+    mergeable across appended uploads, and serializable to JSON for Redis.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.columns: dict = {}
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, chunk_rows: int | None = None) -> "DatasetProfile":
+        profile = cls()
+        if not chunk_rows or len(df) <= chunk_rows:
+            profile.rows = len(df)
+            for col in df.columns:
+                profile.columns[col] = ColumnStats.from_series(col, df[col])
+            return profile
+        for start in range(0, len(df), chunk_rows):
+            profile.update(df.iloc[start:start + chunk_rows])
+        return profile
+
+    def update(self, chunk: pd.DataFrame) -> "DatasetProfile":
+        """Profile one more chunk of rows and merge it in."""
+        if not self.columns and not self.rows:
+            fresh = DatasetProfile.from_frame(chunk)
+            self.rows, self.columns = fresh.rows, fresh.columns
+            return self
+        return self.merge(DatasetProfile.from_frame(chunk))
+
+    def merge(self, other: "DatasetProfile") -> "DatasetProfile":
+        for col, stats in self.columns.items():
+            if col not in other.columns:
+                stats.merge(ColumnStats.empty_like(stats, other.rows))
+        for col, stats in other.columns.items():
+            if col in self.columns:
+                self.columns[col].merge(stats)
+            else:
+                self.columns[col] = ColumnStats.empty_like(stats, self.rows).merge(stats)
+        self.rows += other.rows
+        return self
+
+    def to_json(self) -> str:
+        return json.dumps({"rows": self.rows,
+                           "columns": [st.to_dict() for st in self.columns.values()]})
+
+    @classmethod
+    def from_json(cls, payload) -> "DatasetProfile":
+        data = json.loads(payload)
+        profile = cls()
+        profile.rows = data["rows"]
+        for item in data["columns"]:
+            stats = ColumnStats.from_dict(item)
+            profile.columns[stats.name] = stats
+        return profile
@@ -0,0 +1,410 @@
+# backend/core/projection.py
+"""
+Column projection for generated code.
+
+Snippets usually touch a handful of columns, yet executing them used to copy
+the whole frame. plan_projection() reads a snippet's AST and, when every use
+of `df` provably reads only columns named by literals (df['Sales'],
+df.groupby('Region')['Sales'], df.loc[mask, ['a', 'b']], viz(...) with x/y
+given, ...), returns the columns to keep so the executor can copy just those.
+
+Row selections (df[df['region'] == 'West'], df.head(), df.iloc[0]) keep
+every column, so they are followed until columns are selected from them. A
+frame-shaped value must not escape the snippet with fewer columns than it
+would otherwise have: binding one to a name (result, or any variable, which
+the executor carries to the session's next run), printing or returning it
+all rule projection out. So does anything else it cannot follow (df passed to
+an arbitrary function, iterated, df[some_variable], positional iloc columns,
+whole-frame reductions such as df.describe()): the snippet then gets the full
+frame, exactly as before. Arguments that name columns (sort_values(by),
+groupby keys, set_index, nlargest, pivot_table index/columns/values, rename
+and astype mappings, ...) must be literals too: df.groupby(date_col) with
+date_col found in df.columns at runtime is not projected.
+
+Schema reads (df.columns, df.dtypes, df.shape, df.empty) are common in
+generated code and would otherwise rule projection out. They are rewritten to
+names bound to the full frame's schema, unless the snippet modifies df, in
+which case they must see its current state and projection is skipped.
+"""
+import ast
+import os
+
+import pandas as pd
+
+EXEC_COLUMN_PROJECTION = os.getenv("EXEC_COLUMN_PROJECTION", "true").lower() in ("1", "true", "yes")
+
+FRAME_NAME = "df"
+
+# df.<attr> rewritten to a name holding the full frame's value
+_SCHEMA_ATTRS = {"columns": "_df_columns", "dtypes": "_df_dtypes", "shape": "_df_shape", "empty": "_df_empty"}
+
+# Methods returning a frame with the same columns (possibly fewer rows)
+_ROW_METHODS = {"sort_values", "sort_index", "head", "tail", "nlargest", "nsmallest", "sample",
+                "copy", "reset_index", "set_index", "fillna", "assign", "rename", "astype",
+                "query", "dropna", "drop_duplicates"}
+# Row methods whose result depends on every column unless `subset` is given
+_SUBSET_METHODS = {"dropna", "drop_duplicates"}
+# Arguments that name columns, as (position or None, keyword): they must be
+# literals, since a name computed at runtime (from df.columns, a loop, ...)
+# can be one the projection dropped
+_COLUMN_ARGS = {
+    "sort_values": ((0, "by"),),
+    "set_index": ((0, "keys"),),
+    "nlargest": ((1, "columns"),),
+    "nsmallest": ((1, "columns"),),
+    "drop_duplicates": ((0, "subset"),),
+    "dropna": ((None, "subset"),),
+    "sample": ((3, "weights"),),
+    "groupby": ((0, "by"),),
+    "pivot_table": ((0, "values"), (1, "index"), (2, "columns")),
+}
+# Arguments that may be a {column: ...} mapping; its keys must be literals
+_MAPPING_ARGS = {
+    "fillna": ((0, "value"),),
+    "astype": ((0, "dtype"),),
+    "rename": ((0, "mapper"), (None, "columns")),
+}
+_BUILTIN_TYPES = {"int", "float", "str", "bool", "object"}
+# Attributes that read no column data
+_SAFE_ATTRS = {"index"}
+# Grouped-frame reductions that only touch the named columns
+_GROUP_SAFE = {"size", "ngroups", "groups", "indices"}
+
+# Method calls that turn a column into a boolean row mask
+_MASK_METHODS = {"isin", "isna", "isnull", "notna", "notnull", "between", "duplicated",
+                 "contains", "startswith", "endswith", "match", "fullmatch"}
+
+_VIZ_ALL_COLUMNS = {"heatmap", "heat_map", "corr", "correlation"}
+_VIZ_PIE = {"pie", "donut", "doughnut"}
+
+_DYNAMIC_CALLS = {"eval", "exec", "locals", "globals", "vars", "getattr", "setattr"}
+# Methods that write into an existing frame, Series or array
+_MUTATING_METHODS = {"insert", "update", "pop", "sort", "fill", "put", "putmask", "place", "copyto",
+                     "resize", "itemset", "setflags", "__setitem__", "__delitem__"}
+
+
+class Projection:
+    """Columns a snippet needs and its source with schema reads rewritten."""
+
+    __slots__ = ("columns", "code", "schema_names")
+
+    def __init__(self, columns: list, code: str, schema_names: dict):
+        self.columns = columns
+        self.code = code
+        self.schema_names = schema_names
+
+    def bindings(self, df: pd.DataFrame) -> dict:
+        """Namespace entries the rewritten schema reads refer to."""
+        return {name: getattr(df, attr) for attr, name in self.schema_names.items()}
+
+
+class _Unsafe(Exception):
+    pass
+
+
+def _is_frame(node) -> bool:
+    return isinstance(node, ast.Name) and node.id == FRAME_NAME
+
+
+def _column_literals(node, columns: set) -> list | None:
+    """Column labels named by a constant or a list/tuple of constants, else None."""
+    if isinstance(node, ast.Constant) and isinstance(node.value, (str, int)) and not isinstance(node.value, bool):
+        return [node.value]
+    if isinstance(node, (ast.List, ast.Tuple)) and node.elts:
+        labels = []
+        for elt in node.elts:
+            if not (isinstance(elt, ast.Constant) and isinstance(elt.value, (str, int))):
+                return None
+            labels.append(elt.value)
+        return labels
+    return None
+
+
+def _is_row_key(node) -> bool:
+    """A df[...] key that selects rows: a slice or an expression that can only be a boolean mask."""
+    if isinstance(node, (ast.Slice, ast.Compare)):
+        return True
+    if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.BitAnd, ast.BitOr, ast.BitXor)):
+        return True
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Invert):
+        return True
+    return isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) \
+        and node.func.attr in _MASK_METHODS
+
+
+def _keyword(call: ast.Call, name: str):
+    return next((kw.value for kw in call.keywords if kw.arg == name), None)
+
+
+def _arguments(call: ast.Call, specs):
+    """The nodes passed for each (position, keyword) in specs."""
+    for position, name in specs:
+        if position is not None and position < len(call.args):
+            yield call.args[position]
+        value = _keyword(call, name)
+        if value is not None:
+            yield value
+
+
+def _is_frame_expression(node) -> bool:
+    """An expression built on a column of df, e.g. df['Order Date'].dt.month."""
+    while isinstance(node, (ast.Attribute, ast.Call, ast.Subscript)):
+        if isinstance(node, ast.Subscript) and _is_frame(node.value):
+            return True
+        node = node.func if isinstance(node, ast.Call) else node.value
+    return False
+
+
+def _literal_keys(node) -> bool:
+    return isinstance(node, ast.Dict) and all(
+        isinstance(k, ast.Constant) and isinstance(k.value, (str, int)) for k in node.keys)
+
+
+def _safe_mapping(method: str, node) -> bool:
+    """A value for a _MAPPING_ARGS argument that cannot name columns unseen."""
+    if _literal_keys(node):
+        return True
+    if method == "rename":
+        # Only a literal mapping; a function (str.lower) renames every column
+        return False
+    if isinstance(node, ast.Constant):
+        return True
+    if method == "astype":
+        if isinstance(node, ast.Name):
+            return node.id in _BUILTIN_TYPES
+        return isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) \
+            and node.value.id in ("np", "pd")
+    return _is_frame_expression(node)
+
+
+class _Analyzer:
+    def __init__(self, tree: ast.AST, columns: set):
+        self.columns = columns
+        self.parents = {}
+        for parent in ast.walk(tree):
+            for child in ast.iter_child_nodes(parent):
+                self.parents[child] = parent
+        self.referenced = set()
+        self.schema_reads = []  # Attribute nodes to rewrite
+        self.modifies_frame = False
+
+    def visit(self, tree: ast.AST):
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Constant) and _hashable_column(node.value, self.columns):
+                self.referenced.add(node.value)
+            elif isinstance(node, ast.Attribute) and node.attr in self.columns:
+                self.referenced.add(node.attr)
+            elif isinstance(node, ast.Call):
+                if isinstance(node.func, ast.Name) and node.func.id in _DYNAMIC_CALLS:
+                    raise _Unsafe(node.func.id)
+                if _keyword(node, "inplace") is not None:
+                    self.modifies_frame = True
+                if isinstance(node.func, ast.Attribute) and node.func.attr in ("query", "eval"):
+                    self._query_columns(node)
+            elif isinstance(node, (ast.Global, ast.Nonlocal)):
+                raise _Unsafe("global")
+            elif _is_frame(node):
+                if isinstance(node.ctx, ast.Load):
+                    self._follow(node)
+                else:
+                    self.modifies_frame = True
+        if self.schema_reads and self.modifies_frame:
+            raise _Unsafe("schema read of a modified frame")
+
+    def _query_columns(self, call: ast.Call):
+        # Column names inside df.query("Sales > 100") strings
+        for arg in call.args[:1]:
+            if isinstance(arg, ast.Constant) and isinstance(arg.value, str):
+                text = arg.value
+                self.referenced.update(c for c in self.columns if isinstance(c, str) and c in text)
+            else:
+                raise _Unsafe("dynamic query")
+
+    def _follow(self, node: ast.AST):
+        """Walk up from a use of df until column selection makes it safe."""
+        current = node
+        while True:
+            parent = self.parents.get(current)
+            if isinstance(parent, ast.Subscript) and parent.value is current:
+                if isinstance(parent.ctx, (ast.Store, ast.Del)):
+                    self.modifies_frame = True
+                    return
+                if _column_literals(parent.slice, self.columns) is not None:
+                    return
+                if not _is_row_key(parent.slice):
+                    # df[name]: may select columns nobody can see statically
+                    raise _Unsafe("dynamic key")
+                # Row mask or slice: the result still has every column
+                current = parent
+                continue
+            if isinstance(parent, ast.Attribute) and parent.value is current:
+                current = self._follow_attribute(parent, frame_use=current is node)
+                if current is None:
+                    return
+                continue
+            if isinstance(parent, ast.Call) and current in parent.args:
+                if self._safe_call_argument(parent, current):
+                    return
+            # Bound, printed, returned or passed on: a frame with every column escapes
+            raise _Unsafe(type(parent).__name__)
+
+    def _follow_attribute(self, attr: ast.Attribute, frame_use: bool):
+        name = attr.attr
+        parent = self.parents.get(attr)
+        call = parent if isinstance(parent, ast.Call) and parent.func is attr else None
+        if name in self.columns or name in _SAFE_ATTRS:
+            return None
+        if frame_use and name in _SCHEMA_ATTRS:
+            self.schema_reads.append(attr)
+            return None
+        if call is not None and name in _ROW_METHODS | {"groupby", "pivot_table"}:
+            self._check_column_arguments(name, call)
+        if name in _ROW_METHODS and call is not None:
+            if name in _SUBSET_METHODS and _keyword(call, "subset") is None:
+                raise _Unsafe(name)
+            return call
+        if name == "groupby" and call is not None:
+            return self._follow_groupby(call)
+        if name == "pivot_table" and call is not None \
+                and (_keyword(call, "values") is not None or call.args):
+            return None
+        if name in ("loc", "iloc") and isinstance(parent, ast.Subscript):
+            if isinstance(parent.ctx, (ast.Store, ast.Del)):
+                self.modifies_frame = True
+                return None
+            if isinstance(parent.slice, ast.Tuple):
+                if name == "loc" and len(parent.slice.elts) == 2 \
+                        and _column_literals(parent.slice.elts[1], self.columns) is not None:
+                    return None
+                raise _Unsafe(f"{name} columns")
+            return parent
+        raise _Unsafe(name)
+
+    def _check_column_arguments(self, name: str, call: ast.Call):
+        """Raise _Unsafe unless every argument that can name a column is a literal."""
+        for node in _arguments(call, _COLUMN_ARGS.get(name, ())):
+            if _column_literals(node, self.columns) is not None:
+                continue
+            if name == "groupby" and (_is_frame_expression(node) or (
+                    isinstance(node, (ast.List, ast.Tuple)) and node.elts and all(
+                        _column_literals(elt, self.columns) is not None or _is_frame_expression(elt)
+                        for elt in node.elts))):
+                # Grouping by a derived Series (df['Order Date'].dt.month) names no column
+                continue
+            raise _Unsafe(f"{name} column argument")
+        for node in _arguments(call, _MAPPING_ARGS.get(name, ())):
+            if not _safe_mapping(name, node):
+                raise _Unsafe(f"{name} mapping")
+        if name in _ROW_METHODS and any(isinstance(node, ast.Lambda) for node in ast.walk(call)):
+            # assign(x=lambda d: d[col]) and the like see the projected frame
+            raise _Unsafe(f"{name} callable")
+
+    def _follow_groupby(self, call: ast.Call):
+        parent = self.parents.get(call)
+        if isinstance(parent, ast.Subscript) and parent.value is call \
+                and _column_literals(parent.slice, self.columns) is not None:
+            return None
+        if isinstance(parent, ast.Attribute) and parent.value is call:
+            if parent.attr in _GROUP_SAFE:
+                return None
+            method = self.parents.get(parent)
+            if parent.attr in ("agg", "aggregate") and isinstance(method, ast.Call) and method.func is parent:
+                # Named aggregation or a {column: func} dict touches only those columns
+                if not method.args and method.keywords:
+                    return None
+                if len(method.args) == 1 and isinstance(method.args[0], ast.Dict):
+                    return None
+        raise _Unsafe("groupby reduction over all columns")
+
+    def _safe_call_argument(self, call: ast.Call, arg: ast.AST) -> bool:
+        func = call.func
+        if isinstance(func, ast.Name) and func.id == "len" and len(call.args) == 1:
+            return True
+        if isinstance(func, ast.Name) and func.id == "viz" and len(call.args) >= 2 and call.args[1] is arg:
+            return _viz_reads_named_columns(call)
+        if isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name) and func.value.id == "px" \
+                and func.attr != "imshow" and call.args and call.args[0] is arg:
+            return any(kw.arg in ("x", "y", "values", "names") for kw in call.keywords)
+        return False
+
+
+def _hashable_column(value, columns: set) -> bool:
+    if isinstance(value, bool) or not isinstance(value, (str, int)):
+        return False
+    return value in columns
+
+
+def _viz_reads_named_columns(call: ast.Call) -> bool:
+    chart = call.args[0]
+    if not (isinstance(chart, ast.Constant) and isinstance(chart.value, str)):
+        return False
+    chart_type = chart.value.lower().strip()
+    if chart_type in _VIZ_ALL_COLUMNS:
+        return False
+    given = {kw.arg for kw in call.keywords}
+    if chart_type in _VIZ_PIE:
+        # viz picks the first numeric / text column when these are missing
+        return bool(given & {"names", "x"}) and bool(given & {"values", "y"})
+    return bool(given & {"x", "y"})
+
+
+class _SchemaRewriter(ast.NodeTransformer):
+    def __init__(self, nodes):
+        self.nodes = {id(node) for node in nodes}
+
+    def visit_Attribute(self, node):
+        if id(node) in self.nodes:
+            return ast.copy_location(ast.Name(id=_SCHEMA_ATTRS[node.attr], ctx=ast.Load()), node)
+        return self.generic_visit(node)
+
+
+def is_read_only(code: str) -> bool:
+    """
+    True when code cannot write into df or any view of it: no item or
+    attribute assignment or deletion, no inplace= and no in-place methods.
+    Conservative: rebinding names is fine, anything else that stores is not.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return False
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Subscript, ast.Attribute)) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            return False
+        if isinstance(node, (ast.Global, ast.Nonlocal)):
+            return False
+        if isinstance(node, ast.Call):
+            if _keyword(node, "inplace") is not None:
+                return False
+            func = node.func
+            if isinstance(func, ast.Name) and func.id in _DYNAMIC_CALLS:
+                return False
+            if isinstance(func, ast.Attribute) and func.attr in _MUTATING_METHODS:
+                return False
+    return True
+
+
+def plan_projection(code: str, df: pd.DataFrame) -> Projection | None:
+    """The columns `code` needs from df, or None when it may need all of them."""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+    columns = set(c for c in df.columns if isinstance(c, (str, int)))
+    if len(columns) != len(df.columns) or not df.columns.is_unique:
+        return None
+    analyzer = _Analyzer(tree, columns)
+    try:
+        analyzer.visit(tree)
+    except _Unsafe:
+        return None
+    if len(analyzer.referenced) >= len(df.columns):
+        return None
+
+    keep = [c for c in df.columns if c in analyzer.referenced]
+    schema_names = {}
+    if analyzer.schema_reads:
+        schema_names = {node.attr: _SCHEMA_ATTRS[node.attr] for node in analyzer.schema_reads}
+        tree = ast.fix_missing_locations(_SchemaRewriter(analyzer.schema_reads).visit(tree))
+        code = ast.unparse(tree)
+    return Projection(keep, code, schema_names)
@@ -0,0 +1,343 @@
+# backend/core/query_engine.py
+"""
+Optional out-of-core query engine.
+
+When QUERY_ENGINE=duckdb (and the duckdb package is installed), uploads are
+persisted to a Parquet file under DATA_DIR and queried with DuckDB instead of
+being held as a pandas DataFrame in the worker. Generated code receives a
+LazyFrame proxy as `df` plus a `sql()` helper that runs against the table
+named `data`; only the rows/columns a query asks for are materialized.
+"""
+import hashlib
+import os
+import logging
+import tempfile
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+from core.ingest import read_excel
+
+duckdb = None  # optional dependency, imported on first use by _load_duckdb()
+
+logger = logging.getLogger(__name__)
+
+QUERY_ENGINE = os.getenv("QUERY_ENGINE", "pandas").lower()
+DATA_DIR = Path(os.getenv("DATA_DIR", os.path.join(tempfile.gettempdir(), "insightai")))
+DUCKDB_MEMORY_LIMIT = os.getenv("DUCKDB_MEMORY_LIMIT", "1GB")
+DUCKDB_THREADS = int(os.getenv("DUCKDB_THREADS", 2))
+# Refuse to pull a table estimated larger than this into pandas when code touches the whole frame
+LAZY_MATERIALIZE_MAX_BYTES = int(os.getenv("LAZY_MATERIALIZE_MAX_BYTES", 512 * 1024 * 1024))
+
+# A pandas object-dtype string costs about this much beyond its characters
+_PY_STR_OVERHEAD = 49
+
+TABLE_NAME = "data"
+# DuckDB's virtual column with a row's position in the Parquet file it was scanned from
+ROW_NUMBER = "file_row_number"
+
+# Upload format -> DuckDB table function
+_READERS = {
+    "csv": "read_csv_auto({path}, sample_size=-1)",
+    "parquet": "read_parquet({path})",
+    "jsonl": "read_json_auto({path}, format='newline_delimited')",
+    "json": "read_json_auto({path})",
+}
+# Formats DuckDB cannot scan; they are converted to Parquet through pandas first
+_CONVERTED = {"excel": read_excel}
+
+
+def _load_duckdb():
+    """Import duckdb on first use so workers on the pandas engine never pay for it."""
+    global duckdb
+    if duckdb is None:
+        import duckdb as module
+        duckdb = module
+    return duckdb
+
+
+def engine_enabled() -> bool:
+    """True when the DuckDB engine is selected and importable."""
+    if QUERY_ENGINE != "duckdb":
+        return False
+    try:
+        _load_duckdb()
+    except ImportError:
+        logger.warning("QUERY_ENGINE=duckdb but duckdb is not installed; using pandas")
+        return False
+    return True
+
+
+def quote_identifier(name: str) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _path_literal(path: Path) -> str:
+    return "'" + str(path).replace("'", "''") + "'"
+
+
+def _file_stamp(path: Path):
+    """Identity of the file at path: os.replace gives a new inode, a rewrite a new mtime or size."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+class DuckDBDataset:
+    """A dataset persisted as Parquet on local disk and queried through DuckDB."""
+
+    def __init__(self, parquet_path: Path):
+        self.path = Path(parquet_path)
+        self._con = _load_duckdb().connect(config={
+            "memory_limit": DUCKDB_MEMORY_LIMIT,
+            "threads": DUCKDB_THREADS,
+            "temp_directory": str(DATA_DIR / "spill"),
+        })
+        # Before the schema is read: a file replaced after this point looks stale, never fresh
+        self.stamp = _file_stamp(self.path)
+        # The table function behind the view; only a direct scan exposes ROW_NUMBER
+        self.source = f"read_parquet({_path_literal(self.path)})"
+        self._con.execute(f"CREATE VIEW {TABLE_NAME} AS SELECT * FROM {self.source}")
+        self._lock = threading.Lock()
+        schema = self._con.execute(f"DESCRIBE {TABLE_NAME}").fetchall()
+        self.columns = [row[0] for row in schema]
+        self.sql_types = {row[0]: row[1] for row in schema}
+        self.num_rows = self._con.execute(f"SELECT count(*) FROM {TABLE_NAME}").fetchone()[0]
+        self.closed = False
+
+    def is_current(self) -> bool:
+        """
+        False once the Parquet file was replaced since this dataset opened (e.g.
+        another worker appended to the session), so num_rows and columns are stale.
+        """
+        return _file_stamp(self.path) == self.stamp
+
+    @property
+    def row_number(self) -> str | None:
+        """
+        Column giving each row's stored position when selecting from `source`,
+        or None when a data column of the same name shadows it.
+        """
+        return None if ROW_NUMBER in self.columns else quote_identifier(ROW_NUMBER)
+
+    @property
+    def estimated_bytes(self) -> int:
+        """Approximate size of the table as a pandas DataFrame, from the Parquet metadata."""
+        uncompressed = self.scalar_row(
+            f"SELECT coalesce(sum(total_uncompressed_size), 0) FROM parquet_metadata({_path_literal(self.path)})"
+        )[0]
+        strings = sum(1 for t in self.sql_types.values() if t.startswith("VARCHAR"))
+        return int(uncompressed) + strings * self.num_rows * _PY_STR_OVERHEAD
+
+    @classmethod
+    def from_files(cls, sources, parquet_path: Path, append: bool = False) -> "DuckDBDataset":
+        """
+        Convert uploaded files on disk to a single Parquet file without loading
+        them into pandas. `sources` is a list of (path, format) pairs. With
+        append=True the existing Parquet file is kept and the new files are
+        unioned onto it by column name, which reconciles differing schemas.
+        Excel files, which DuckDB cannot read, go through pandas to a
+        temporary Parquet file first (a sheet is at most ~1M rows).
+        """
+        DATA_DIR.mkdir(parents=True, exist_ok=True)
+        (DATA_DIR / "spill").mkdir(exist_ok=True)
+        selects, converted = [], []
+        tmp_path = Path(parquet_path).with_suffix(".tmp.parquet")
+        con = None
+        try:
+            if append and Path(parquet_path).exists():
+                selects.append(f"SELECT * FROM read_parquet({_path_literal(parquet_path)})")
+            for path, fmt in sources:
+                if fmt in _CONVERTED:
+                    parquet = Path(path).with_suffix(".converted.parquet")
+                    _CONVERTED[fmt](path).to_parquet(parquet, index=False)
+                    converted.append(parquet)
+                    path, fmt = parquet, "parquet"
+                if fmt not in _READERS:
+                    raise ValueError(f"Format '{fmt}' is not supported by the query engine")
+                selects.append(f"SELECT * FROM {_READERS[fmt].format(path=_path_literal(path))}")
+            con = _load_duckdb().connect(config={"memory_limit": DUCKDB_MEMORY_LIMIT,
+                                         "temp_directory": str(DATA_DIR / "spill")})
+            con.execute(
+                f"COPY ({' UNION ALL BY NAME '.join(selects)}) "
+                f"TO {_path_literal(tmp_path)} (FORMAT PARQUET)"
+            )
+        finally:
+            if con is not None:
+                con.close()
+            for path in converted:
+                path.unlink(missing_ok=True)
+        os.replace(tmp_path, parquet_path)
+        return cls(parquet_path)
+
+    def sql(self, query: str) -> pd.DataFrame:
+        """Run a query against the `data` table and return the result as pandas."""
+        with self._lock:
+            return self._con.execute(query).df()
+
+    def scalar_row(self, query: str):
+        with self._lock:
+            return self._con.execute(query).fetchone()
+
+    def read_columns(self, columns=None, limit: int | None = None) -> pd.DataFrame:
+        cols = ", ".join(quote_identifier(c) for c in columns) if columns else "*"
+        query = f"SELECT {cols} FROM {TABLE_NAME}"
+        if limit is not None:
+            query += f" LIMIT {int(limit)}"
+        return self.sql(query)
+
+    def close(self):
+        """Release the connection and its file handles; waits for a running query."""
+        with self._lock:
+            if not self.closed:
+                self._con.close()
+                self.closed = True
+
+
+class LazyFrame:
+    """
+    Minimal DataFrame stand-in backed by a DuckDBDataset.
+
+    Metadata (columns, shape, dtypes, head) and column access are answered by
+    the engine reading only what is needed. Column assignments are kept in a
+    local overlay. Any other DataFrame attribute materializes the full table
+    and delegates to pandas, unless the table is estimated at more than
+    LAZY_MATERIALIZE_MAX_BYTES in memory: then it raises and points to sql().
+    """
+
+    def __init__(self, dataset: DuckDBDataset):
+        self._dataset = dataset
+        self._overlay: dict = {}
+        self._materialized = None
+
+    @property
+    def dataset(self) -> DuckDBDataset:
+        return self._dataset
+
+    @property
+    def columns(self) -> pd.Index:
+        extra = [c for c in self._overlay if c not in self._dataset.columns]
+        return pd.Index(self._dataset.columns + extra)
+
+    @property
+    def shape(self):
+        return (self._dataset.num_rows, len(self.columns))
+
+    @property
+    def empty(self) -> bool:
+        return self._dataset.num_rows == 0 or len(self.columns) == 0
+
+    @property
+    def dtypes(self) -> pd.Series:
+        return self.head(1000).dtypes
+
+    def __len__(self):
+        return self._dataset.num_rows
+
+    def sql(self, query: str) -> pd.DataFrame:
+        return self._dataset.sql(query)
+
+    def copy(self, deep: bool = True) -> "LazyFrame":
+        clone = LazyFrame(self._dataset)
+        clone._overlay = dict(self._overlay)
+        return clone
+
+    def head(self, n: int = 5) -> pd.DataFrame:
+        if self._materialized is not None:
+            return self._materialized.head(n)
+        frame = self._dataset.read_columns(limit=n)
+        for col, series in self._overlay.items():
+            frame[col] = series.iloc[:n].to_numpy()
+        return frame
+
+    def _column(self, col) -> pd.Series:
+        if self._materialized is not None:
+            return self._materialized[col]
+        if col in self._overlay:
+            return self._overlay[col]
+        if col not in self._dataset.columns:
+            raise KeyError(col)
+        return self._dataset.read_columns([col])[col]
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self._column(key)
+        if isinstance(key, (list, tuple)) and all(isinstance(k, str) for k in key):
+            if self._materialized is not None:
+                return self._materialized[list(key)]
+            base = [k for k in key if k not in self._overlay]
+            missing = [k for k in base if k not in self._dataset.columns]
+            if missing:
+                raise KeyError(missing)
+            frame = self._dataset.read_columns(base) if base else pd.DataFrame(index=range(len(self)))
+            for k in key:
+                if k in self._overlay:
+                    frame[k] = self._overlay[k].to_numpy()
+            return frame[list(key)]
+        return self.to_pandas()[key]
+
+    def __setitem__(self, key, value):
+        if self._materialized is not None:
+            self._materialized[key] = value
+            return
+        if isinstance(value, pd.Series):
+            value = value.reset_index(drop=True)
+        else:
+            value = pd.Series(value, index=range(len(self)))
+        self._overlay[key] = value
+
+    def __contains__(self, key):
+        return key in self.columns
+
+    def __iter__(self):
+        return iter(self.columns)
+
+    def to_pandas(self) -> pd.DataFrame:
+        """Materialize the full table (plus assigned columns) as a pandas DataFrame."""
+        if self._materialized is None:
+            estimate = self._dataset.estimated_bytes
+            if estimate > LAZY_MATERIALIZE_MAX_BYTES:
+                raise MemoryError(
+                    f"Dataset is about {estimate / 2**20:,.0f} MiB in memory ({self._dataset.num_rows:,} rows); "
+                    f"use sql('SELECT ... FROM data') or select columns with df[[...]] instead of the whole frame"
+                )
+            logger.info("Materializing %s (~%d MiB) into pandas", self._dataset.path.name, estimate >> 20)
+            frame = self._dataset.read_columns()
+            for col, series in self._overlay.items():
+                frame[col] = series.to_numpy()
+            self._materialized = frame
+            self._overlay = {}
+        return self._materialized
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.to_pandas(), name)
+
+    def __repr__(self):
+        return f"LazyFrame({self._dataset.num_rows} rows x {len(self.columns)} columns, {self._dataset.path.name})"
+
+
+def dataset_path(session_id: str | None) -> Path:
+    """
+    Parquet file for a session's dataset. Uploads without a session ID get a
+    file private to this worker process: workers must not replace a file
+    another worker's connection is reading.
+    """
+    if not session_id:
+        return DATA_DIR / f"_anonymous-{os.getpid()}.parquet"
+    # A digest, not the filtered ID: "a.b" and "ab" must not share a file
+    return DATA_DIR / f"{hashlib.sha256(session_id.encode()).hexdigest()[:32]}.parquet"
+
+
+def open_session_dataset(session_id: str | None) -> LazyFrame | None:
+    """Reopen a previously persisted session dataset, if it exists on this node."""
+    if not session_id:
+        return None
+    path = dataset_path(session_id)
+    if not path.exists():
+        return None
+    return LazyFrame(DuckDBDataset(path))
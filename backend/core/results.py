@@ -0,0 +1,199 @@
+# backend/core/results.py
+"""
+Session-scoped store for the intermediate results of generated code.
+
+After each execution the executor hands over the data values the snippet
+bound (DataFrames, Series, arrays, scalars) plus `prev_result`, the main
+result of the run. They are back in scope for the session's next snippet and
+are summarized in the prompt, so a follow-up such as "now break that down by
+month" starts from `prev_result` instead of re-filtering df. The executor
+hands a snippet snapshot() copies of the stored values it names, so a run
+that fails or is only a trial cannot change them in place. Entries are
+sized on insert and the least recently used ones (across all sessions) are
+evicted past RESULTS_MAX_BYTES.
+"""
+import copy
+import datetime
+import os
+import sys
+import threading
+from collections import OrderedDict
+from numbers import Number
+
+import numpy as np
+import pandas as pd
+
+RESULTS_MAX_BYTES = int(os.getenv("RESULTS_MAX_BYTES", 256 * 1024 * 1024))
+# Sessions whose results are kept; the least recently used are dropped
+RESULTS_MAX_SESSIONS = int(os.getenv("RESULTS_MAX_SESSIONS", 32))
+# Entries listed in the prompt, most recent first
+RESULTS_PROMPT_MAX_ENTRIES = int(os.getenv("RESULTS_PROMPT_MAX_ENTRIES", 8))
+
+PREV_RESULT = "prev_result"
+
+_SCALARS = (Number, str, bool, np.generic, pd.Timestamp, pd.Timedelta, datetime.date)
+
+
+def is_storable(value) -> bool:
+    """Data worth carrying between runs; figures, functions and modules are not."""
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index, np.ndarray) + _SCALARS):
+        return True
+    if isinstance(value, (list, tuple, dict)):
+        return len(value) <= 10_000
+    return False
+
+
+def _copy_on_write() -> bool:
+    # Always on from pandas 3; an opt-in option before that
+    return int(pd.__version__.split(".")[0]) >= 3 or pd.options.mode.copy_on_write is True
+
+
+def is_mutable(value) -> bool:
+    """Stored values a snippet can change in place."""
+    return isinstance(value, (pd.DataFrame, pd.Series, np.ndarray, list, dict))
+
+
+def snapshot(value):
+    """
+    A copy of a stored value that can be edited in place without changing the
+    store: shallow for pandas objects under copy-on-write, deep otherwise.
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy(deep=not _copy_on_write())
+    if isinstance(value, np.ndarray):
+        return value.copy()
+    if isinstance(value, (list, dict)):
+        return copy.deepcopy(value)
+    return value
+
+
+def value_nbytes(value) -> int:
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        usage = value.memory_usage(index=True, deep=True)
+        return int(usage.sum()) if isinstance(usage, pd.Series) else int(usage)
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (list, tuple, dict)):
+        items = value.items() if isinstance(value, dict) else enumerate(value)
+        return sys.getsizeof(value) + sum(sys.getsizeof(v) for _, v in items)
+    return sys.getsizeof(value)
+
+
+def describe_value(value, width: int = 80) -> str:
+    """One-line description of a stored value for the prompt."""
+    if isinstance(value, pd.DataFrame):
+        columns = ", ".join(str(c) for c in value.columns[:12])
+        if len(value.columns) > 12:
+            columns += ", ..."
+        return f"DataFrame {len(value):,} rows x {len(value.columns)} cols [{columns}]"
+    if isinstance(value, pd.Series):
+        name = f" '{value.name}'" if value.name is not None else ""
+        return f"Series{name} {len(value):,} values, dtype {value.dtype}, index {value.index[:5].tolist()}"[:width * 2]
+    if isinstance(value, np.ndarray):
+        return f"ndarray shape {value.shape}, dtype {value.dtype}"
+    if isinstance(value, (list, tuple, dict)):
+        return f"{type(value).__name__} of {len(value)} items"
+    text = repr(value)
+    if len(text) > width:
+        text = text[:width - 3] + "..."
+    return f"{type(value).__name__} = {text}"
+
+
+class ResultStore:
+    """Named results per session, LRU by entry under a shared byte budget."""
+
+    def __init__(self, max_bytes: int = RESULTS_MAX_BYTES, max_sessions: int = RESULTS_MAX_SESSIONS):
+        self.max_bytes = max_bytes
+        self.max_sessions = max_sessions
+        # session -> OrderedDict(name -> (value, nbytes)), most recent last
+        self._sessions: OrderedDict = OrderedDict()
+        # (session, name) in recency order across sessions, for eviction
+        self._lru: OrderedDict = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total
+
+    def get(self, session_id: str) -> dict:
+        """The session's stored values by name (a new dict; values are shared)."""
+        with self._lock:
+            entries = self._sessions.get(session_id)
+            if entries is None:
+                return {}
+            self._sessions.move_to_end(session_id)
+            for name in entries:
+                self._lru.move_to_end((session_id, name))
+            return {name: value for name, (value, _) in entries.items()}
+
+    def update(self, session_id: str, values: dict) -> None:
+        """Store (or replace) values for the session, evicting as needed."""
+        sized = {name: (value, value_nbytes(value)) for name, value in values.items()
+                 if is_storable(value)}
+        with self._lock:
+            entries = self._sessions.setdefault(session_id, OrderedDict())
+            self._sessions.move_to_end(session_id)
+            for name, (value, size) in sized.items():
+                self._remove(session_id, name)
+                if size > self.max_bytes:
+                    continue
+                entries[name] = (value, size)
+                self._lru[(session_id, name)] = None
+                self._total += size
+            while len(self._sessions) > self.max_sessions:
+                self._drop_session(next(iter(self._sessions)))
+            while self._total > self.max_bytes and self._lru:
+                old_session, name = next(iter(self._lru))
+                self._remove(old_session, name)
+
+    def _remove(self, session_id: str, name: str) -> None:
+        entries = self._sessions.get(session_id)
+        if entries is None or name not in entries:
+            return
+        _, size = entries.pop(name)
+        del self._lru[(session_id, name)]
+        self._total -= size
+
+    def _drop_session(self, session_id: str) -> None:
+        for key in [k for k in self._lru if k[0] == session_id]:
+            del self._lru[key]
+        entries = self._sessions.pop(session_id, None) or {}
+        self._total -= sum(size for _, size in entries.values())
+
+    def clear(self, session_id: str | None = None) -> None:
+        with self._lock:
+            if session_id is None:
+                self._sessions.clear()
+                self._lru.clear()
+                self._total = 0
+            else:
+                self._drop_session(session_id)
+
+    def summary(self, session_id: str, limit: int = RESULTS_PROMPT_MAX_ENTRIES) -> str | None:
+        """Prompt lines describing the session's stored results, most recent first."""
+        with self._lock:
+            entries = list((self._sessions.get(session_id) or {}).items())
+        if not entries:
+            return None
+        entries.reverse()
+        # prev_result leads: it is what follow-up questions usually refer to
+        entries.sort(key=lambda item: item[0] != PREV_RESULT)
+        lines = [f"- {name}: {describe_value(value)}" for name, (value, _) in entries[:limit]]
+        if len(entries) > limit:
+            lines.append(f"- ... and {len(entries) - limit} more")
+        return "\n".join(lines)
+
+
+def pick_prev_result(result, new_values: dict):
+    """
+    The value a follow-up most likely means by "that": the run's result when
+    it is tabular, else the last DataFrame or Series the snippet created,
+    else the result itself.
+    """
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        return result
+    for value in reversed(list(new_values.values())):
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            return value
+    return result
@@ -0,0 +1,235 @@
+# backend/core/sketches.py
+"""
+Small mergeable sketches used by core.profile: a t-digest for quantiles, a
+HyperLogLog for distinct counts and a heavy-hitters counter for top values.
+Each is built from a chunk with vectorized NumPy, merged with another sketch
+of the same kind, and round-trips through to_dict()/from_dict() as plain JSON.
+"""
+import base64
+
+import numpy as np
+import pandas as pd
+
+
+class TDigest:
+    """
+    Merging t-digest with the k1 (arcsine) scale function. Centroids near the
+    tails stay small, so extreme quantiles are accurate while the digest keeps
+    at most ~compression centroids.
+    """
+
+    def __init__(self, compression: int = 100):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+
+    @property
+    def count(self) -> float:
+        return float(self.weights.sum())
+
+    def _compress(self, means: np.ndarray, weights: np.ndarray):
+        order = np.argsort(means, kind="mergesort")
+        self._cluster(means[order], weights[order])
+
+    def _cluster(self, means: np.ndarray, weights: np.ndarray):
+        """Collapse points already sorted by mean into centroids."""
+        total = weights.sum()
+        if total == 0:
+            self.means, self.weights = means, weights
+            return
+        # Cluster by the integer part of k(q) evaluated at each point's midpoint
+        q = (np.cumsum(weights) - weights / 2) / total
+        k = self.compression / (2 * np.pi) * np.arcsin(2 * np.clip(q, 0, 1) - 1)
+        ids = np.floor(k).astype(np.int64)
+        ids = np.unique(ids, return_inverse=True)[1]
+        w = np.bincount(ids, weights=weights)
+        m = np.bincount(ids, weights=means * weights) / w
+        self.means, self.weights = m, w
+
+    @classmethod
+    def from_values(cls, values, compression: int = 100) -> "TDigest":
+        digest = cls(compression)
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if len(values):
+            digest._cluster(np.sort(values), np.ones(len(values)))
+        return digest
+
+    @classmethod
+    def from_quantiles(cls, values, count: int, compression: int = 100) -> "TDigest":
+        """
+        Approximate digest from quantiles at evenly spaced ranks (for example a
+        query engine's approx_quantile), each standing for count/len(values) rows.
+        """
+        digest = cls(compression)
+        values = np.sort(np.asarray([v for v in values if v is not None], dtype=float))
+        if len(values) and count:
+            digest._cluster(values, np.full(len(values), count / len(values)))
+        return digest
+
+    def merge(self, other: "TDigest") -> "TDigest":
+        if len(other.means):
+            self._compress(np.concatenate([self.means, other.means]),
+                           np.concatenate([self.weights, other.weights]))
+        return self
+
+    def quantile(self, q: float, lo: float | None = None, hi: float | None = None) -> float | None:
+        """Estimate quantile q; lo/hi are the exact min/max when known."""
+        if not len(self.means):
+            return None
+        if len(self.means) == 1:
+            return float(self.means[0])
+        cum = np.cumsum(self.weights) - self.weights / 2
+        target = q * self.count
+        xs, ys = cum, self.means
+        if lo is not None and hi is not None:
+            xs = np.concatenate([[0.0], cum, [self.count]])
+            ys = np.concatenate([[lo], self.means, [hi]])
+        return float(np.interp(target, xs, ys))
+
+    def to_dict(self) -> dict:
+        return {"compression": self.compression,
+                "means": self.means.tolist(), "weights": self.weights.tolist()}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TDigest":
+        digest = cls(data["compression"])
+        digest.means = np.asarray(data["means"], dtype=float)
+        digest.weights = np.asarray(data["weights"], dtype=float)
+        return digest
+
+
+def _bit_length(w: np.ndarray) -> np.ndarray:
+    """Exact bit length of each uint64 in w."""
+    w = w.copy()
+    n = np.zeros(len(w), dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        big = w >= (np.uint64(1) << np.uint64(shift))
+        n[big] += shift
+        w[big] >>= np.uint64(shift)
+    return n + (w > 0)
+
+
+class HyperLogLog:
+    """HyperLogLog distinct counter with 2**p registers (~1.6% error at p=12)."""
+
+    def __init__(self, p: int = 12):
+        self.p = p
+        self.registers = np.zeros(1 << p, dtype=np.uint8)
+
+    @classmethod
+    def from_series(cls, s: pd.Series, p: int = 12, distinct: bool = False) -> "HyperLogLog":
+        """Build from the values of s; pass distinct=True when s has no repeats."""
+        if not len(s):
+            return cls(p)
+        hashes = pd.util.hash_pandas_object(s, index=False, categorize=not distinct)
+        hashes = hashes.to_numpy(dtype=np.uint64)
+        idx = hashes >> np.uint64(64 - p)
+        rest = hashes & np.uint64((1 << (64 - p)) - 1)
+        # The highest rank in a register comes from its smallest remainder,
+        # so reduce first and take bit lengths of at most 2**p values
+        smallest = pd.Series(rest).groupby(idx).min()
+        return cls.from_minima(smallest.index.to_numpy(), smallest.to_numpy(), p)
+
+    @classmethod
+    def from_minima(cls, idx, smallest, p: int = 12) -> "HyperLogLog":
+        """
+        Build from each register's smallest hash remainder (the low 64 - p
+        bits), as a GROUP BY over the top p bits of a 64-bit hash computes it.
+        """
+        hll = cls(p)
+        smallest = np.asarray(smallest, dtype=np.uint64)
+        if len(smallest):
+            rank = (64 - p) - _bit_length(smallest) + 1
+            hll.registers[np.asarray(idx, dtype=np.int64)] = rank.astype(np.uint8)
+        return hll
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def estimate(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            return int(round(m * np.log(m / zeros)))  # linear counting for small sets
+        return int(round(raw))
+
+    def to_dict(self) -> dict:
+        return {"p": self.p, "registers": base64.b64encode(self.registers.tobytes()).decode("ascii")}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "HyperLogLog":
+        hll = cls(data["p"])
+        hll.registers = np.frombuffer(base64.b64decode(data["registers"]), dtype=np.uint8).copy()
+        return hll
+
+
+class TopK:
+    """
+    Mergeable heavy-hitters summary (Misra-Gries style). Keeps the `capacity`
+    most frequent values; `error` bounds how much any count may be undercounted.
+    While every value fits, counts keep the order values were first seen in.
+    """
+
+    def __init__(self, capacity: int = 32):
+        self.capacity = capacity
+        self.counts: dict = {}
+        self.error = 0
+
+    @classmethod
+    def from_series(cls, s: pd.Series, capacity: int = 32) -> "TopK":
+        return cls.from_counts(s.value_counts(dropna=True, sort=False), capacity)
+
+    @classmethod
+    def from_counts(cls, counts: pd.Series, capacity: int = 32) -> "TopK":
+        """Build from value_counts() output, in first-seen order when all values fit."""
+        topk = cls(capacity)
+        if len(counts) > capacity:
+            counts = counts.sort_values(ascending=False, kind="stable")
+            topk.error = int(counts.iloc[capacity])
+            counts = counts.iloc[:capacity]
+        topk.counts = {_plain(k): int(v) for k, v in counts.items()}
+        return topk
+
+    @property
+    def exact(self) -> bool:
+        """True when every distinct value seen is still tracked."""
+        return self.error == 0
+
+    def merge(self, other: "TopK") -> "TopK":
+        merged = dict(self.counts)
+        for value, count in other.counts.items():
+            merged[value] = merged.get(value, 0) + count
+        self.error += other.error
+        if len(merged) > self.capacity:
+            ranked = sorted(merged.items(), key=lambda kv: kv[1], reverse=True)
+            self.error += ranked[self.capacity][1]
+            merged = dict(ranked[:self.capacity])
+        self.counts = merged
+        return self
+
+    def most_common(self, n: int | None = None):
+        return sorted(self.counts.items(), key=lambda kv: kv[1], reverse=True)[:n]
+
+    def to_dict(self) -> dict:
+        return {"capacity": self.capacity, "error": self.error,
+                "counts": [[k, v] for k, v in self.counts.items()]}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TopK":
+        topk = cls(data["capacity"])
+        topk.error = data["error"]
+        topk.counts = {k: v for k, v in data["counts"]}
+        return topk
+
+
+def _plain(value):
+    """Convert NumPy scalars to JSON-friendly Python values."""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
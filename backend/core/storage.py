@@ -0,0 +1,165 @@
+# backend/core/storage.py
+"""
+Per-session dataset storage in Redis, shared by all workers.
+
+Uses redis.asyncio with a bounded connection pool so large GET/SETs never
+block the event loop. A dataset is written as one Redis list: a pickle
+(protocol 5) header followed by the out-of-band column buffers, so NumPy data
+goes to the socket straight from the DataFrame's memory and comes back as
+bytes that pickle wraps without another copy. The frame, profile and
+rendered context for a session are written in a single MULTI pipeline and
+read back in one round trip.
+"""
+import asyncio
+import logging
+import os
+import pickle
+import time
+
+import pandas as pd
+
+from core.profile import DatasetProfile
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL")
+# TTL in seconds for temporary datasets (e.g., 24 hours)
+DATA_TTL_SECONDS = int(os.getenv("DATA_TTL_SECONDS", 60 * 60 * 24))
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 20))
+# Generous read timeout: a multi-hundred-MB value can take a while on a slow link
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", 30))
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", 5))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", 30))
+
+# Frames smaller than this are pickled on the event loop; larger ones in a thread
+INLINE_SERIALIZE_BYTES = 4 * 1024 * 1024
+
+
+def frame_key(session_id: str) -> str:
+    return f"frame:{session_id}"
+
+
+def profile_key(session_id: str) -> str:
+    return f"profile:{session_id}"
+
+
+def context_key(session_id: str) -> str:
+    return f"context:{session_id}"
+
+
+def legacy_frame_key(session_id: str) -> str:
+    # Single pickled value written by earlier versions; read-only fallback
+    return f"dataset:{session_id}"
+
+
+def serialize_frame(df: pd.DataFrame) -> list:
+    """
+    [header, buffer, ...] for a frame. Buffers are memoryviews onto the frame's
+    own arrays, so the frame must stay alive and unmodified until they are sent.
+    """
+    buffers = []
+    header = pickle.dumps(df, protocol=5, buffer_callback=buffers.append)
+    return [header] + [buf.raw() for buf in buffers]
+
+
+def deserialize_frame(parts: list) -> pd.DataFrame:
+    """
+    Rebuild a frame from serialize_frame() output. Column arrays are views onto
+    the received bytes, so they are read-only; callers that mutate in place
+    must copy (code execution always works on a copy).
+    """
+    return pickle.loads(parts[0], buffers=parts[1:])
+
+
+class StoredDataset:
+    """A session's dataset as loaded from Redis."""
+
+    __slots__ = ("df", "profile", "context", "expires_at")
+
+    def __init__(self, df: pd.DataFrame, profile: DatasetProfile | None, context: str | None,
+                 expires_at: float | None = None):
+        self.df = df
+        self.profile = profile
+        self.context = context
+        self.expires_at = expires_at  # epoch seconds the stored copy lapses at, when known
+
+
+class SessionStore:
+    """Async Redis storage for per-session datasets, profiles and contexts."""
+
+    def __init__(self, client, ttl: int = DATA_TTL_SECONDS):
+        self.client = client
+        self.ttl = ttl
+
+    @classmethod
+    def from_url(cls, url: str, ttl: int = DATA_TTL_SECONDS) -> "SessionStore":
+        import redis.asyncio as aioredis  # only imported when a Redis URL is configured
+
+        pool = aioredis.ConnectionPool.from_url(
+            url,
+            max_connections=REDIS_MAX_CONNECTIONS,
+            socket_timeout=REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+            socket_keepalive=True,
+            health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+            retry_on_timeout=True,
+        )
+        return cls(aioredis.Redis(connection_pool=pool), ttl)
+
+    async def save(self, session_id: str, df: pd.DataFrame,
+                   profile: DatasetProfile | None = None, context: str | None = None) -> None:
+        """Replace the session's frame, profile and context in one transaction."""
+        if df.memory_usage(index=True).sum() > INLINE_SERIALIZE_BYTES:
+            parts = await asyncio.to_thread(serialize_frame, df)
+        else:
+            parts = serialize_frame(df)
+        profile_json = profile.to_json() if profile is not None else None
+
+        key = frame_key(session_id)
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.delete(key, legacy_frame_key(session_id))
+            pipe.rpush(key, *parts)
+            pipe.expire(key, self.ttl)
+            if profile_json is not None:
+                pipe.set(profile_key(session_id), profile_json, ex=self.ttl)
+            else:
+                pipe.delete(profile_key(session_id))
+            if context is not None:
+                pipe.set(context_key(session_id), context, ex=self.ttl)
+            else:
+                pipe.delete(context_key(session_id))
+            await pipe.execute()
+
+    async def load(self, session_id: str) -> StoredDataset | None:
+        """The session's dataset, or None if it expired or was never saved."""
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.lrange(frame_key(session_id), 0, -1)
+            pipe.get(profile_key(session_id))
+            pipe.get(context_key(session_id))
+            pipe.ttl(frame_key(session_id))
+            parts, profile_json, context, ttl = await pipe.execute()
+
+        if parts:
+            if sum(len(p) for p in parts) > INLINE_SERIALIZE_BYTES:
+                df = await asyncio.to_thread(deserialize_frame, parts)
+            else:
+                df = deserialize_frame(parts)
+        else:
+            legacy = await self.client.get(legacy_frame_key(session_id))
+            if not legacy:
+                return None
+            df = pickle.loads(legacy)
+            ttl = None
+
+        profile = DatasetProfile.from_json(profile_json) if profile_json else None
+        if isinstance(context, bytes):
+            context = context.decode()
+        expires_at = time.time() + ttl if ttl is not None and ttl > 0 else None
+        return StoredDataset(df, profile, context, expires_at)
+
+    async def delete(self, session_id: str) -> None:
+        await self.client.delete(frame_key(session_id), profile_key(session_id),
+                                 context_key(session_id), legacy_frame_key(session_id))
+
+    async def close(self) -> None:
+        await self.client.aclose()
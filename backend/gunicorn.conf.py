@@ -0,0 +1,43 @@
+# backend/gunicorn.conf.py
+#
+# Production server settings:  gunicorn -c gunicorn.conf.py api.main:app
+#
+# The app (pandas, numpy, fastapi, ...) is imported once in the master and
+# workers are forked from it, so those pages are shared copy-on-write instead
+# of every worker importing them again. Modules the app loads lazily (plotly,
+# and duckdb when that engine is on) are also warmed in the master, so
+# workers get them for free while a plain `uvicorn` dev run still starts
+# without them.
+import gc
+import importlib
+import logging
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 120))
+graceful_timeout = 30
+keepalive = 5
+
+# Comma-separated modules to import in the master before forking
+PRELOAD_MODULES = os.getenv("PRELOAD_MODULES", "plotly.express,plotly.graph_objects")
+
+
+def on_starting(server):
+    modules = [m.strip() for m in PRELOAD_MODULES.split(",") if m.strip()]
+    if os.getenv("QUERY_ENGINE", "pandas").lower() == "duckdb":
+        modules.append("duckdb")
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logging.getLogger("gunicorn.error").warning("Could not preload %s: %s", name, e)
+
+
+def pre_fork(server, worker):
+    # Move everything imported so far out of the collector's generations so
+    # a GC pass in the worker does not write to (and un-share) those pages.
+    gc.collect()
+    gc.freeze()
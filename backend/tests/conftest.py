@@ -0,0 +1,6 @@
+# backend/tests/conftest.py
+import sys
+from pathlib import Path
+
+# Tests import backend modules the way the app does (core.*, utils.*)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
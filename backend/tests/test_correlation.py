@@ -0,0 +1,48 @@
+# backend/tests/test_correlation.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.correlation import pairwise_corr, strongest_columns
+
+
+@pytest.fixture
+def df():
+    rng = np.random.default_rng(0)
+    n = 500
+    x = rng.normal(size=n)
+    frame = pd.DataFrame({
+        "x": x,
+        "y": 3 * x + rng.normal(size=n),
+        "z": rng.gamma(2.0, 50.0, n),
+        "count": rng.integers(0, 10, n),
+        "flag": rng.random(n) < 0.3,
+        "constant": np.full(n, 7.0),
+        "all_missing": np.full(n, np.nan),
+        "one_value": np.where(np.arange(n) == 3, 1.0, np.nan),
+        # Varies overall but is constant on the rows it shares with "sparse"
+        "piecewise": np.where(np.arange(n) < 250, 1.0, rng.normal(size=n)),
+        "sparse": np.where(np.arange(n) < 250, rng.normal(size=n), np.nan),
+    })
+    for col in ("x", "y", "z"):
+        frame.loc[rng.random(n) < 0.2, col] = np.nan
+    return frame
+
+
+@pytest.mark.parametrize("block_rows", [7, 64, 100_000])
+def test_matches_pandas_with_missing_and_constant_columns(df, block_rows):
+    expected = df.corr()
+    result = pairwise_corr(df, block_rows=block_rows)
+    pd.testing.assert_frame_equal(result, expected, check_exact=False, atol=1e-9)
+
+
+def test_large_offsets_keep_precision():
+    rng = np.random.default_rng(1)
+    x = rng.normal(size=1000)
+    df = pd.DataFrame({"a": 1e9 + x, "b": 1e9 - 2 * x + rng.normal(size=1000)})
+    pd.testing.assert_frame_equal(pairwise_corr(df, block_rows=100), df.corr(), check_exact=False, atol=1e-9)
+
+
+def test_strongest_columns_skip_undefined_pairs(df):
+    corr = pairwise_corr(df[["x", "y", "z", "constant"]])
+    assert strongest_columns(corr, 2) == ["x", "y"]
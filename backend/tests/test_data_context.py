@@ -0,0 +1,77 @@
+# backend/tests/test_data_context.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.data_context import analyze_data_patterns, column_roles, generate_data_context, profile_from_engine
+from core.profile import DatasetProfile
+
+
+@pytest.fixture
+def df():
+    rng = np.random.default_rng(0)
+    n = 200
+    return pd.DataFrame({
+        "Order ID": np.arange(n),
+        "Order Date": pd.date_range("2023-01-01", periods=n, freq="D").strftime("%Y-%m-%d"),
+        "Region": rng.choice(["North", "South", "East", "West"], n),
+        "Sales": rng.gamma(2.0, 50.0, n).round(4),
+        "Year": np.repeat([2023, 2024], n // 2),
+    })
+
+
+def test_pattern_cardinality_lists_keep_every_column(df):
+    insights = analyze_data_patterns(df)
+    assert "Low cardinality columns (good for grouping): Region(4), Year(2)" in insights
+    # Near-unique floats and date strings are listed too; column_roles does not change this
+    assert "High cardinality columns (likely identifiers): Order ID, Order Date, Sales" in insights
+
+
+def test_column_roles_split_time_and_measures(df):
+    roles = column_roles(df)
+    assert roles.time == ["Order Date"]
+    assert roles.dimensions == ["Region", "Year"]
+    assert roles.identifiers == ["Order ID"]
+    assert roles.measures == ["Sales"]
+
+
+def _listed_values(context, column):
+    line = next(l for l in context.splitlines() if l.startswith(f"- {column}:"))
+    return line.split("(values: ")[1].split(")")[0].split(", ")
+
+
+@pytest.fixture
+def regions():
+    # West is the most frequent value but appears last
+    return pd.DataFrame({"Region": ["South", "North", "South", "East", "West", "West", "West"],
+                         "Sales": np.arange(7.0)})
+
+
+def test_context_lists_values_in_first_seen_order(regions):
+    context = generate_data_context(regions)
+    assert _listed_values(context, "Region") == list(regions["Region"].unique())
+
+
+def test_categorical_values_skip_unused_categories(regions):
+    regions["Region"] = regions["Region"].astype(pd.CategoricalDtype(["East", "North", "South", "West", "Zone"]))
+    context = generate_data_context(regions)
+    assert _listed_values(context, "Region") == ["South", "North", "East", "West"]
+
+
+def test_appended_profile_keeps_first_seen_order(regions):
+    profile = DatasetProfile.from_frame(regions.iloc[:4])
+    profile.merge(DatasetProfile.from_frame(regions.iloc[4:]))
+    assert list(profile.columns["Region"].topk.counts) == ["South", "North", "East", "West"]
+
+
+def test_engine_profile_matches_the_pandas_order(regions, tmp_path):
+    pytest.importorskip("duckdb")
+    from core.query_engine import DuckDBDataset
+
+    regions.to_parquet(tmp_path / "data.parquet", index=False)
+    dataset = DuckDBDataset(tmp_path / "data.parquet")
+    try:
+        profile = profile_from_engine(dataset)
+    finally:
+        dataset.close()
+    assert list(profile.columns["Region"].topk.counts) == ["South", "North", "East", "West"]
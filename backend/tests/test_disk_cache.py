@@ -0,0 +1,85 @@
+# backend/tests/test_disk_cache.py
+import asyncio
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.disk_cache import DiskCache
+from core.profile import DatasetProfile
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({
+        "Region": pd.Series(["North", None, "West"], dtype=object),
+        "Units": [1, 2, 3],
+        "Order Date": pd.to_datetime(["2023-01-01", "2023-01-02", "2023-01-03"]),
+        "Segment": pd.Categorical(["a", "b", "a"]),
+        "Sales": [1.5, np.nan, 2.0],
+    })
+
+
+def test_round_trip_keeps_upload_dtypes(tmp_path, df):
+    cache = DiskCache(tmp_path)
+    assert cache.save("s1", df, DatasetProfile.from_frame(df), "context")
+    stored = cache.load("s1")
+    assert list(stored.df.dtypes) == list(df.dtypes)
+    assert stored.df.equals(df)
+    assert stored.context == "context"
+    assert stored.profile is not None
+
+
+def test_sidecar_from_another_write_is_ignored(tmp_path, df):
+    cache = DiskCache(tmp_path)
+    cache.save("s1", df, DatasetProfile.from_frame(df), "old context")
+    _, meta_path = cache._paths("s1")
+    stale = meta_path.read_text()
+    cache.save("s1", df.head(2), DatasetProfile.from_frame(df.head(2)), "new context")
+    meta_path.write_text(stale)
+    stored = cache.load("s1")
+    assert len(stored.df) == 2
+    assert stored.context is None and stored.profile is None
+    assert json.loads(stale)["context"] == "old context"
+
+
+def test_expired_entry_is_a_miss(tmp_path, df):
+    cache = DiskCache(tmp_path)
+    cache.save("s1", df, expires_at=time.time() - 1)
+    assert cache.load("s1") is None
+    expires_at = time.time() + 60
+    cache.save("s1", df, expires_at=expires_at)
+    assert cache.load("s1").expires_at == pytest.approx(expires_at)
+
+
+def test_entries_untouched_for_a_ttl_are_evicted(tmp_path, df):
+    cache = DiskCache(tmp_path, ttl=60)
+    cache.save("old", df)
+    data_path, meta_path = cache._paths("old")
+    os.utime(data_path, (time.time() - 120, time.time() - 120))
+    cache.save("new", df)
+    assert not data_path.exists() and not meta_path.exists()
+    assert cache.load("new") is not None
+
+
+def test_similar_session_ids_do_not_share_a_file(tmp_path, df):
+    cache = DiskCache(tmp_path)
+    cache.save("a.b", df)
+    cache.save("ab", df.head(1))
+    assert len(cache.load("a.b").df) == len(df)
+
+
+def test_redis_load_reports_the_key_expiry(df):
+    fakeredis = pytest.importorskip("fakeredis")
+    from core.storage import SessionStore
+
+    async def round_trip():
+        store = SessionStore(fakeredis.aioredis.FakeRedis(), ttl=300)
+        await store.save("s1", df)
+        return await store.load("s1")
+
+    stored = asyncio.run(round_trip())
+    assert stored.expires_at == pytest.approx(time.time() + 300, abs=5)
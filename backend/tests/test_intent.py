@@ -0,0 +1,24 @@
+# backend/tests/test_intent.py
+import pytest
+
+from utils.intent import classify_intent
+
+
+@pytest.mark.parametrize("question, grain", [
+    ("Sales by quarter", "quarter"),
+    ("Quarterly revenue", "quarter"),
+    ("Revenue per quarter in 2023", "quarter"),
+    ("Q3 revenue per quarter", "quarter"),
+    # A bare quarter names a period to filter on, not a grain
+    ("Sales in Q1", None),
+    ("Which region led Q4?", None),
+    ("Compare Q1 and Q2 revenue", None),
+])
+def test_quarter_grain_needs_a_grain_phrase(question, grain):
+    assert classify_intent(question).time_grain == grain
+
+
+def test_bare_quarter_is_left_for_the_filter():
+    intent = classify_intent("Sales trend in Q2", ["Sales"])
+    assert intent.time_grain is None
+    assert "q2" in intent.rest
@@ -0,0 +1,73 @@
+# backend/tests/test_metrics.py
+import asyncio
+import pstats
+
+import utils.metrics as metrics
+from utils.metrics import RequestProfiler, Trace, profile_thread
+
+
+def _busy_worker():
+    return sum(i * i for i in range(10_000))
+
+
+def test_worker_thread_is_merged_into_cpu_profile(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "PROFILE_DIR", tmp_path)
+
+    async def request():
+        with RequestProfiler("cpu", "test") as profiler:
+            await asyncio.to_thread(profile_thread(_busy_worker))
+        return profiler.path
+
+    path = asyncio.run(request())
+    functions = {name for _, _, name in pstats.Stats(str(path)).stats}
+    assert "_busy_worker" in functions
+
+
+def test_profile_thread_is_a_no_op_without_a_profile():
+    assert profile_thread(_busy_worker) is _busy_worker
+
+
+def test_trace_timings_in_milliseconds():
+    trace = Trace()
+    trace.add("llm", 0.25)
+    trace.add("llm", 0.5)
+    assert trace.timings(1.0) == {"llm": 750.0, "total": 1000.0}
+
+
+def test_histogram_renders_cumulative_buckets():
+    hist = metrics.Histogram("test_seconds", "help", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        hist.observe(value, route='/a"b')
+    assert list(hist.samples()) == [
+        'test_seconds_bucket{route="/a\\"b",le="0.1"} 1',
+        'test_seconds_bucket{route="/a\\"b",le="1.0"} 2',
+        'test_seconds_bucket{route="/a\\"b",le="+Inf"} 3',
+        'test_seconds_sum{route="/a\\"b"} 5.55',
+        'test_seconds_count{route="/a\\"b"} 3',
+    ]
+
+
+def test_stage_times_the_block_and_counts_errors():
+    trace = metrics.start_trace()
+    with metrics.stage("test_stage"):
+        pass
+    try:
+        with metrics.stage("test_stage"):
+            raise ValueError
+    except ValueError:
+        pass
+    assert set(trace.stages) == {"test_stage"}
+    rendered = metrics.render_metrics()
+    assert 'insightai_stage_errors_total{stage="test_stage"} 1' in rendered
+    assert 'insightai_stage_duration_seconds_count{stage="test_stage"} 2' in rendered
+
+
+def test_server_timing_carries_llm_tokens():
+    trace = metrics.start_trace()
+
+    class Usage:
+        prompt_tokens, completion_tokens = 120, 30
+
+    trace.add("llm", 0.2)
+    metrics.record_tokens("test-model", Usage())
+    assert trace.server_timing(0.25) == 'llm;dur=200.0;desc="tokens 120/30", total;dur=250.0'
@@ -0,0 +1,65 @@
+# backend/tests/test_output.py
+import sys
+import threading
+
+import pandas as pd
+import pytest
+
+from core.executor import create_executor
+from utils.output import OutputBuffer, capture_output
+
+
+def test_buffer_stops_at_the_byte_cap():
+    buffer = OutputBuffer(max_bytes=10)
+    buffer.write("abcdefgh")
+    buffer.write("é" * 4)  # two bytes each: only one fits
+    assert buffer.size == 10
+    assert buffer.getvalue(marker=False) == "abcdefghé"
+    assert buffer.dropped == 6
+    assert buffer.getvalue().endswith("[output truncated: 6 more bytes]\n")
+
+
+def test_streamed_chunks_are_capped_too():
+    chunks = []
+    buffer = OutputBuffer(max_bytes=5, on_write=chunks.append)
+    buffer.print("hello world")
+    buffer.print("more")
+    assert chunks == ["hello"]
+
+
+def test_concurrent_captures_keep_their_own_output():
+    buffers = [OutputBuffer() for _ in range(8)]
+    start = threading.Barrier(len(buffers))
+
+    def run(i):
+        with capture_output(buffers[i]):
+            start.wait()
+            for _ in range(200):
+                sys.stdout.write(f"<{i}>")
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(buffers))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for i, buffer in enumerate(buffers):
+        assert buffer.getvalue() == f"<{i}>" * 200
+
+
+@pytest.mark.parametrize("backend", ["thread", "process"])
+def test_executor_output_is_capped_and_per_request(backend):
+    executor = create_executor(backend)
+    df = pd.DataFrame({"Sales": [1.0, 2.0]})
+    try:
+        small, other = OutputBuffer(max_bytes=50), OutputBuffer()
+        result = executor.run("for i in range(100):\n    print('line', i)\nresult = 1", df,
+                              session_id="a", output=small)
+        assert result.ok, result.error
+        executor.run("df.info()\nprint('second request')", df, session_id="b", output=other)
+    finally:
+        executor.shutdown()
+    assert small.size <= 50 and small.truncated
+    assert small.getvalue().startswith("line 0\nline 1\n")
+    assert "second request" not in small.getvalue()
+    assert "line 0" not in other.getvalue()
+    assert "Sales" in other.getvalue() and "second request" in other.getvalue()
@@ -0,0 +1,69 @@
+# backend/tests/test_prewarm.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.prewarm import plan_overviews
+from core.profile import DatasetProfile
+from utils.intent import classify_intent
+
+
+@pytest.fixture
+def df():
+    rng = np.random.default_rng(0)
+    n = 200
+    return pd.DataFrame({
+        "Order Date": pd.date_range("2023-01-01", periods=n, freq="D").strftime("%Y-%m-%d"),
+        "Region": rng.choice(["North", "South", "East", "West"], n),
+        "Sales": rng.gamma(2.0, 50.0, n).round(2),
+    })
+
+
+def _matching(df, question):
+    intent = classify_intent(question, df.columns)
+    return [plan.kind for plan in plan_overviews(df) if plan.matches(intent, intent.chart)]
+
+
+@pytest.mark.parametrize("question, kind", [
+    ("Which Region has the highest Sales?", "top"),
+    ("Total Sales by Region", "top"),
+    ("Sales by Region as a bar chart", "top"),
+    ("Show the Sales trend", "trend"),
+    ("Monthly Sales over time", "trend"),
+    ("What is the distribution of Sales?", "distribution"),
+])
+def test_overview_matches(df, question, kind):
+    assert _matching(df, question) == [kind]
+
+
+@pytest.mark.parametrize("question", [
+    "Which Region has the lowest Sales?",
+    "What is the average Sales by Region?",
+    "How many Sales per Region?",
+    "Median Sales by Region",
+    "Top 3 Region by Sales",
+    "Weekly Sales trend",
+    "Average Sales over time",
+    "Sales by Region per month",
+    "Distribution of average Sales",
+    # Filters narrow the question; the warm answer covers all rows
+    "Which Region has the highest Sales in 2021?",
+    "Which Region has the highest Sales excluding West?",
+    "Which Region has the highest Sales for orders after March?",
+    "What is the distribution of Sales in the West?",
+    "Sales trend in 2022",
+    "Sales trend for North",
+    "Which Region has the highest Sales only online?",
+    "Distribution of Sales where Region is East",
+    "North Sales trend",
+    "Q1 Sales trend",
+])
+def test_overview_rejects_conflicting_questions(df, question):
+    assert _matching(df, question) == []
+
+
+def test_category_values_come_from_the_profile(df):
+    plans = plan_overviews(df, profile=DatasetProfile.from_frame(df))
+    assert ("west",) in plans[0].values
+    intent = classify_intent("Show the Sales trend for the West", df.columns)
+    assert not any(plan.matches(intent, intent.chart) for plan in plans)
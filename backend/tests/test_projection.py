@@ -0,0 +1,105 @@
+# backend/tests/test_projection.py
+import numpy as np
+import pandas as pd
+import pytest
+
+import core.executor as executor_module
+from core.executor import create_executor
+from core.projection import plan_projection
+
+
+@pytest.fixture
+def df():
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "Order ID": np.arange(50),
+        "Order Date": pd.date_range("2023-01-01", periods=50, freq="W").strftime("%Y-%m-%d"),
+        "Region": rng.choice(["North", "South", "East", "West"], 50),
+        "Sales": rng.gamma(2.0, 50.0, 50).round(2),
+        "Quantity": rng.integers(1, 10, 50),
+    })
+
+
+def _run(code, df, projection, monkeypatch):
+    monkeypatch.setattr(executor_module, "EXEC_COLUMN_PROJECTION", projection)
+    executor = create_executor("thread")
+    result = executor.run(code, df, "test")
+    return result, executor.results.get("test")
+
+
+def _same(a, b):
+    if isinstance(a, pd.DataFrame):
+        pd.testing.assert_frame_equal(a, b)
+    elif isinstance(a, pd.Series):
+        pd.testing.assert_series_equal(a, b)
+    else:
+        assert a == b
+
+
+# Snippets whose value must not depend on projection
+SNIPPETS = [
+    "result = df.head()",
+    "result = df.iloc[0]",
+    "result = df[df['Sales'] > 1]",
+    "col = df.columns[1]\nresult = df[col].head()",
+    "west = df[df['Region'] == 'West']\nresult = west['Sales'].sum()",
+    "top = df.nlargest(3, 'Sales')",
+    "print(df.head())\nresult = 1",
+    "result = df.groupby('Region')['Sales'].sum()",
+    "result = df[df['Region'].isin(['West', 'East'])]['Sales'].mean()",
+    "result = df.loc[df['Sales'] > 50, ['Region', 'Sales']]",
+    "result = df[['Region', 'Sales']].head()",
+    "result = len(df[df['Quantity'] > 3])",
+    # Column names computed at runtime
+    "date_col = [c for c in df.columns if 'date' in c.lower()][0]\nresult = df.groupby(date_col)['Sales'].sum()",
+    "col = df.columns[1]\nresult = df.sort_values(col)['Sales']",
+    "result = df.set_index(df.columns[2])['Sales']",
+    "result = df.nlargest(1, df.columns[4])['Region']",
+    "result = df.pivot_table(index='Region', values='Sales', columns=df.columns[4])",
+    "result = df.groupby(df['Order Date'].str[:7])['Sales'].sum()",
+]
+
+
+@pytest.mark.parametrize("code", SNIPPETS)
+def test_projection_does_not_change_results(code, df, monkeypatch):
+    full, full_vars = _run(code, df, False, monkeypatch)
+    projected, projected_vars = _run(code, df, True, monkeypatch)
+    assert full.ok, full.error
+    assert projected.ok, projected.error
+    _same(full.result, projected.result)
+    assert full_vars.keys() == projected_vars.keys()
+    for name in full_vars:
+        _same(full_vars[name], projected_vars[name])
+
+
+@pytest.mark.parametrize("code", [
+    "result = df.head()",
+    "result = df.iloc[0]",
+    "result = df[df['Sales'] > 1]",
+    "col = df.columns[1]\nresult = df[col].head()",
+    "west = df[df['Region'] == 'West']\nresult = west['Sales'].sum()",
+    "print(df.head())",
+    "date_col = 'Order Date'\nresult = df.groupby(date_col)['Sales'].sum()",
+    "col = 'Sales'\nresult = df.sort_values(col)['Region']",
+    "result = df.set_index(df.columns[2])['Sales']",
+    "result = df.nlargest(1, df.columns[4])['Region']",
+    "result = df.pivot_table(index='Region', values='Sales', columns=df.columns[4])",
+    "names = {'Sales': 'S'}\nresult = df.rename(columns=names)['S']",
+    "result = df.assign(x=lambda d: d[d.columns[0]])['Sales']",
+])
+def test_escaping_or_dynamic_access_is_not_projected(code, df):
+    assert plan_projection(code, df) is None
+
+
+@pytest.mark.parametrize("code, columns", [
+    ("result = df.groupby('Region')['Sales'].sum()", ["Region", "Sales"]),
+    ("result = df[df['Sales'] > 1]['Quantity'].mean()", ["Sales", "Quantity"]),
+    ("result = df.loc[df['Sales'] > 50, ['Region', 'Sales']]", ["Region", "Sales"]),
+    ("fig = viz('bar', df, x='Region', y='Sales')", ["Region", "Sales"]),
+    ("result = df.sort_values('Sales')['Region']", ["Region", "Sales"]),
+    ("result = df.groupby(df['Order Date'].str[:7])['Sales'].sum()", ["Order Date", "Sales"]),
+])
+def test_column_reads_are_projected(code, columns, df):
+    plan = plan_projection(code, df)
+    assert plan is not None
+    assert plan.columns == columns
@@ -0,0 +1,45 @@
+# backend/tests/test_query_engine.py
+import pandas as pd
+import pytest
+
+import core.query_engine as query_engine
+from core.query_engine import DuckDBDataset, dataset_path
+
+pytest.importorskip("duckdb")
+
+
+@pytest.fixture(autouse=True)
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(query_engine, "DATA_DIR", tmp_path)
+    return tmp_path
+
+
+def test_session_paths_do_not_collide(data_dir):
+    paths = {dataset_path(s) for s in ("a.b", "ab", "a/b", "../ab", "ab ")}
+    assert len(paths) == 5
+    assert all(p.parent == data_dir for p in paths)
+    assert dataset_path("a.b") == dataset_path("a.b")
+
+
+def _csv(path, rows):
+    pd.DataFrame({"Region": ["North", "South"] * rows, "Sales": range(2 * rows)}).to_csv(path, index=False)
+    return [(path, "csv")]
+
+
+def test_append_by_another_worker_marks_the_open_dataset_stale(data_dir):
+    path = dataset_path("s1")
+    opened = DuckDBDataset.from_files(_csv(data_dir / "first.csv", 2), path)
+    try:
+        assert opened.is_current()
+        # Another worker's append replaces the file under the open connection
+        DuckDBDataset.from_files(_csv(data_dir / "more.csv", 3), path, append=True).close()
+        assert not opened.is_current()
+        assert opened.num_rows == 4
+    finally:
+        opened.close()
+    reopened = DuckDBDataset(path)
+    try:
+        assert reopened.is_current()
+        assert reopened.num_rows == 10
+    finally:
+        reopened.close()
@@ -0,0 +1,47 @@
+# backend/tests/test_results.py
+import pandas as pd
+import pytest
+
+from core.executor import create_executor
+from utils.output import OutputBuffer
+
+
+@pytest.fixture
+def executor():
+    executor = create_executor("thread")
+    df = pd.DataFrame({"Region": ["North", "South", "North"], "Sales": [1.0, 2.0, 3.0]})
+    executor.run("region_sales = df.groupby('Region')['Sales'].sum().reset_index()", df,
+                 session_id="s1", output=OutputBuffer())
+    return executor, df
+
+
+def _stored(executor):
+    return executor.results.get("s1")["region_sales"]
+
+
+def test_failed_run_leaves_stored_frame_unchanged(executor):
+    executor, df = executor
+    before = _stored(executor).copy()
+    result = executor.run("region_sales.loc[0, 'Sales'] = -1\nregion_sales['x'] = 1\nresult = missing",
+                          df, session_id="s1", output=OutputBuffer())
+    assert not result.ok
+    pd.testing.assert_frame_equal(_stored(executor), before)
+
+
+def test_trial_run_leaves_stored_frame_unchanged(executor):
+    executor, df = executor
+    before = _stored(executor).copy()
+    result = executor.run("region_sales['Sales'] *= 2", df, session_id="s1",
+                          output=OutputBuffer(), commit=False)
+    assert result.ok
+    pd.testing.assert_frame_equal(_stored(executor), before)
+    executor.commit("s1", result)
+    assert _stored(executor)["Sales"].tolist() == [8.0, 4.0]
+
+
+def test_successful_in_place_edit_is_kept(executor):
+    executor, df = executor
+    result = executor.run("region_sales['share'] = region_sales['Sales'] / region_sales['Sales'].sum()",
+                          df, session_id="s1", output=OutputBuffer())
+    assert result.ok
+    assert "share" in _stored(executor).columns
@@ -0,0 +1,91 @@
+# backend/tests/test_scheduler.py
+import asyncio
+import threading
+import time
+
+import pytest
+
+from agents.scheduler import BACKGROUND, INTERACTIVE, LLMScheduler, RateLimited, TokenBucket, parse_duration
+
+
+def test_bucket_waits_for_refill():
+    bucket = TokenBucket(60)  # one unit per second
+    now = bucket.updated
+    bucket.take(60, now)
+    assert bucket.delay(1, now) == pytest.approx(1.0)
+    assert bucket.delay(1, now + 1) == 0.0
+    # A request larger than the bucket waits for a full bucket
+    assert bucket.delay(1000, now + 1) == pytest.approx(59.0)
+
+
+def test_unknown_limit_admits_until_headers_set_one():
+    bucket = TokenBucket(0)
+    now = bucket.updated
+    bucket.take(10**9, now)
+    assert bucket.delay(10**6, now) == 0.0
+    bucket.sync(limit=6000, remaining=100, reset=None, now=now)
+    assert bucket.capacity == 6000
+    assert bucket.delay(1100, now) == pytest.approx(10.0)
+
+
+def test_exhausted_bucket_pauses_until_reset():
+    bucket = TokenBucket(0)
+    now = bucket.updated
+    bucket.sync(limit=None, remaining=0, reset=parse_duration("2m30s"), now=now)
+    assert bucket.delay(1, now) == pytest.approx(150.0)
+
+
+def test_interactive_calls_are_admitted_before_background():
+    scheduler = LLMScheduler(requests_per_minute=1000, tokens_per_minute=0, max_concurrency=1)
+    scheduler.acquire(INTERACTIVE)
+    order = []
+
+    def wait(priority, name):
+        scheduler.acquire(priority)
+        order.append(name)
+        scheduler.release()
+
+    threads = [threading.Thread(target=wait, args=(BACKGROUND, "background"))]
+    threads[0].start()
+    while not scheduler._queue:
+        time.sleep(0.001)
+    threads.append(threading.Thread(target=wait, args=(INTERACTIVE, "interactive")))
+    threads[1].start()
+    while len(scheduler._queue) < 2:
+        time.sleep(0.001)
+    scheduler.release()
+    for thread in threads:
+        thread.join(5)
+    assert order == ["interactive", "background"]
+
+
+def test_rate_limited_call_is_retried():
+    scheduler = LLMScheduler(requests_per_minute=1000, tokens_per_minute=0, backoff_base=0.001, backoff_max=0.01)
+    attempts = []
+
+    async def fn():
+        attempts.append(time.monotonic())
+        if len(attempts) < 3:
+            raise RateLimited(retry_after=0.01, headers={"x-ratelimit-remaining-tokens": "0"})
+        return "ok", 10, {"x-ratelimit-limit-tokens": "5000", "x-ratelimit-remaining-tokens": "4990"}
+
+    assert asyncio.run(scheduler.call(fn, tokens=10)) == "ok"
+    assert len(attempts) == 3
+    assert attempts[1] - attempts[0] >= 0.01  # retry-after honored
+    assert scheduler.in_flight == 0
+    assert scheduler.tokens.capacity == 5000
+
+
+def test_rate_limit_gives_up_after_max_retries():
+    scheduler = LLMScheduler(requests_per_minute=1000, tokens_per_minute=0, max_retries=1,
+                             backoff_base=0.001, backoff_max=0.001)
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        raise RateLimited(retry_after=0)
+
+    with pytest.raises(RateLimited):
+        asyncio.run(scheduler.call(fn))
+    assert len(calls) == 2
+    assert scheduler.in_flight == 0
@@ -0,0 +1,22 @@
+# backend/tests/test_speculation.py
+from agents.agent import SpeculationBudget
+
+
+def test_budget_caps_a_session():
+    budget = SpeculationBudget(max_tokens=1000, window=3600)
+    assert budget.grant("s1", 2, 400, now=0) == 2
+    assert budget.grant("s1", 2, 400, now=0) == 0
+    assert budget.grant("s2", 2, 400, now=0) == 2
+
+
+def test_budget_replenishes_over_the_window():
+    budget = SpeculationBudget(max_tokens=1000, window=100)
+    assert budget.grant("s1", 2, 500, now=0) == 2
+    assert budget.grant("s1", 1, 500, now=10) == 0
+    assert budget.grant("s1", 1, 500, now=50) == 1
+    assert budget.grant("s1", 2, 500, now=200) == 2
+
+
+def test_budget_without_a_session_grants_nothing():
+    budget = SpeculationBudget(max_tokens=1000, window=3600)
+    assert budget.grant(None, 2, 100, now=0) == 0
@@ -0,0 +1,102 @@
+# backend/utils/correlation.py
+"""
+Pairwise-complete Pearson correlation for wide numeric frames.
+
+pairwise_corr() gives the same matrix as DataFrame.corr(): each pair of
+columns uses only the rows where both are present. Instead of a Python-level
+loop over pairs it accumulates, per block of CORR_BLOCK_ROWS rows, the pair
+counts, sums, sums of squares and cross products as matrix products (BLAS).
+Values are centered on the column means first so the final subtraction does
+not lose precision. Blocks are converted from the frame one at a time, so
+memory stays at a few blocks whatever the row count.
+
+heatmap_columns() picks what is worth drawing from a large matrix: the
+columns with the strongest correlations, ordered so that correlated columns
+sit next to each other.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+CORR_BLOCK_ROWS = int(os.getenv("CORR_BLOCK_ROWS", 65536))
+
+
+def pairwise_corr(df: pd.DataFrame, block_rows: int = CORR_BLOCK_ROWS) -> pd.DataFrame:
+    """Correlation matrix of df's columns (all numeric), NaN-aware like df.corr()."""
+    columns = df.columns
+    k = len(columns)
+    means = df.mean(skipna=True).to_numpy(dtype=np.float64)
+    means = np.where(np.isnan(means), 0.0, means)
+    counts = np.zeros((k, k))
+    sums = np.zeros((k, k))      # [i, j]: sum of x_i over rows where i and j are present
+    squares = np.zeros((k, k))   # [i, j]: sum of x_i ** 2 over the same rows
+    products = np.zeros((k, k))  # [i, j]: sum of x_i * x_j over the same rows
+    for start in range(0, len(df), block_rows):
+        block = df.iloc[start:start + block_rows].to_numpy(dtype=np.float64, na_value=np.nan) - means
+        present = ~np.isnan(block)
+        if present.all():
+            counts += len(block)
+            sums += block.sum(axis=0)[:, None]
+            squares += (block * block).sum(axis=0)[:, None]
+            products += block.T @ block
+            continue
+        block = np.where(present, block, 0.0)
+        mask = present.astype(np.float64)
+        counts += mask.T @ mask
+        sums += block.T @ mask
+        squares += (block * block).T @ mask
+        products += block.T @ block
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = products - sums * sums.T / counts
+        var = squares - sums * sums / counts
+        corr = cov / np.sqrt(var * var.T)
+    # Too few shared rows or a constant column leaves the pair undefined, as in pandas
+    undefined = (counts < 2) | (var <= 1e-12 * squares) | (var.T <= 1e-12 * squares.T)
+    corr[undefined] = np.nan
+    np.clip(corr, -1.0, 1.0, out=corr)
+    diagonal = np.arange(k)
+    corr[diagonal, diagonal] = np.where(np.isnan(corr[diagonal, diagonal]), np.nan, 1.0)
+    return pd.DataFrame(corr, index=columns, columns=columns)
+
+
+def strongest_columns(corr: pd.DataFrame, k: int) -> list:
+    """The k columns with the strongest correlation to any other column."""
+    if len(corr.columns) <= k:
+        return list(corr.columns)
+    strength = np.abs(corr.to_numpy(copy=True))
+    np.fill_diagonal(strength, np.nan)
+    strength = np.nan_to_num(strength, nan=0.0)
+    # Strongest single link first; total link strength breaks ties
+    order = np.lexsort((-strength.sum(axis=1), -strength.max(axis=1)))
+    keep = np.sort(order[:k])
+    return [corr.columns[i] for i in keep]
+
+
+def cluster_order(corr: pd.DataFrame) -> list:
+    """
+    Columns in nearest-neighbour order: start from the most connected column
+    and repeatedly step to the unvisited column most correlated with the
+    current one, so blocks of related columns appear together.
+    """
+    k = len(corr.columns)
+    if k <= 2:
+        return list(corr.columns)
+    strength = np.nan_to_num(np.abs(corr.to_numpy(copy=True)), nan=0.0)
+    np.fill_diagonal(strength, -1.0)
+    current = int(strength.sum(axis=1).argmax())
+    visited = np.zeros(k, dtype=bool)
+    order = []
+    for _ in range(k):
+        visited[current] = True
+        order.append(current)
+        candidates = np.where(visited, -np.inf, strength[current])
+        current = int(candidates.argmax())
+    return [corr.columns[i] for i in order]
+
+
+def heatmap_columns(corr: pd.DataFrame, max_columns: int) -> list:
+    """At most max_columns of corr's columns, strongest first, in clustered order."""
+    keep = strongest_columns(corr, max_columns)
+    return cluster_order(corr.loc[keep, keep])
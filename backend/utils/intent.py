@@ -0,0 +1,279 @@
+# backend/utils/intent.py
+"""
+Chart intent classification for chat questions.
+
+Keyword phrases, time-grain phrases and (optionally) dataset column names are
+compiled into one token trie. A question is tokenized with a single regex
+pass and scanned once, taking the longest phrase at each position, so
+keywords only match whole words ("box" no longer fires on "inbox", "line" on
+"deadline", "ring" on "string"). Each chart phrase carries a priority rank
+and the best-ranked match wins, mirroring the specific-before-generic order
+of the old keyword chain. The same pass fills the top-N, time grain, column,
+aggregation ("average", "how many") and direction ("highest", "lowest")
+slots.
+"""
+import re
+import threading
+
+_TOKEN = re.compile(r"[A-Za-z0-9]+")
+
+# Phrase tiers break ties between equally long matches at one position:
+# explicit chart phrases ("line chart") beat column names, which beat bare
+# keywords, so a column named "Share" is not read as a pie request.
+EXPLICIT, COLUMN, BARE = 0, 1, 2
+
+_KINDS = ("chart", "charts", "graph", "graphs", "plot", "plots", "diagram")
+
+
+def _kinds(*stems):
+    return [f"{stem} {kind}" for stem in stems for kind in _KINDS]
+
+
+# (chart type, rank, explicit phrases, bare keywords). Lower rank wins.
+CHART_KEYWORDS = [
+    ("stacked_bar", 0, ["stacked bar", "stacked bars", "stacked column", "stacked columns"], []),
+    ("pie", 1, ["donut", "doughnut", *_kinds("ring", "donut", "doughnut")], []),
+    ("heatmap", 2, ["heatmap", "heatmaps", "heat map", "heat maps", "correlation matrix",
+                    "correlation matrices", "corr matrix"], []),
+    ("box", 3, ["boxplot", "boxplots", "box plot", "box plots", "box and whisker",
+                "box and whiskers", "box whisker"], ["box", "boxes", "whisker", "whiskers",
+                                                     "outlier", "outliers"]),
+    ("histogram", 4, ["histogram", "histograms"], ["hist", "distribution", "distributions",
+                                                   "distributed", "freq", "frequency",
+                                                   "frequencies", "spread of"]),
+    ("scatter", 5, ["scatterplot", "scatter plot", "scatter plots", *_kinds("bubble")],
+     ["scatter", "bubble", "bubbles", "relationship", "relationships", "correlation",
+      "correlations", "correlated", "correlate", "vs", "versus"]),
+    ("area", 6, [*_kinds("area"), "stacked area", "stacked areas", "filled line"], []),
+    ("line", 7, _kinds("line"), ["trend", "trends", "trending", "over time", "time series",
+                                 "timeseries", "timeline", "growth", "grow", "grew"]),
+    ("pie", 8, ["pie", "pies", *_kinds("pie")], ["share", "shares", "composition", "proportion",
+                                                 "proportions", "percentage breakdown", "make up",
+                                                 "makeup"]),
+    ("bar", 9, _kinds("bar", "column"), ["bar", "bars", "compare categories", "rank", "ranking",
+                                         "ranked", "compare", "comparison"]),
+    # A bare "line" is often a noun ("product line", "line item"); weakest signal
+    ("line", 10, [], ["line", "lines"]),
+]
+
+_NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "fifteen": 15, "twenty": 20, "fifty": 50, "hundred": 100,
+}
+# "top 5", "first three"; longer numbers are years ("first 2020 orders"), not counts
+TOP_N_MAX_DIGITS = 3
+_TOP_WORDS = frozenset(("top", "first", "best", "bottom", "worst", "largest", "biggest",
+                        "smallest", "highest", "lowest"))
+
+_PER = ("per", "by", "each", "every")
+
+# (time grain, phrases). A bare period name ("Q1", "March") is a filter, not a grain
+TIME_GRAINS = [
+    ("hour", ["hourly", *[f"{p} hour" for p in _PER]]),
+    ("day", ["daily", "day by day", *[f"{p} day" for p in _PER]]),
+    ("week", ["weekly", *[f"{p} week" for p in _PER]]),
+    ("month", ["monthly", *[f"{p} month" for p in _PER]]),
+    ("quarter", ["quarterly", *[f"{p} quarter" for p in _PER]]),
+    ("year", ["yearly", "annual", "annually", *[f"{p} year" for p in _PER]]),
+]
+# "X over X" phrases set both the grain and a line chart
+_PERIOD_OVER_PERIOD = [
+    ("week", ["week over week"]),
+    ("month", ["month over month"]),
+    ("year", ["year over year", "yoy"]),
+]
+_PERIOD_CHART = ("line", 7)
+
+# (aggregation, phrases); the first one named wins
+AGGREGATIONS = [
+    ("sum", ["total", "totals", "sum", "sums", "summed", "cumulative"]),
+    ("mean", ["average", "averages", "avg", "mean", "means", "typical"]),
+    ("median", ["median", "medians"]),
+    ("count", ["count", "counts", "how many", "number of", "how often"]),
+    ("min", ["min", "minimum", "minimums"]),
+    ("max", ["max", "maximum", "maximums"]),
+    ("std", ["std", "stdev", "standard deviation", "variance", "volatility"]),
+]
+# (direction, phrases): whether the question asks for the largest or smallest values
+DIRECTIONS = [
+    ("desc", ["highest", "most", "top", "best", "largest", "biggest", "greatest", "leading",
+              "leads", "lead"]),
+    ("asc", ["lowest", "least", "bottom", "worst", "smallest", "fewest", "weakest"]),
+]
+
+
+class Intent:
+    """Result of classifying one question."""
+
+    __slots__ = ("chart", "rank", "top_n", "time_grain", "columns", "aggregate", "direction", "words", "rest")
+
+    def __init__(self):
+        self.chart = None
+        self.rank = None
+        self.top_n = None
+        self.time_grain = None
+        self.columns = []
+        self.aggregate = None
+        self.direction = None
+        self.words = []  # the question's lowercased tokens
+        self.rest = []   # tokens no phrase explained, in order
+
+    def prompt_hint(self) -> str | None:
+        """Short human-readable summary of the detected slots for the LLM prompt."""
+        parts = []
+        if self.top_n:
+            parts.append(f"top {self.top_n}")
+        if self.time_grain:
+            parts.append(f"{self.time_grain} grain")
+        if self.columns:
+            parts.append("columns: " + ", ".join(self.columns))
+        return "; ".join(parts) or None
+
+    def __repr__(self):
+        return (f"Intent(chart={self.chart!r}, top_n={self.top_n!r}, "
+                f"time_grain={self.time_grain!r}, columns={self.columns!r}, "
+                f"aggregate={self.aggregate!r}, direction={self.direction!r})")
+
+
+def tokenize(text: str) -> list:
+    """Lowercased word tokens, as the matcher sees them."""
+    return _TOKEN.findall(text.lower())
+
+
+class IntentMatcher:
+    """
+    Token trie over chart phrases, time-grain phrases and the given column
+    names. Each terminal node stores (tier, action); the scan takes the longest
+    phrase at every position and the lowest tier among equally long ones.
+    """
+
+    _END = ""  # trie key holding the terminal payload; never a token
+
+    def __init__(self, columns=()):
+        self._root = {}
+        for grain, phrases in _PERIOD_OVER_PERIOD:
+            for phrase in phrases:
+                self._add(phrase, EXPLICIT, ("grain", grain, _PERIOD_CHART))
+        for grain, phrases in TIME_GRAINS:
+            for phrase in phrases:
+                self._add(phrase, EXPLICIT, ("grain", grain, None))
+        for aggregate, phrases in AGGREGATIONS:
+            for phrase in phrases:
+                self._add(phrase, BARE, ("aggregate", aggregate, None))
+        for direction, phrases in DIRECTIONS:
+            for phrase in phrases:
+                self._add(phrase, BARE, ("direction", direction, None))
+        for chart, rank, explicit, bare in CHART_KEYWORDS:
+            for phrase in explicit:
+                self._add(phrase, EXPLICIT, ("chart", chart, rank))
+            for phrase in bare:
+                self._add(phrase, BARE, ("chart", chart, rank))
+        for col in columns:
+            # "product name" matches a "Product_Name" column and vice versa
+            self._add(str(col), COLUMN, ("column", str(col), None))
+
+    def _add(self, phrase: str, tier: int, action):
+        words = tokenize(phrase)
+        if not words:
+            return
+        node = self._root
+        for word in words:
+            node = node.setdefault(word, {})
+        current = node.get(self._END)
+        if current is None or tier < current[0]:
+            node[self._END] = (tier, action)
+
+    def classify(self, text: str | None) -> Intent:
+        intent = Intent()
+        if not text:
+            return intent
+        words = intent.words = _TOKEN.findall(text.lower())
+        rest = intent.rest
+        root, end = self._root, self._END
+        i, n = 0, len(words)
+        while i < n:
+            word = words[i]
+            if word in _TOP_WORDS and i + 1 < n and intent.top_n is None:
+                nxt = words[i + 1]
+                if nxt.isdigit():
+                    if len(nxt) <= TOP_N_MAX_DIGITS:
+                        intent.top_n = int(nxt)
+                else:
+                    intent.top_n = _NUMBER_WORDS.get(nxt)
+
+            node = root.get(word)
+            if node is None:
+                # Most words start no phrase; skip them without the longest-match walk
+                rest.append(word)
+                i += 1
+                continue
+            # Longest phrase starting at i
+            best, best_len, j = node.get(end), 1, i + 1
+            while j < n:
+                node = node.get(words[j])
+                if node is None:
+                    break
+                j += 1
+                if end in node:
+                    best, best_len = node[end], j - i
+            if best is None:
+                rest.append(word)
+                i += 1
+                continue
+
+            slot, value, rank = best[1]
+            if slot == "chart":
+                if intent.rank is None or rank < intent.rank:
+                    intent.chart, intent.rank = value, rank
+            elif slot == "column":
+                if value not in intent.columns:
+                    intent.columns.append(value)
+            elif slot == "aggregate":
+                if intent.aggregate is None:
+                    intent.aggregate = value
+            elif slot == "direction":
+                if intent.direction is None:
+                    intent.direction = value
+            else:
+                if intent.time_grain is None:
+                    intent.time_grain = value
+                if rank is not None and (intent.rank is None or rank[1] < intent.rank):
+                    intent.chart, intent.rank = rank
+            i += best_len
+        return intent
+
+
+_MATCHERS_MAX = 64
+# id(columns) -> (columns, matcher) and tuple(names) -> (names, matcher), oldest first
+_matchers: dict = {}
+_matchers_lock = threading.Lock()
+
+
+def get_matcher(columns=()) -> IntentMatcher:
+    """
+    Compiled matcher for a dataset's columns. The usual argument, a
+    DataFrame's immutable Index, is looked up by identity, so a call neither
+    copies nor hashes the column names; the entry holds the object, so its id
+    cannot be reused while cached. Other column collections (and an Index seen
+    for the first time) are looked up by their names. Hits take no lock; the
+    oldest entries are evicted first.
+    """
+    entry = _matchers.get(id(columns))
+    if entry is not None and entry[0] is columns:
+        return entry[1]
+    names = tuple(columns)
+    with _matchers_lock:
+        entry = _matchers.get(names)
+    matcher = entry[1] if entry is not None else IntentMatcher(names)
+    with _matchers_lock:
+        _matchers[names] = (names, matcher)
+        if not isinstance(columns, list):  # a list may change under the same id
+            _matchers[id(columns)] = (columns, matcher)
+        while len(_matchers) > _MATCHERS_MAX:
+            del _matchers[next(iter(_matchers))]
+    return matcher
+
+
+def classify_intent(text: str | None, columns=()) -> Intent:
+    """Classify a question into chart type plus top-N, time grain, column, aggregation and direction slots."""
+    return get_matcher(columns).classify(text)
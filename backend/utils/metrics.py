@@ -0,0 +1,374 @@
+# backend/utils/metrics.py
+"""
+Request tracing and process-wide metrics.
+
+Code marks pipeline stages with `with stage("llm"):`. Each stage is recorded
+on the current request's Trace (rendered as a Server-Timing header) and in a
+Prometheus histogram served by /metrics. LLM token usage is counted the same
+way. A request can opt into cProfile or tracemalloc via the X-Profile header
+when ENABLE_PROFILING is set.
+"""
+import contextvars
+import cProfile
+import functools
+import io
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Profiling is off unless explicitly enabled; then X-Profile: cpu|mem profiles
+# one request and PROFILE_SAMPLE_RATE profiles a random fraction (cpu).
+ENABLE_PROFILING = os.getenv("ENABLE_PROFILING", "false").lower() in ("1", "true", "yes")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", "profiles"))
+PROFILE_TOP_N = 25
+
+# Seconds; covers sub-millisecond stages up to slow LLM calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names, values) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class Counter:
+    """Monotonic counter with fixed label names."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values: dict = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f"{self.name}_total{_label_text(self.labels, key)} {value}"
+
+
+class Gauge:
+    """Value that goes up and down, with fixed label names."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values: dict = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_label_text(self.labels, key)} {value}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus exposition format."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        names = self.labels + ("le",)
+        for key, series in items:
+            for bound, count in zip(self.buckets, series):
+                yield f"{self.name}_bucket{_label_text(names, key + (repr(bound),))} {count}"
+            yield f"{self.name}_bucket{_label_text(names, key + ('+Inf',))} {series[-1]}"
+            yield f"{self.name}_sum{_label_text(self.labels, key)} {series[-2]}"
+            yield f"{self.name}_count{_label_text(self.labels, key)} {series[-1]}"
+
+
+_registry: list = []
+
+
+def counter(name: str, help_text: str, labels=()) -> Counter:
+    metric = Counter(name, help_text, labels)
+    _registry.append(metric)
+    return metric
+
+
+def gauge(name: str, help_text: str, labels=()) -> Gauge:
+    metric = Gauge(name, help_text, labels)
+    _registry.append(metric)
+    return metric
+
+
+def histogram(name: str, help_text: str, labels=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+    metric = Histogram(name, help_text, labels, buckets)
+    _registry.append(metric)
+    return metric
+
+
+def render_metrics() -> str:
+    """All registered metrics in the Prometheus text format (version 0.0.4)."""
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_SECONDS = histogram("insightai_request_duration_seconds",
+                            "HTTP request latency", ("method", "route", "status"))
+STAGE_SECONDS = histogram("insightai_stage_duration_seconds",
+                          "Latency of one pipeline stage within a request", ("stage",))
+LLM_TOKENS = counter("insightai_llm_tokens", "LLM tokens used", ("model", "kind"))
+LLM_TOKENS_PER_CALL = histogram("insightai_llm_tokens_per_call", "LLM tokens per completion",
+                                ("kind",), buckets=(64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384))
+STAGE_ERRORS = counter("insightai_stage_errors", "Stages that raised", ("stage",))
+
+
+class Trace:
+    """Stage timings and token usage for one request."""
+
+    __slots__ = ("start", "stages", "tokens")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages: dict = {}   # stage -> seconds, summed when a stage repeats
+        self.tokens: dict = {}   # "prompt"/"completion" -> count
+
+    def add(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def timings(self, total: float | None = None) -> dict:
+        """Stage durations in milliseconds, for responses that cannot carry headers."""
+        timings = {name: round(seconds * 1000, 1) for name, seconds in self.stages.items()}
+        if total is not None:
+            timings["total"] = round(total * 1000, 1)
+        return timings
+
+    def server_timing(self, total: float | None = None) -> str:
+        """Server-Timing header value, durations in milliseconds."""
+        parts = []
+        for name, seconds in self.stages.items():
+            entry = f"{name};dur={seconds * 1000:.1f}"
+            if name == "llm" and self.tokens:
+                usage = "/".join(str(self.tokens.get(k, 0)) for k in ("prompt", "completion"))
+                entry += f';desc="tokens {usage}"'
+            parts.append(entry)
+        if total is not None:
+            parts.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("insightai_trace", default=None)
+
+
+def current_trace() -> Trace | None:
+    return _current_trace.get()
+
+
+def start_trace() -> Trace:
+    trace = Trace()
+    _current_trace.set(trace)
+    return trace
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block as pipeline stage `name` on the current trace and in /metrics."""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=name)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(name, elapsed)
+
+
+def record_tokens(model: str, usage) -> None:
+    """Count prompt/completion tokens from an OpenAI-style usage object."""
+    if usage is None:
+        return
+    trace = _current_trace.get()
+    for kind in ("prompt", "completion"):
+        count = getattr(usage, f"{kind}_tokens", None)
+        if count is None:
+            continue
+        LLM_TOKENS.inc(count, model=model, kind=kind)
+        LLM_TOKENS_PER_CALL.observe(count, kind=kind)
+        if trace is not None:
+            trace.tokens[kind] = trace.tokens.get(kind, 0) + count
+
+
+_profile_lock = threading.Lock()
+_current_profiler: contextvars.ContextVar = contextvars.ContextVar("insightai_profiler", default=None)
+
+
+def profile_mode(header_value: str | None) -> str | None:
+    """'cpu', 'mem' or None for a request, from its X-Profile header and the sample rate."""
+    if not ENABLE_PROFILING:
+        return None
+    if header_value:
+        mode = header_value.strip().lower()
+        return mode if mode in ("cpu", "mem") else None
+    if PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+        return "cpu"
+    return None
+
+
+class RequestProfiler:
+    """
+    cProfile ("cpu") or tracemalloc ("mem") around one request. Only one request
+    is profiled at a time. cProfile sees the thread that enabled it: the event
+    loop, so concurrent requests on the same worker can appear in the output,
+    plus any worker thread started through profile_thread(), whose stats are
+    merged into the report.
+    """
+
+    def __init__(self, mode: str, label: str):
+        self.mode = mode
+        self.label = label
+        self.path = None
+        self._profiler = None
+        self._threads: list = []
+        self._threads_lock = threading.Lock()
+        self._owns_tracemalloc = False
+        self._active = False
+
+    def __enter__(self):
+        if not _profile_lock.acquire(blocking=False):
+            logger.info("Profiler busy; not profiling %s", self.label)
+            return self
+        self._active = True
+        stamp = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self.label}"
+        if self.mode == "cpu":
+            self.path = PROFILE_DIR / f"{stamp}.prof"
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+            _current_profiler.set(self)
+        else:
+            self.path = PROFILE_DIR / f"{stamp}.mem.txt"
+            self._owns_tracemalloc = not tracemalloc.is_tracing()
+            if self._owns_tracemalloc:
+                tracemalloc.start(10)
+            tracemalloc.reset_peak()
+            self._snapshot = tracemalloc.take_snapshot()
+        return self
+
+    def add_thread_profile(self, profile: cProfile.Profile) -> None:
+        """Merge a worker thread's profile; dropped if the report was already written."""
+        with self._threads_lock:
+            if self._active:
+                self._threads.append(profile)
+
+    def __exit__(self, *exc):
+        if not self._active:
+            return False
+        try:
+            PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+            if self.mode == "cpu":
+                self._profiler.disable()
+                with self._threads_lock:
+                    self._active = False
+                    threads, self._threads = self._threads, []
+                stats = pstats.Stats(self._profiler, stream=io.StringIO())
+                for profile in threads:
+                    stats.add(profile)
+                stats.dump_stats(self.path)
+                out = io.StringIO()
+                stats.stream = out
+                stats.sort_stats("cumulative").print_stats(PROFILE_TOP_N)
+                logger.info("cProfile for %s (%s, %d worker thread(s)):\n%s",
+                            self.label, self.path, len(threads), out.getvalue())
+            else:
+                _, peak = tracemalloc.get_traced_memory()
+                diff = tracemalloc.take_snapshot().compare_to(self._snapshot, "lineno")
+                if self._owns_tracemalloc:
+                    tracemalloc.stop()
+                lines = [f"peak traced memory: {peak / 1024 / 1024:.1f} MiB"]
+                lines += [str(stat) for stat in diff[:PROFILE_TOP_N]]
+                self.path.write_text("\n".join(lines) + "\n")
+                logger.info("tracemalloc for %s (%s):\n%s", self.label, self.path, "\n".join(lines))
+        except Exception as e:
+            logger.warning("Failed to write profile for %s: %s", self.label, e)
+        finally:
+            self._active = False
+            _profile_lock.release()
+        return False
+
+
+def profile_thread(fn):
+    """
+    fn, wrapped to run under its own cProfile when the current request is being
+    CPU-profiled; pass it to asyncio.to_thread (which copies the request's
+    context) so the work done off the event loop shows up in the report.
+    """
+    profiler = _current_profiler.get()
+    if profiler is None or profiler.mode != "cpu" or not profiler._active:
+        return fn
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        worker = cProfile.Profile()
+        try:
+            worker.enable()
+        except ValueError:
+            # Python 3.12+: one cProfile is active process-wide and already sees this thread
+            return fn(*args, **kwargs)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            worker.disable()
+            profiler.add_thread_profile(worker)
+    return wrapper
@@ -0,0 +1,114 @@
+# backend/utils/output.py
+"""
+Per-execution output capture for generated code.
+
+Each execution gets an OutputBuffer. Its print() is injected into the exec
+namespace, and while capture_output() is active, anything written to
+sys.stdout from the same context (df.info(), third-party prints) is routed to
+it too. sys.stdout is never swapped per request, so concurrent executions on
+other threads or tasks cannot see each other's output. Buffers stop growing at
+a byte cap and report what was dropped, and an optional callback receives
+each chunk as it is written, for streaming.
+"""
+import builtins
+import contextvars
+import os
+import sys
+import threading
+from contextlib import contextmanager
+
+# Bytes of printed output kept per execution
+EXEC_OUTPUT_MAX_BYTES = int(os.getenv("EXEC_OUTPUT_MAX_BYTES", 64 * 1024))
+
+_current_output: contextvars.ContextVar = contextvars.ContextVar("exec_output", default=None)
+
+
+class OutputBuffer:
+    """Bounded text sink for one execution."""
+
+    def __init__(self, max_bytes: int = EXEC_OUTPUT_MAX_BYTES, on_write=None):
+        self.max_bytes = max_bytes
+        self.on_write = on_write
+        self.size = 0
+        self.dropped = 0
+        self._parts = []
+        self._lock = threading.Lock()
+
+    @property
+    def truncated(self) -> bool:
+        return self.dropped > 0
+
+    def write(self, text: str) -> int:
+        if not text:
+            return 0
+        data = text.encode("utf-8", "replace")
+        with self._lock:
+            room = self.max_bytes - self.size
+            if len(data) <= room:
+                kept = text
+            else:
+                # Cut on a character boundary within the remaining room
+                kept = data[:max(room, 0)].decode("utf-8", "ignore")
+                self.dropped += len(data) - len(kept.encode("utf-8"))
+            if kept:
+                self._parts.append(kept)
+                self.size += len(kept.encode("utf-8"))
+        if self.on_write is not None and kept:
+            self.on_write(kept)
+        return len(text)
+
+    def print(self, *args, sep=" ", end="\n", file=None, flush=False):
+        """Drop-in for print() that writes to this buffer."""
+        if file is not None and file is not sys.stdout:
+            return builtins.print(*args, sep=sep, end=end, file=file, flush=flush)
+        sep = " " if sep is None else sep
+        end = "\n" if end is None else end
+        self.write(sep.join(str(a) for a in args) + end)
+
+    def getvalue(self, marker: bool = True) -> str:
+        """Everything written, plus a truncation marker if output was dropped."""
+        with self._lock:
+            text = "".join(self._parts)
+        if marker and self.dropped:
+            text += f"\n... [output truncated: {self.dropped} more bytes]\n"
+        return text
+
+
+class _ContextStdout:
+    """sys.stdout replacement that writes to the current context's OutputBuffer, if any."""
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def write(self, text):
+        buffer = _current_output.get()
+        if buffer is not None:
+            return buffer.write(text)
+        return self._stream.write(text)
+
+    def flush(self):
+        if _current_output.get() is None:
+            self._stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+_install_lock = threading.Lock()
+
+
+def _install_stdout_router():
+    with _install_lock:
+        if not isinstance(sys.stdout, _ContextStdout):
+            sys.stdout = _ContextStdout(sys.stdout)
+
+
+@contextmanager
+def capture_output(buffer: OutputBuffer):
+    """Route this context's stdout writes to buffer for the duration of the block."""
+    _install_stdout_router()
+    token = _current_output.set(buffer)
+    try:
+        yield buffer
+    finally:
+        _current_output.reset(token)
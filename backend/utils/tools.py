@@ -1,40 +1,231 @@
-import re
+import os
+import threading
+import weakref
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-import sys
-from io import StringIO
+
+from utils.correlation import heatmap_columns, pairwise_corr
+
+# Memory budget (bytes) for cached coerced columns and aggregated chart frames
+AGG_CACHE_MAX_BYTES = int(os.getenv("AGG_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+# Scatter and line charts with more rows than this are downsampled before plotting
+VIZ_MAX_POINTS = int(os.getenv("VIZ_MAX_POINTS", 5000))
+# Correlation heatmaps show at most this many columns (the most strongly correlated)
+VIZ_HEATMAP_MAX_COLUMNS = int(os.getenv("VIZ_HEATMAP_MAX_COLUMNS", 40))
+# Cell values are printed on heatmaps up to this many columns
+VIZ_HEATMAP_ANNOTATE_MAX = int(os.getenv("VIZ_HEATMAP_ANNOTATE_MAX", 15))
+
+# id(frame) -> (weakref to frame, dataset version, {column: token at registration})
+_registered_frames: dict[int, tuple] = {}
+_registry_lock = threading.Lock()
+
+
+def _column_token(s: pd.Series):
+    """
+    Cheap identity of a column's backing data. Reassigning the column swaps the
+    buffer, so a changed token means the column no longer matches the dataset.
+    """
+    if isinstance(s.dtype, np.dtype):
+        values = s.to_numpy(copy=False)
+        return (str(s.dtype), len(s), values.__array_interface__["data"][0])
+    return (str(s.dtype), len(s), id(s.array))
+
+
+def register_dataset(df: pd.DataFrame, version: str) -> None:
+    """
+    Mark df as an unmodified copy of dataset `version` so the chart helpers can
+    reuse coerced columns and aggregations computed for it.
+    """
+    if df is None:
+        return
+    key = id(df)
+    tokens = {c: _column_token(df[c]) for c in df.columns if isinstance(c, str)}
+
+    def _forget(_ref, key=key):
+        with _registry_lock:
+            entry = _registered_frames.get(key)
+            if entry is not None and entry[0] is _ref:
+                del _registered_frames[key]
+
+    ref = weakref.ref(df, _forget)
+    with _registry_lock:
+        _registered_frames[key] = (ref, version, tokens)
+
+
+def dataset_version(df: pd.DataFrame) -> str | None:
+    """Return the dataset version df was registered under, if any."""
+    entry = _registered_frames.get(id(df))
+    if entry is None or entry[0]() is not df:
+        return None
+    return entry[1]
+
+
+def _cache_version(df: pd.DataFrame, cols) -> str | None:
+    """
+    Dataset version usable as a cache key for `cols`, or None when df is not a
+    registered dataset or any of the columns was modified after registration.
+    """
+    entry = _registered_frames.get(id(df))
+    if entry is None or entry[0]() is not df:
+        return None
+    tokens = entry[2]
+    for c in cols:
+        if c not in tokens or c not in df.columns or _column_token(df[c]) != tokens[c]:
+            return None
+    return entry[1]
+
+
+def _nbytes(value) -> int:
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(index=True, deep=True)
+        return int(usage.sum()) if isinstance(usage, pd.Series) else int(usage)
+    return 64
+
+
+class _AggregationCache:
+    """
+    Thread-safe LRU mapping (dataset version, ...) keys to coerced columns and
+    aggregated frames, evicting least recently used entries past max_bytes.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict = OrderedDict()
+        self._sizes: dict = {}
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, value):
+        size = _nbytes(value)
+        if size > self.max_bytes:
+            return value
+        with self._lock:
+            if key in self._entries:
+                self._total -= self._sizes.pop(key)
+                del self._entries[key]
+            self._entries[key] = value
+            self._sizes[key] = size
+            self._total += size
+            while self._total > self.max_bytes and self._entries:
+                old_key, _ = self._entries.popitem(last=False)
+                self._total -= self._sizes.pop(old_key)
+        return value
+
+    def drop_version(self, version: str):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == version]:
+                del self._entries[key]
+                self._total -= self._sizes.pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._total = 0
+
+
+_agg_cache = _AggregationCache(AGG_CACHE_MAX_BYTES)
+
+
+def clear_aggregation_cache(version: str | None = None):
+    """Drop cached aggregations for one dataset version, or everything."""
+    if version is None:
+        _agg_cache.clear()
+    else:
+        _agg_cache.drop_version(version)
+
+
+def _coerced_column(df: pd.DataFrame, col: str, kind: str, version: str | None) -> pd.Series:
+    """pd.to_datetime / pd.to_numeric of a single column, cached once per dataset."""
+    key = (version, "coerce", kind, col)
+    if version is not None:
+        cached = _agg_cache.get(key)
+        if cached is not None:
+            return cached
+    if kind == "datetime":
+        s = pd.to_datetime(df[col], errors="coerce")
+    else:
+        s = pd.to_numeric(df[col], errors="coerce")
+    if version is not None:
+        _agg_cache.put(key, s)
+    return s
+
+
+def correlation_matrix(df: pd.DataFrame, columns=None) -> pd.DataFrame:
+    """
+    Pairwise-complete correlation of df's numeric columns (or `columns`),
+    computed once per registered dataset version and cached.
+    """
+    if columns is None:
+        columns = df.select_dtypes(include=[np.number]).columns
+    columns = list(columns)
+    version = _cache_version(df, columns)
+    key = (version, "corr", tuple(columns))
+    if version is not None:
+        cached = _agg_cache.get(key)
+        if cached is not None:
+            return cached
+    corr = pairwise_corr(df[columns])
+    if version is not None:
+        _agg_cache.put(key, corr)
+    return corr
+
+
+def _timeseries_freq(dates: pd.Series) -> str:
+    # Decide frequency by span and size
+    span_days = (dates.max() - dates.min()).days if len(dates) else 0
+    if span_days >= 365:
+        return "MS"  # monthly start for long ranges
+    if span_days >= 120:
+        return "W"   # weekly
+    # If many rows in a short span, still aggregate daily
+    return "D"
 
 def _maybe_aggregate_timeseries(df: pd.DataFrame, x: str, y: str | None, color: str | None):
     """
     If x is datetime-like and y is numeric, sort by date and aggregate y by a sensible
-    frequency to avoid plotting raw transactions.
+    frequency to avoid plotting raw transactions. Only x, y and color are read, and
+    results for registered datasets are cached by (version, x, y, color, freq).
     """
     if x not in df.columns or not y or y not in df.columns:
         return df
+    if not (color and isinstance(color, str) and color in df.columns and color not in (x, y)):
+        color = None
 
-    df2 = df.copy()
-    # Coerce types
-    df2[x] = pd.to_datetime(df2[x], errors="coerce")
-    df2[y] = pd.to_numeric(df2[y], errors="coerce")
-    df2 = df2.dropna(subset=[x, y])
+    cols = [x, y] + ([color] if color else [])
+    version = _cache_version(df, cols)
+    if version is not None:
+        freq = _agg_cache.get((version, "freq", x, y))
+        cached = _agg_cache.get((version, "timeseries", x, y, color, freq)) if freq else None
+        if cached is not None:
+            return cached
+
+    # Coerce types on the needed columns only
+    data = {x: _coerced_column(df, x, "datetime", version),
+            y: _coerced_column(df, y, "numeric", version)}
+    if color:
+        data[color] = df[color]
+    df2 = pd.DataFrame(data, index=df.index).dropna(subset=[x, y])
 
     if not pd.api.types.is_datetime64_any_dtype(df2[x]):
         # Sort by x if not datetime, still helps
         return df2.sort_values(by=x)
 
-    # Decide frequency by span and size
-    span_days = (df2[x].max() - df2[x].min()).days if len(df2) else 0
-    if span_days >= 365:
-        freq = "MS"  # monthly start for long ranges
-    elif span_days >= 120:
-        freq = "W"   # weekly
-    else:
-        # If many rows in a short span, still aggregate daily
-        freq = "D"
+    freq = _timeseries_freq(df2[x])
+    key = (version, "timeseries", x, y, color, freq)
+    if version is not None:
+        _agg_cache.put((version, "freq", x, y), freq)
 
     group_keys = [pd.Grouper(key=x, freq=freq)]
-    if color and isinstance(color, str) and color in df2.columns:
+    if color:
         group_keys.append(color)
 
     agg = (
@@ -43,6 +234,8 @@ def _maybe_aggregate_timeseries(df: pd.DataFrame, x: str, y: str | None, color:
         .reset_index()
         .sort_values(by=x)
     )
+    if version is not None:
+        _agg_cache.put(key, agg)
     return agg
 
 def _maybe_aggregate_categorical(df: pd.DataFrame, x: str | None, y: str | None):
@@ -51,19 +244,44 @@ def _maybe_aggregate_categorical(df: pd.DataFrame, x: str | None, y: str | None)
     """
     if not x or not y or x not in df.columns or y not in df.columns:
         return df
+
+    version = _cache_version(df, [x, y])
+    key = (version, "categorical", x, y)
+    if version is not None:
+        cached = _agg_cache.get(key)
+        if cached is not None:
+            # An empty tuple records "no aggregation needed" for this pair
+            return df if isinstance(cached, tuple) else cached
+
     # Treat as categorical if high duplication
     unique_x = df[x].nunique(dropna=True)
-    if unique_x == 0:
-        return df
     # Heuristic: if rows > unique_x * 5, aggregate
-    if len(df) > unique_x * 5:
-        try:
-            return (df.groupby(x, as_index=False)[y]
-                      .sum()
-                      .sort_values(by=y, ascending=False))
-        except Exception:
-            return df
-    return df
+    if unique_x == 0 or len(df) <= unique_x * 5:
+        if version is not None:
+            _agg_cache.put(key, ())
+        return df
+    try:
+        agg = (df[[x, y]].groupby(x, as_index=False)[y]
+                 .sum()
+                 .sort_values(by=y, ascending=False))
+    except Exception:
+        return df
+    if version is not None:
+        _agg_cache.put(key, agg)
+    return agg
+
+def _downsample(df: pd.DataFrame, max_points: int = VIZ_MAX_POINTS, ordered: bool = False) -> pd.DataFrame:
+    """
+    At most max_points rows of df. Ordered data (lines) keeps evenly spaced
+    rows, including the first and last; otherwise a fixed-seed random sample,
+    so the same data always gives the same chart.
+    """
+    if max_points <= 0 or len(df) <= max_points:
+        return df
+    if ordered:
+        positions = np.linspace(0, len(df) - 1, max_points).round().astype(np.int64)
+        return df.iloc[np.unique(positions)]
+    return df.sample(n=max_points, random_state=0).sort_index()
 
 def viz(chart_type: str,
         df: pd.DataFrame,
@@ -79,11 +297,17 @@ def viz(chart_type: str,
         trendline: str | None = None,
         facet_col: str | None = None,
         facet_row: str | None = None,
-        text: str | None = None):
+        text: str | None = None,
+        **kwargs):
     """
     Create a Plotly figure by chart_type. Minimal, safe wrapper around plotly.express.
     Supported chart_type: bar, stacked_bar, line, area, pie, scatter, histogram, box, heatmap.
+    Bar and line data is aggregated first, scatter and line data is downsampled
+    to VIZ_MAX_POINTS, and other keyword arguments (labels, hover_data, ...)
+    are passed through to plotly.express.
     """
+    import plotly.express as px  # deferred: plotly is only needed once a chart is drawn
+
     ct = (chart_type or "").lower().strip()
 
     if ct in ("pie", "donut", "doughnut"):
@@ -109,7 +333,7 @@ def viz(chart_type: str,
                 df2 = df
         else:
             df2 = df
-        fig = px.pie(df2, values=values, names=names, title=title)
+        fig = px.pie(df2, values=values, names=names, title=title, **kwargs)
         if ct in ("donut", "doughnut"):
             fig.update_traces(hole=0.4)
         return fig
@@ -117,7 +341,7 @@ def viz(chart_type: str,
     if ct in ("bar", "stacked_bar"):
         df2 = _maybe_aggregate_categorical(df, x, y)
         fig = px.bar(df2, x=x, y=y, color=color, title=title,
-                     facet_col=facet_col, facet_row=facet_row, text=text)
+                     facet_col=facet_col, facet_row=facet_row, text=text, **kwargs)
         if ct == "stacked_bar":
             fig.update_layout(barmode="stack")
         if orientation in ("h", "horizontal"):
@@ -127,114 +351,73 @@ def viz(chart_type: str,
     if ct in ("line", "area"):
         # NEW: sort and aggregate time series to avoid zig-zags
         df_line = _maybe_aggregate_timeseries(df, x, y, color) if x else df
-        fig = px.line(df_line, x=x, y=y, color=color, title=title, facet_col=facet_col, facet_row=facet_row)
+        if not color:
+            df_line = _downsample(df_line, ordered=True)
+        fig = px.line(df_line, x=x, y=y, color=color, title=title, facet_col=facet_col, facet_row=facet_row,
+                      **kwargs)
         if ct == "area":
             fig.update_traces(fill="tozeroy")
         return fig
 
     if ct in ("scatter", "bubble"):
-        fig = px.scatter(df, x=x, y=y, color=color, title=title, trendline=trendline, facet_col=facet_col, facet_row=facet_row)
+        fig = px.scatter(_downsample(df), x=x, y=y, color=color, title=title, trendline=trendline,
+                         facet_col=facet_col, facet_row=facet_row, **kwargs)
         return fig
 
     if ct in ("hist", "histogram"):
-        fig = px.histogram(df, x=x, y=y, color=color, nbins=nbins, title=title, marginal=marginal, facet_col=facet_col, facet_row=facet_row)
+        fig = px.histogram(df, x=x, y=y, color=color, nbins=nbins, title=title, marginal=marginal, facet_col=facet_col, facet_row=facet_row,
+                           **kwargs)
         return fig
 
     if ct in ("box", "boxplot"):
-        fig = px.box(df, x=x, y=y, color=color, title=title, facet_col=facet_col, facet_row=facet_row)
+        fig = px.box(df, x=x, y=y, color=color, title=title, facet_col=facet_col, facet_row=facet_row, **kwargs)
         return fig
 
     if ct in ("heatmap", "heat_map", "corr", "correlation"):
         # Correlation heatmap of numeric columns
-        num_cols = df.select_dtypes(include=["number"])
-        if num_cols.shape[1] >= 2:
-            corr = num_cols.corr()
-            fig = px.imshow(corr, text_auto=True, title=title or "Correlation heatmap", color_continuous_scale="RdBu", zmin=-1, zmax=1)
+        corr = correlation_matrix(df)
+        if corr.shape[1] >= 2:
+            # Wide frames: only the strongest columns, clustered, and numbers only when they fit
+            cols = heatmap_columns(corr, VIZ_HEATMAP_MAX_COLUMNS)
+            corr = corr.loc[cols, cols].round(3)
+            text_auto = ".2f" if len(cols) <= VIZ_HEATMAP_ANNOTATE_MAX else False
+            fig = px.imshow(corr, text_auto=text_auto, title=title or "Correlation heatmap", color_continuous_scale="RdBu", zmin=-1, zmax=1)
             return fig
         else:
             # Fallback: histogram if not enough numeric columns
-            return px.histogram(df, x=x or num_cols.columns[0] if len(num_cols.columns) else None, title=title or "Histogram")
+            return px.histogram(df, x=x or corr.columns[0] if len(corr.columns) else None, title=title or "Histogram")
 
     # Default fallback
-    return px.scatter(df, x=x, y=y, color=color, title=title or "Scatter")
+    return px.scatter(_downsample(df), x=x, y=y, color=color, title=title or "Scatter", **kwargs)
 
-def run_user_code(code, df, local_vars=None):
+def run_user_code(code, df, local_vars=None, output=None):
     """
-    Safely execute user code with restricted globals and proper error handling.
+    Execute user code with restricted builtins (core.executor's restricted backend).
     
     Args:
         code (str): Python code to execute
         df (pd.DataFrame): DataFrame to make available in the execution context
         local_vars (dict): Dictionary of local variables to maintain context
+        output (OutputBuffer): Receives printed output (a fresh buffer if omitted)
     
     Returns:
-        dict or any: Result of code execution or error information
+        dict: local_vars updated with the variables the code defined, `result`
+        and `fig` (as a dict), or {"error": ...}
     """
-    # Remove import statements for safety
-    code = re.sub(r'^\s*import\s+[^\n]+', '', code, flags=re.MULTILINE)
-    code = re.sub(r'^\s*from\s+[^\n]+import\s+[^\n]+', '', code, flags=re.MULTILINE)
-    
-    # Create safe execution environment
-    safe_globals = {
-        "__builtins__": {
-            # Allow only safe built-ins
-            "len": len,
-            "str": str,
-            "int": int,
-            "float": float,
-            "bool": bool,
-            "list": list,
-            "dict": dict,
-            "tuple": tuple,
-            "set": set,
-            "min": min,
-            "max": max,
-            "sum": sum,
-            "abs": abs,
-            "round": round,
-            "sorted": sorted,
-            "enumerate": enumerate,
-            "zip": zip,
-            "range": range,
-        },
-        "pd": pd,
-        "df": df,
-        "px": px,
-        "go": go,
-        "viz": viz,  # NEW: convenience chart builder
-    }
-    
-    # Initialize or update local variables
-    local_vars = local_vars or {}
-    safe_globals.update(local_vars)  # Add local vars to globals
-    
-    # Capture stdout for print statements
-    old_stdout = sys.stdout
-    sys.stdout = captured_output = StringIO()
-    
-    try:
-        # print(f"Executing: {code}")  # Debug print
-        
-        # Try to evaluate as expression first
-        try:
-            result = eval(code, safe_globals, local_vars)
-            if result is not None:
-                local_vars['result'] = result
-                #print(f"Eval result: {type(result)} - {result}")  # Debug print
-                return local_vars
-        except SyntaxError:
-            # If eval fails, try exec
-            # print(f"Eval failed, trying exec...")  # Debug print
-            exec(code, safe_globals, local_vars)
-            # print(f"Local vars after exec: {list(local_vars.keys())}")  # Debug print
-            return local_vars
-            
-    except Exception as e:
-        print(f"Execution error: {str(e)}")  # Debug print
-        return {"error": f"Execution error: {str(e)}"}
-    finally:
-        # Restore stdout
-        sys.stdout = old_stdout
+    from core.executor import RestrictedExecutor
+    from core.results import ResultStore
+
+    local_vars = local_vars if local_vars is not None else {}
+    executor = RestrictedExecutor(ResultStore(max_sessions=1))
+    executor.results.update("local", local_vars)
+    execution = executor.run(code, df, session_id="local", output=output)
+    if not execution.ok:
+        return {"error": f"Execution error: {execution.error}"}
+    local_vars.update(executor.results.get("local"))
+    local_vars["result"] = execution.result
+    if execution.figure is not None:
+        local_vars["fig"] = execution.figure
+    return local_vars
 
 def _format_result(result, captured_output):
     """
@@ -242,7 +425,7 @@ def _format_result(result, captured_output):
     
     Args:
         result: The result from code execution
-        captured_output: StringIO object containing printed output
+        captured_output: OutputBuffer (or StringIO) holding printed output
     
     Returns:
         Formatted result
@@ -127,6 +127,7 @@ function App() {
           <DataTable
             data={uploadedData}
             isFullscreen={true}
+            remote={true}
             onToggleFullscreen={() => setIsTableFullscreen(false)}
           />
         </div>
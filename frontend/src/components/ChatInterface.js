@@ -3,14 +3,22 @@ import React, { useState, useRef, useEffect } from 'react';
 import '../styles/ChatInterface.css';
 import axios from 'axios';
 
+const STAGE_LABELS = {
+  llm: 'Writing analysis code…',
+  exec: 'Running analysis…',
+  render: 'Preparing chart…',
+};
+
 const ChatInterface = ({ chatHistory, onChatResponse, onChatSending, hasData, isLoading }) => {
   const [message, setMessage] = useState('');
+  const [liveStage, setLiveStage] = useState(null);
+  const [liveOutput, setLiveOutput] = useState('');
   const chatEndRef = useRef(null);
   const inputRef = useRef(null);
 
   useEffect(() => {
     chatEndRef.current?.scrollIntoView({ behavior: 'smooth' });
-  }, [chatHistory]);
+  }, [chatHistory, liveOutput]);
 
   function getSessionId() {
     let id = localStorage.getItem("insightai_session");
@@ -21,6 +29,34 @@ const ChatInterface = ({ chatHistory, onChatResponse, onChatSending, hasData, is
     return id;
   }
 
+  // Read an NDJSON chat stream: status/output events update the live bubble,
+  // the final "result" event carries the usual chat response.
+  async function readChatStream(res) {
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffered = '';
+    let result = null;
+    const handle = (line) => {
+      if (!line.trim()) return;
+      const event = JSON.parse(line);
+      if (event.type === 'status') setLiveStage(event.stage);
+      else if (event.type === 'output') setLiveOutput((prev) => (prev + event.text).slice(-4000));
+      else if (event.type === 'result') result = event.data;
+      else if (event.type === 'error') throw new Error(event.detail || 'Stream error');
+    };
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffered += decoder.decode(value, { stream: true });
+      const lines = buffered.split('\n');
+      buffered = lines.pop();
+      lines.forEach(handle);
+    }
+    handle(buffered);
+    if (!result) throw new Error('Chat stream ended without a result');
+    return result;
+  }
+
   async function sendMessageToServer(message, chatHistory = []) {
     const url = `${process.env.REACT_APP_API_BASE_URL}/api/chat`;
     const sessionId = getSessionId();
@@ -34,9 +70,15 @@ const ChatInterface = ({ chatHistory, onChatResponse, onChatSending, hasData, is
         body: JSON.stringify({
           message: String(message ?? ""),
           chat_history: Array.isArray(chatHistory) ? chatHistory : [],
+          stream: true,
         }),
       });
 
+      const contentType = res.headers.get("Content-Type") || "";
+      if (res.ok && res.body && contentType.includes("application/x-ndjson")) {
+        return await readChatStream(res);
+      }
+
       const text = await res.text();
       // Try to parse JSON safely
       let data;
@@ -60,6 +102,8 @@ const ChatInterface = ({ chatHistory, onChatResponse, onChatSending, hasData, is
 
     const userMessage = message.trim();
     setMessage('');
+    setLiveStage(null);
+    setLiveOutput('');
     onChatSending(true);
 
     try {
@@ -139,6 +183,8 @@ const ChatInterface = ({ chatHistory, onChatResponse, onChatSending, hasData, is
                 <span></span>
                 <span></span>
               </div>
+              {liveStage && <div className="live-stage">{STAGE_LABELS[liveStage] || liveStage}</div>}
+              {liveOutput && <pre className="live-output">{liveOutput}</pre>}
             </div>
           </div>
         )}
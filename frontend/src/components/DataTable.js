@@ -1,15 +1,72 @@
 // src/components/DataTable.js
-import React, { useState, useMemo } from 'react';
+import React, { useState, useMemo, useEffect } from 'react';
+import axios from 'axios';
 import '../styles/DataTable.css';
 
-const DataTable = ({ data, isFullscreen, onToggleFullscreen }) => {
+function getSessionId() {
+  let id = localStorage.getItem("insightai_session");
+  if (!id) {
+    id = crypto?.randomUUID?.() || (Date.now().toString(36) + Math.random().toString(36).slice(2));
+    localStorage.setItem("insightai_session", id);
+  }
+  return id;
+}
+
+// One page from /api/preview; the server sorts and pages the full dataset
+async function fetchPreviewPage({ cursor, sortConfig, limit }) {
+  const params = { limit };
+  if (cursor) params.cursor = cursor;
+  if (sortConfig.key) {
+    params.sort = sortConfig.key;
+    params.descending = sortConfig.direction === 'desc';
+  }
+  const response = await axios.get(`${process.env.REACT_APP_API_BASE_URL}/api/preview`, {
+    params,
+    headers: { 'X-Session-ID': getSessionId() },
+  });
+  const { columns, data } = response.data;
+  const rows = Array.from({ length: response.data.rows }, (_, i) =>
+    Object.fromEntries(columns.map((col) => [col, data[col][i]]))
+  );
+  return { ...response.data, rows };
+}
+
+const DataTable = ({ data, isFullscreen, onToggleFullscreen, remote = false }) => {
   const [currentPage, setCurrentPage] = useState(0);
   const [sortConfig, setSortConfig] = useState({ key: null, direction: 'asc' });
+  const [cursor, setCursor] = useState(null);
+  const [remotePage, setRemotePage] = useState(null);
+  const [remoteError, setRemoteError] = useState(null);
   const rowsPerPage = isFullscreen ? 20 : 5;
 
+  useEffect(() => {
+    if (!remote) return undefined;
+    let cancelled = false;
+    fetchPreviewPage({ cursor, sortConfig, limit: rowsPerPage })
+      .then((page) => {
+        if (!cancelled) {
+          setRemotePage(page);
+          setRemoteError(null);
+        }
+      })
+      .catch((err) => {
+        if (cancelled) return;
+        if (err.response?.status === 409) {
+          // The dataset was replaced; start over from its first page
+          setCursor(null);
+          setCurrentPage(0);
+          return;
+        }
+        setRemoteError(err.response?.data?.detail || err.message);
+      });
+    return () => {
+      cancelled = true;
+    };
+  }, [remote, cursor, sortConfig, rowsPerPage, data]);
+
   // Always define hooks before any return
   const memoizedRows = useMemo(() => {
-    const preview = data && data.preview ? data.preview : [];
+    const preview = remote ? remotePage?.rows || [] : data && data.preview ? data.preview : [];
     return preview.map((row) => {
       const newRow = { ...row };
       for (const key in newRow) {
@@ -19,13 +76,13 @@ const DataTable = ({ data, isFullscreen, onToggleFullscreen }) => {
       }
       return newRow;
     });
-  }, [data]);
+  }, [data, remote, remotePage]);
 
   const columns = data?.columns || [];
 
   // Sorting logic
   const sortedData = useMemo(() => {
-    if (!sortConfig.key) return memoizedRows;
+    if (remote || !sortConfig.key) return memoizedRows;
     const sorted = [...memoizedRows].sort((a, b) => {
       const aVal = a[sortConfig.key];
       const bVal = b[sortConfig.key];
@@ -39,17 +96,24 @@ const DataTable = ({ data, isFullscreen, onToggleFullscreen }) => {
         : String(bVal).localeCompare(String(aVal));
     });
     return sorted;
-  }, [memoizedRows, sortConfig]);
+  }, [memoizedRows, sortConfig, remote]);
 
-  if (!data || !data.preview) return null;
+  if (!data || (!remote && !data.preview)) return null;
 
-  const totalPages = Math.ceil(sortedData.length / rowsPerPage);
+  const totalRows = remote ? remotePage?.total_rows || 0 : sortedData.length;
+  const totalPages = Math.ceil(totalRows / rowsPerPage);
   const startIndex = currentPage * rowsPerPage;
   const endIndex = startIndex + rowsPerPage;
-  const currentData = sortedData.slice(startIndex, endIndex);
+  const currentData = remote ? sortedData : sortedData.slice(startIndex, endIndex);
+
+  const goToPage = (page, pageCursor) => {
+    if (remote) setCursor(pageCursor);
+    setCurrentPage(page);
+  };
 
   const handleSort = (col) => {
     setCurrentPage(0); // Reset to first page on sort
+    setCursor(null);
     setSortConfig((prev) => {
       if (prev.key === col) {
         return { key: col, direction: prev.direction === 'asc' ? 'desc' : 'asc' };
@@ -72,6 +136,8 @@ const DataTable = ({ data, isFullscreen, onToggleFullscreen }) => {
         </div>
       )}
       
+      {remoteError && <div className="table-error">Could not load rows: {remoteError}</div>}
+
       <div className="table-wrapper">
         <table className="data-table">
           <thead>
@@ -112,7 +178,7 @@ const DataTable = ({ data, isFullscreen, onToggleFullscreen }) => {
       {totalPages > 1 && (
         <div className="table-pagination">
           <button 
-            onClick={() => setCurrentPage(Math.max(0, currentPage - 1))}
+            onClick={() => goToPage(Math.max(0, currentPage - 1), remotePage?.prev_cursor)}
             disabled={currentPage === 0}
             className="pagination-btn"
           >
@@ -122,8 +188,8 @@ const DataTable = ({ data, isFullscreen, onToggleFullscreen }) => {
             Page {currentPage + 1} of {totalPages}
           </span>
           <button 
-            onClick={() => setCurrentPage(Math.min(totalPages - 1, currentPage + 1))}
-            disabled={currentPage === totalPages - 1}
+            onClick={() => goToPage(Math.min(totalPages - 1, currentPage + 1), remotePage?.next_cursor)}
+            disabled={currentPage === totalPages - 1 || (remote && !remotePage?.next_cursor)}
             className="pagination-btn"
           >
             Next →
@@ -3,6 +3,11 @@ import React, { useState } from 'react';
 import '../styles/DataUpload.css';
 import axios from 'axios';
 
+const SUPPORTED_EXTENSIONS = ['.csv', '.parquet', '.pq', '.jsonl', '.ndjson', '.json', '.xlsx', '.xls'];
+
+const isSupportedFile = (file) =>
+  SUPPORTED_EXTENSIONS.some((ext) => file.name.toLowerCase().endsWith(ext));
+
 function getSessionId() {
   let id = localStorage.getItem("insightai_session");
   if (!id) {
@@ -100,7 +105,7 @@ const DataUpload = ({ onDataUpload }) => {
     e.preventDefault();
     setDragActive(false);
     const file = e.dataTransfer.files[0];
-    if (file && file.name.endsWith('.csv')) {
+    if (file && isSupportedFile(file)) {
       handleFileUpload(file);
     }
   };
@@ -125,7 +130,7 @@ const DataUpload = ({ onDataUpload }) => {
       >
         <input
           type="file"
-          accept=".csv"
+          accept={SUPPORTED_EXTENSIONS.join(',')}
           onChange={(e) => handleFileUpload(e.target.files[0])}
           disabled={uploading}
           id="file-upload"